@@ -0,0 +1,357 @@
+# api/server.py
+"""
+Read API (HTTP) untuk agregat warehouse, memakai query yang sama dengan dashboard
+(warehouse/queries.py).
+
+Endpoint:
+  GET /health
+  GET /v1/daily       volume harian per kecamatan (kolom days > 1: total satu periode rollup retensi)
+  GET /v1/kecamatan   rata-rata armada & beban harian per kecamatan (+ status kapasitas)
+  GET /v1/trend       tren total harian, di-downsample menjadi paling banyak `points` titik
+                      (rata-rata + min/maks per bucket, lihat Q_TREND di warehouse/queries.py)
+
+Parameter (semua opsional):
+  city           kode kota di data/cities.json (default: jakarta); hanya partisi kota ini yang dibaca
+  start, end     tanggal ISO (YYYY-MM-DD)
+  kecamatan      satu atau beberapa nama, dipisah koma (atau parameter diulang)
+  points         jumlah titik maksimum /v1/trend (default 400, 10 - 5000)
+  page, page_size  pagination (default 1 / 1000, maksimum 10000 baris per halaman)
+  format         json (default) atau arrow (Arrow IPC stream); bisa juga lewat header
+                 Accept: application/vnd.apache.arrow.stream
+
+ETag diturunkan dari versi data kota yang diminta (id run ELT terakhir kota tsb di
+warehouse.etl_runs) + parameter, sehingga klien/proxy cukup mengirim If-None-Match dan mendapat
+304 tanpa query agregat; load kota lain tidak membatalkan ETag kota ini.
+Respons dikompres gzip jika klien mengirim Accept-Encoding: gzip.
+
+Cara pakai:
+    WASTE_DB_URL=postgresql+psycopg2://... python api/server.py --port 8080
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils import get_engine
+from warehouse.city import CODE_PATTERN, DEFAULT_CITY, get_city_id
+from warehouse.etl_runs import get_data_version
+from warehouse.fleet_metrics import compute_fleet_status
+from warehouse.queries import TREND_POINTS, fetch_daily, fetch_fleet_analysis, fetch_summary, fetch_trend
+
+logger = logging.getLogger("waste_tracker")
+
+# --- KONFIGURASI ---
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+MAX_TREND_POINTS = 5000
+CACHE_ENTRIES = 128           # jumlah hasil query yang disimpan di memori (LRU)
+VERSION_TTL = 5.0             # detik; versi data dibaca ulang paling sering tiap 5 detik
+UNKNOWN_CITY_TTL = 30.0       # detik; kode kota yang tidak terdaftar tidak di-query ulang selama ini
+MAX_AGE = int(os.environ.get("WASTE_API_MAX_AGE", "60"))
+GZIP_MIN_BYTES = 1024
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+OPEN_FROM = date(1900, 1, 1)
+OPEN_TO = date(9999, 12, 31)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class ResultCache:
+    """LRU sederhana (thread-safe) untuk DataFrame hasil query, dikunci dengan versi data."""
+
+    def __init__(self, max_entries=CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+
+class WarehouseReader:
+    """Akses warehouse untuk handler: versi data (dengan TTL) dan hasil query ter-cache."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.cache = ResultCache()
+        self._versions = {}  # kode kota (None = global) -> (versi, waktu dibaca)
+        self._city_ids = {}
+        self._unknown_cities = {}  # kode kota -> waktu dicek (tidak terdaftar)
+        # Hanya menjaga dict di atas; query database selalu dijalankan di luar lock
+        self._lock = threading.Lock()
+
+    def data_version(self, city=None):
+        with self._lock:
+            version, read_at = self._versions.get(city, (None, 0.0))
+        if version is not None and time.monotonic() - read_at <= VERSION_TTL:
+            return version
+        with self.engine.connect() as conn:
+            version = get_data_version(conn, city)
+        with self._lock:
+            self._versions[city] = (version, time.monotonic())
+        return version
+
+    def city_id(self, code):
+        """id dim_city untuk kode kota. Melempar BadRequest jika kota belum terdaftar."""
+        now = time.monotonic()
+        with self._lock:
+            if code in self._city_ids:
+                return self._city_ids[code]
+            unknown = now - self._unknown_cities.get(code, -UNKNOWN_CITY_TTL) < UNKNOWN_CITY_TTL
+        if unknown:
+            raise BadRequest(f"Kota '{code}' tidak dikenal")
+        try:
+            with self.engine.connect() as conn:
+                city_id = get_city_id(conn, code)
+        except KeyError:
+            with self._lock:
+                # Entri kedaluwarsa dibuang agar kode acak tidak menumpuk di memori
+                self._unknown_cities = {c: t for c, t in self._unknown_cities.items() if now - t < UNKNOWN_CITY_TTL}
+                self._unknown_cities[code] = now
+            raise BadRequest(f"Kota '{code}' tidak dikenal")
+        with self._lock:
+            self._city_ids[code] = city_id
+        return city_id
+
+    def frame(self, version, endpoint, params):
+        city_id = self.city_id(params["city"])
+        key = (version, endpoint, params["city"], params["start"], params["end"], params["kecamatan"], params["points"])
+        df = self.cache.get(key)
+        if df is None:
+            with self.engine.connect() as conn:
+                if endpoint == "daily":
+                    df = fetch_daily(conn, params["start"], params["end"], params["kecamatan"], city_id)
+                elif endpoint == "trend":
+                    # Panjang bucket bergantung pada rentang: batas yang kosong diisi rentang data kota
+                    min_date, max_date, _ = fetch_summary(conn, city_id)
+                    start = params["start"] or min_date or params["end"] or date.today()
+                    end = max(params["end"] or max_date or start, start)
+                    df = fetch_trend(conn, start, end, params["kecamatan"], city_id, params["points"])
+                else:
+                    df = fetch_fleet_analysis(conn, params["start"] or OPEN_FROM, params["end"] or OPEN_TO,
+                                              params["kecamatan"], city_id)
+                    df = compute_fleet_status(df).round({"capacity_ton": 2, "load_ratio": 2})
+            self.cache.put(key, df)
+        return df
+
+
+def parse_params(query):
+    """Validasi & normalisasi query string. Melempar BadRequest untuk nilai yang tidak valid."""
+    qs = parse_qs(query)
+
+    def one(name, default=None):
+        return qs[name][-1] if name in qs else default
+
+    def as_date(name):
+        value = one(name)
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise BadRequest(f"Parameter '{name}' harus berformat YYYY-MM-DD")
+
+    def as_int(name, default, lo, hi):
+        try:
+            value = int(one(name, default))
+        except ValueError:
+            raise BadRequest(f"Parameter '{name}' harus bilangan bulat")
+        if not lo <= value <= hi:
+            raise BadRequest(f"Parameter '{name}' harus di antara {lo} dan {hi}")
+        return value
+
+    kecamatan = sorted({k.strip().upper() for v in qs.get("kecamatan", []) for k in v.split(",") if k.strip()})
+    params = {
+        "city": one("city", DEFAULT_CITY).strip().lower(),
+        "start": as_date("start"),
+        "end": as_date("end"),
+        "kecamatan": tuple(kecamatan) or None,
+        "points": as_int("points", TREND_POINTS, 10, MAX_TREND_POINTS),
+        "page": as_int("page", 1, 1, 10**9),
+        "page_size": as_int("page_size", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE),
+        "format": one("format"),
+    }
+    if not CODE_PATTERN.match(params["city"]):
+        raise BadRequest("Parameter 'city' tidak valid")
+    if params["start"] and params["end"] and params["start"] > params["end"]:
+        raise BadRequest("Parameter 'start' harus <= 'end'")
+    if params["format"] not in (None, "json", "arrow"):
+        raise BadRequest("Parameter 'format' harus 'json' atau 'arrow'")
+    return params
+
+
+def make_etag(version, endpoint, params, fmt):
+    canonical = urlencode(sorted(
+        (k, ",".join(v) if isinstance(v, tuple) else str(v))
+        for k, v in params.items() if k != "format" and v is not None
+    ))
+    digest = hashlib.sha1(f"{endpoint}?{canonical}|{fmt}".encode("utf-8")).hexdigest()[:16]
+    # Weak ETag: isi sama secara semantik untuk versi gzip maupun tidak
+    return f'W/"v{version}-{digest}"'
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or etag[2:] in tags
+
+
+def to_json(df, version, page, page_size, total):
+    if "date" in df.columns:
+        df = df.assign(date=df["date"].astype(str))
+    rows = df.to_json(orient="records", double_precision=3)
+    return (
+        f'{{"data_version":{version},"page":{page},"page_size":{page_size},'
+        f'"total_rows":{total},"rows":{rows}}}'
+    ).encode("utf-8")
+
+
+def to_arrow(df, version, total):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Skema tetap seperti sebelum fetch_frame: date32 untuk tanggal, string biasa (bukan dictionary)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type) and field.name == "date":
+            table = table.set_column(i, field.name, table.column(i).cast(pa.date32()))
+        elif pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+    table = table.replace_schema_metadata({"data_version": str(version), "total_rows": str(total)})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "WasteTrackerAPI/1.0"
+    protocol_version = "HTTP/1.1"
+    reader = None  # WarehouseReader, di-set oleh serve()
+
+    def log_message(self, fmt, *args):
+        logger.info("%s %s", self.address_string(), fmt % args)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            if url.path == "/health":
+                self._send_json(200, f'{{"status":"ok","data_version":{self.reader.data_version()}}}')
+            elif url.path in ("/v1/daily", "/v1/kecamatan", "/v1/trend"):
+                self._serve_aggregate(url.path.rsplit("/", 1)[-1], url)
+            else:
+                self._send_json(404, '{"error":"endpoint tidak ditemukan"}')
+        except BadRequest as e:
+            self._send_json(400, f'{{"error":{json.dumps(str(e))}}}')
+        except Exception:
+            logger.exception("Gagal melayani %s", self.path)
+            self._send_json(503, '{"error":"warehouse tidak tersedia"}')
+
+    def _serve_aggregate(self, endpoint, url):
+        params = parse_params(url.query)
+        self.reader.city_id(params["city"])  # validasi kota sebelum ETag/304
+        fmt = params["format"] or ("arrow" if ARROW_MIME in self.headers.get("Accept", "") else "json")
+        version = self.reader.data_version(params["city"])
+        etag = make_etag(version, endpoint, params, fmt)
+
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={MAX_AGE}",
+            "Vary": "Accept, Accept-Encoding",
+            "X-Data-Version": str(version),
+        }
+        if etag_matches(self.headers.get("If-None-Match"), etag):
+            self._send(304, b"", headers)
+            return
+
+        df = self.reader.frame(version, endpoint, params)
+        total = len(df)
+        page, page_size = params["page"], params["page_size"]
+        page_df = df.iloc[(page - 1) * page_size: page * page_size]
+
+        headers["X-Total-Count"] = str(total)
+        links = []
+        if page * page_size < total:
+            links.append(f'<{self._page_url(url, page + 1)}>; rel="next"')
+        if page > 1:
+            links.append(f'<{self._page_url(url, page - 1)}>; rel="prev"')
+        if links:
+            headers["Link"] = ", ".join(links)
+
+        if fmt == "arrow":
+            try:
+                body = to_arrow(page_df, version, total)
+            except ImportError:
+                self._send_json(406, '{"error":"format arrow membutuhkan pyarrow di server"}')
+                return
+            headers["Content-Type"] = ARROW_MIME
+        else:
+            body = to_json(page_df, version, page, page_size, total)
+            headers["Content-Type"] = "application/json; charset=utf-8"
+        self._send(200, body, headers)
+
+    def _page_url(self, url, page):
+        qs = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        qs["page"] = page
+        return f"{url.path}?{urlencode(qs)}"
+
+    def _send_json(self, status, body):
+        self._send(status, body.encode("utf-8"), {"Content-Type": "application/json; charset=utf-8"})
+
+    def _send(self, status, body, headers):
+        if len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            headers = {**headers, "Content-Encoding": "gzip"}
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+
+def serve(host="0.0.0.0", port=8080, engine=None):
+    ApiHandler.reader = WarehouseReader(engine or get_engine())
+    httpd = ThreadingHTTPServer((host, port), ApiHandler)
+    logger.info("🌐 Read API berjalan di http://%s:%s", host, port)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Read API warehouse Waste Tracker")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("WASTE_API_PORT", "8080")))
+    args = parser.parse_args()
+    serve(args.host, args.port)
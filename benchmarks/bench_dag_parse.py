@@ -0,0 +1,99 @@
+# benchmarks/bench_dag_parse.py
+"""
+Benchmark waktu parse DAG Airflow (dags/waste_dag.py) terhadap anggaran waktu.
+
+Scheduler mem-parse file DAG berulang-ulang di proses yang sudah memuat airflow. Di sini tiap
+pengukuran dijalankan di proses baru: airflow (DAG, PythonOperator, days_ago) diimpor dulu,
+lalu hanya eksekusi file DAG yang diukur (seperti DagBag memuat file). Dicatat median waktu
+parse, jumlah task, dan package yang ikut terimpor oleh file DAG.
+
+Keluar dengan kode 1 jika waktu parse melewati BUDGET_MS atau ada library berat / modul proyek
+(HEAVY_MODULES) yang terimpor saat parse: semuanya harus diimpor di dalam fungsi task.
+
+Cara pakai (di environment yang memasang airflow):
+    python benchmarks/bench_dag_parse.py --repeat 5
+    git show HEAD~1:dags/waste_dag.py > /tmp/waste_dag_lama.py
+    python benchmarks/bench_dag_parse.py --dag /tmp/waste_dag_lama.py     # pembanding
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DAG_PATH = os.path.join(ROOT_DIR, "dags", "waste_dag.py")
+
+# Anggaran parse (ms, tanpa impor airflow sendiri)
+BUDGET_MS = 100
+HEAVY_MODULES = ["pandas", "numpy", "sqlalchemy", "streamlit", "pyarrow", "plotly", "psycopg2",
+                 "utils", "elt", "warehouse"]
+
+PARSE_SNIPPET = r"""
+import importlib.util, json, sys, time
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+from airflow.utils.dates import days_ago
+
+before = set(sys.modules)
+t = time.perf_counter()
+spec = importlib.util.spec_from_file_location("waste_dag_bench", sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+ms = (time.perf_counter() - t) * 1000
+
+dags = [v for v in vars(module).values() if isinstance(v, DAG)]
+new = {m.split(".")[0] for m in set(sys.modules) - before}
+print(json.dumps({
+    "ms": ms,
+    "tasks": sum(len(d.tasks) for d in dags),
+    # package non-stdlib saja (stdlib seperti json/logging murah & sebagian besar sudah dimuat airflow)
+    "imported": sorted(m for m in new - {"waste_dag_bench", "__mp_main__"}
+                       if m not in sys.stdlib_module_names and not m.startswith("_")),
+}))
+"""
+
+
+def run_python(code, *args, env=None):
+    out = subprocess.run([sys.executable, "-c", code, *args], capture_output=True, text=True, cwd=ROOT_DIR, env=env)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr[-2000:])
+    return out.stdout.strip().splitlines()[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark waktu parse DAG Airflow")
+    parser.add_argument("--repeat", type=int, default=5, help="Jumlah proses baru (median)")
+    parser.add_argument("--dag", default=DAG_PATH, help="Path file DAG (mis. versi lama untuk pembanding)")
+    args = parser.parse_args()
+    if importlib.util.find_spec("airflow") is None:
+        print("❌ airflow tidak terpasang di environment ini (pip install apache-airflow).")
+        sys.exit(2)
+
+    # File DAG mencari modul proyek lewat WASTE_PROJECT_ROOT
+    env = {**os.environ, "WASTE_PROJECT_ROOT": os.environ.get("WASTE_PROJECT_ROOT", ROOT_DIR)}
+    runs = [json.loads(run_python(PARSE_SNIPPET, os.path.abspath(args.dag), env=env)) for _ in range(args.repeat)]
+    timings = [r["ms"] for r in runs]
+    heavy = [m for m in HEAVY_MODULES if m in runs[-1]["imported"]]
+
+    print(f"File DAG      : {os.path.relpath(os.path.abspath(args.dag), ROOT_DIR)}")
+    print(f"Task          : {runs[-1]['tasks']}")
+    print(f"Parse (ms)    : median {statistics.median(timings):.1f}, min {min(timings):.1f}, "
+          f"maks {max(timings):.1f} (anggaran {BUDGET_MS})")
+    print(f"Ikut diimpor  : {', '.join(runs[-1]['imported']) or '-'}")
+
+    problems = []
+    if statistics.median(timings) > BUDGET_MS:
+        problems.append(f"parse {statistics.median(timings):.0f} ms > {BUDGET_MS} ms")
+    if heavy:
+        problems.append(f"impor berat saat parse: {', '.join(heavy)}")
+    if problems:
+        print(f"\n❌ Melewati anggaran: {'; '.join(problems)}")
+        sys.exit(1)
+    print("\n✅ Parse DAG dalam anggaran.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# benchmarks/bench_fact_layout.py
+"""
+Laporan ukuran tabel & waktu scan fact_waste: layout lama vs layout ringkas.
+
+  lama   : volume DECIMAL(10,2), category/source VARCHAR(50), fleet_id selalu NULL
+  ringkas: volume_kg INTEGER, category_id/source_id SMALLINT (dim_category/dim_source)
+
+Kedua tabel diisi baris sintetis yang sama di schema `bench_layout`
+(dihapus setelah selesai), lalu dilaporkan ukuran heap, index dan
+median waktu eksekusi dua query agregat yang umum dipakai dashboard.
+
+Cara pakai:
+    WASTE_DB_URL=postgresql+psycopg2://... python benchmarks/bench_fact_layout.py --rows 5000000
+"""
+import argparse
+import os
+import statistics
+import sys
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils import get_engine
+
+SETUP_SQL = """
+DROP SCHEMA IF EXISTS bench_layout CASCADE;
+CREATE SCHEMA bench_layout;
+
+CREATE TABLE bench_layout.src AS
+SELECT
+    (g % 3650) + 1 AS time_id,
+    (g % 44) + 1 AS location_id,
+    round((5 + random() * 300)::numeric, 2) AS volume_ton,
+    ((g / 7) % 4) + 1 AS category_id,
+    ((g / 11) % 5) + 1 AS source_id
+FROM generate_series(1, :n_rows) g;
+
+CREATE TABLE bench_layout.dim_category (id SMALLINT PRIMARY KEY, name VARCHAR(50));
+INSERT INTO bench_layout.dim_category VALUES (1, 'Organik'), (2, 'Anorganik'), (3, 'B3'), (4, 'Residu');
+CREATE TABLE bench_layout.dim_source (id SMALLINT PRIMARY KEY, name VARCHAR(50));
+INSERT INTO bench_layout.dim_source VALUES
+    (1, 'Rumah Tangga'), (2, 'Pasar'), (3, 'Komersial'), (4, 'Industri Kecil'), (5, 'Taman Kota');
+
+CREATE TABLE bench_layout.fact_old (
+    id SERIAL PRIMARY KEY,
+    time_id INTEGER,
+    location_id INTEGER,
+    fleet_id INTEGER,
+    volume DECIMAL(10, 2) NOT NULL,
+    category VARCHAR(50),
+    source VARCHAR(50)
+);
+INSERT INTO bench_layout.fact_old (time_id, location_id, volume, category, source)
+SELECT s.time_id, s.location_id, s.volume_ton, c.name, so.name
+FROM bench_layout.src s
+JOIN bench_layout.dim_category c ON c.id = s.category_id
+JOIN bench_layout.dim_source so ON so.id = s.source_id;
+
+CREATE TABLE bench_layout.fact_new (
+    id SERIAL PRIMARY KEY,
+    time_id INTEGER,
+    location_id INTEGER,
+    fleet_id INTEGER,
+    volume_kg INTEGER NOT NULL,
+    category_id SMALLINT,
+    source_id SMALLINT
+);
+INSERT INTO bench_layout.fact_new (time_id, location_id, fleet_id, volume_kg, category_id, source_id)
+SELECT time_id, location_id, location_id, ROUND(volume_ton * 1000)::INTEGER, category_id, source_id
+FROM bench_layout.src;
+
+DROP TABLE bench_layout.src;
+ANALYZE bench_layout.fact_old;
+ANALYZE bench_layout.fact_new;
+"""
+
+QUERIES = {
+    "total per lokasi": (
+        "SELECT location_id, SUM(volume) FROM bench_layout.fact_old GROUP BY location_id",
+        "SELECT location_id, SUM(volume_kg) / 1000.0 FROM bench_layout.fact_new GROUP BY location_id",
+    ),
+    "total per kategori": (
+        "SELECT category, SUM(volume) FROM bench_layout.fact_old GROUP BY category",
+        """SELECT c.name, x.total / 1000.0
+           FROM (SELECT category_id, SUM(volume_kg) AS total FROM bench_layout.fact_new GROUP BY category_id) x
+           JOIN bench_layout.dim_category c ON c.id = x.category_id""",
+    ),
+}
+
+SIZE_SQL = """
+SELECT pg_relation_size(:t), pg_indexes_size(:t), pg_total_relation_size(:t)
+"""
+
+
+def mb(n):
+    return n / 1024 / 1024
+
+
+def explain_ms(conn, q, repeat):
+    timings = []
+    for _ in range(repeat):
+        plan = conn.execute(text("EXPLAIN (ANALYZE, FORMAT JSON) " + q)).scalar()
+        timings.append(plan[0]["Execution Time"])
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark layout fact_waste")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(SETUP_SQL), {"n_rows": args.rows})
+
+        with engine.connect() as conn:
+            print(f"Baris: {args.rows:,}\n")
+            print(f"{'tabel':<10} {'heap (MB)':>10} {'index (MB)':>11} {'total (MB)':>11} {'byte/baris':>11}")
+            sizes = {}
+            for label, table in (("lama", "bench_layout.fact_old"), ("ringkas", "bench_layout.fact_new")):
+                heap, idx, total = conn.execute(text(SIZE_SQL), {"t": table}).one()
+                sizes[label] = total
+                print(f"{label:<10} {mb(heap):>10.1f} {mb(idx):>11.1f} {mb(total):>11.1f} {heap / args.rows:>11.1f}")
+            print(f"\nPenghematan total: {(1 - sizes['ringkas'] / sizes['lama']) * 100:.1f}%\n")
+
+            print(f"{'query':<20} {'lama (ms)':>10} {'ringkas (ms)':>13}")
+            for name, (q_old, q_new) in QUERIES.items():
+                print(f"{name:<20} {explain_ms(conn, q_old, args.repeat):>10.1f} {explain_ms(conn, q_new, args.repeat):>13.1f}")
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA IF EXISTS bench_layout CASCADE;"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# benchmarks/bench_fleet_asof.py
+"""
+Benchmark query kapasitas historis (as-of join dim_fleet SCD2).
+
+Membandingkan beberapa cara mencari versi armada yang berlaku per tanggal:
+  correlated : subquery per baris (ORDER BY valid_from DESC LIMIT 1)
+  gist probe : join `validity @> date` (satu probe index GiST per baris fakta)
+  lateral    : join digerakkan dari versi armada; per versi satu range scan fakta
+  fleet_id   : equi-join ke fleet_id yang di-resolve sekali saat load (dipakai di app)
+
+Data sintetis dibuat di schema `bench_asof` (dihapus setelah selesai) untuk
+beberapa panjang riwayat, dengan perubahan armada kira-kira tiap bulan.
+Kolom "stamp" = waktu me-resolve fleet_id untuk semua fakta (biaya di load_fact_waste).
+
+Cara pakai:
+    WASTE_DB_URL=postgresql+psycopg2://... python benchmarks/bench_fleet_asof.py --years 1 3 5 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils import get_engine
+
+SETUP_SQL = """
+DROP SCHEMA IF EXISTS bench_asof CASCADE;
+CREATE SCHEMA bench_asof;
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+CREATE TABLE bench_asof.dim_fleet (
+    id SERIAL PRIMARY KEY,
+    kecamatan VARCHAR(100) NOT NULL,
+    armada_operasional INTEGER,
+    ritase_harian DECIMAL,
+    kapasitas_m3 DECIMAL,
+    valid_from DATE NOT NULL,
+    valid_to DATE NOT NULL,
+    validity DATERANGE GENERATED ALWAYS AS (daterange(valid_from, valid_to, '[)')) STORED,
+    EXCLUDE USING gist (kecamatan WITH =, validity WITH &&)
+);
+CREATE INDEX ON bench_asof.dim_fleet (kecamatan, valid_from, valid_to);
+
+-- Satu versi armada per kecamatan per ~30 hari
+INSERT INTO bench_asof.dim_fleet (kecamatan, armada_operasional, ritase_harian, kapasitas_m3, valid_from, valid_to)
+SELECT
+    'KEC ' || k,
+    10 + (random() * 20)::int,
+    round((1 + random() * 3)::numeric, 1),
+    round((50 + random() * 200)::numeric, 1),
+    DATE '2000-01-01' + v * 30,
+    CASE WHEN v = :n_versions - 1 THEN DATE '9999-12-31' ELSE DATE '2000-01-01' + (v + 1) * 30 END
+FROM generate_series(1, :n_kecamatan) k, generate_series(0, :n_versions - 1) v;
+
+CREATE TABLE bench_asof.fact_waste AS
+SELECT 'KEC ' || k AS kecamatan, d::date AS date, (20 + random() * 180)::numeric(10, 2) AS volume, NULL::int AS fleet_id
+FROM generate_series(1, :n_kecamatan) k,
+     generate_series(DATE '2000-01-01', DATE '2000-01-01' + :n_days - 1, INTERVAL '1 day') d;
+CREATE INDEX ON bench_asof.fact_waste (kecamatan, date);
+ANALYZE bench_asof.dim_fleet;
+ANALYZE bench_asof.fact_waste;
+"""
+
+# Sama dengan as-of join di load_fact_waste
+STAMP_SQL = """
+UPDATE bench_asof.fact_waste f
+SET fleet_id = d.id
+FROM bench_asof.dim_fleet d
+WHERE d.kecamatan = f.kecamatan AND f.date >= d.valid_from AND f.date < d.valid_to;
+ANALYZE bench_asof.fact_waste;
+"""
+
+QUERIES = {
+    "correlated": """
+        SELECT f.kecamatan, AVG(f.volume) AS avg_daily_waste_ton,
+               AVG((SELECT d.kapasitas_m3 FROM bench_asof.dim_fleet d
+                    WHERE d.kecamatan = f.kecamatan AND d.valid_from <= f.date
+                    ORDER BY d.valid_from DESC LIMIT 1)) AS kapasitas_m3
+        FROM bench_asof.fact_waste f
+        WHERE f.date BETWEEN :start_date AND :end_date
+        GROUP BY f.kecamatan
+    """,
+    "gist probe": """
+        SELECT f.kecamatan, AVG(f.volume) AS avg_daily_waste_ton, AVG(d.kapasitas_m3) AS kapasitas_m3
+        FROM bench_asof.fact_waste f
+        JOIN bench_asof.dim_fleet d ON d.kecamatan = f.kecamatan AND d.validity @> f.date
+        WHERE f.date BETWEEN :start_date AND :end_date
+        GROUP BY f.kecamatan
+    """,
+    "lateral": """
+        SELECT d.kecamatan, SUM(x.total) / SUM(x.n) AS avg_daily_waste_ton,
+               SUM(d.kapasitas_m3 * x.n) / SUM(x.n) AS kapasitas_m3
+        FROM bench_asof.dim_fleet d
+        JOIN LATERAL (
+            SELECT SUM(f.volume) AS total, COUNT(*) AS n
+            FROM bench_asof.fact_waste f
+            WHERE f.kecamatan = d.kecamatan
+              AND f.date >= GREATEST(d.valid_from, CAST(:start_date AS DATE))
+              AND f.date < LEAST(d.valid_to, CAST(:end_date AS DATE) + 1)
+        ) x ON x.n > 0
+        WHERE d.validity && daterange(CAST(:start_date AS DATE), CAST(:end_date AS DATE), '[]')
+        GROUP BY d.kecamatan
+    """,
+    "fleet_id": """
+        SELECT f.kecamatan, AVG(f.volume) AS avg_daily_waste_ton, AVG(d.kapasitas_m3) AS kapasitas_m3
+        FROM bench_asof.fact_waste f
+        JOIN bench_asof.dim_fleet d ON d.id = f.fleet_id
+        WHERE f.date BETWEEN :start_date AND :end_date
+        GROUP BY f.kecamatan
+    """,
+}
+
+
+def explain_ms(conn, q, params, repeat):
+    """Median 'Execution Time' dari EXPLAIN ANALYZE (ms)."""
+    timings = []
+    for _ in range(repeat):
+        plan = conn.execute(text("EXPLAIN (ANALYZE, FORMAT JSON) " + q), params).scalar()
+        timings.append(plan[0]["Execution Time"])
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark as-of join dim_fleet")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--kecamatan", type=int, default=44)
+    parser.add_argument("--range-days", type=int, default=90, help="Panjang rentang query 'recent' (hari)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    header = f"{'tahun':>5} {'versi':>7} {'fakta':>9} {'rentang':>8} {'stamp':>9}"
+    print(header + "".join(f" {name:>12}" for name in QUERIES) + "   (ms)")
+
+    try:
+        for years in args.years:
+            n_days = years * 365
+            n_versions = n_days // 30 + 1
+            with engine.begin() as conn:
+                conn.execute(text(SETUP_SQL), {
+                    "n_kecamatan": args.kecamatan, "n_versions": n_versions, "n_days": n_days,
+                })
+            with engine.begin() as conn:
+                started = time.perf_counter()
+                conn.execute(text(STAMP_SQL))
+                stamp_ms = (time.perf_counter() - started) * 1000
+                first_day, last_day, n_rows = conn.execute(
+                    text("SELECT MIN(date), MAX(date), COUNT(*) FROM bench_asof.fact_waste")
+                ).one()
+                n_fleet = conn.execute(text("SELECT COUNT(*) FROM bench_asof.dim_fleet")).scalar()
+
+            ranges = {
+                "recent": {"start_date": last_day - timedelta(days=args.range_days - 1), "end_date": last_day},
+                "full": {"start_date": first_day, "end_date": last_day},
+            }
+            with engine.connect() as conn:
+                for label, params in ranges.items():
+                    timings = [explain_ms(conn, q, params, args.repeat) for q in QUERIES.values()]
+                    print(f"{years:>5} {n_fleet:>7} {n_rows:>9} {label:>8} {stamp_ms:>9.1f}"
+                          + "".join(f" {t:>12.1f}" for t in timings))
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA IF EXISTS bench_asof CASCADE;"))
+
+
+if __name__ == "__main__":
+    main()
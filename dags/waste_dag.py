@@ -1,40 +1,79 @@
+# dags/waste_dag.py
+"""
+DAG Airflow pipeline ELT Waste Tracker (satu rantai task per kota).
+
+Scheduler mem-parse file ini setiap beberapa detik, jadi di level modul hanya ada impor
+ringan (os, sys, json, datetime, airflow) dan definisi struktur DAG. pandas, sqlalchemy dan
+modul elt/warehouse baru diimpor di dalam fungsi task, saat task benar-benar dijalankan
+worker. Daftar kota dibaca langsung dari data/cities.json (kode kota divalidasi oleh task
+setup lewat register_cities / load_city_config).
+
+Waktu parse & library yang ikut terimpor: benchmarks/bench_dag_parse.py
+"""
+import json
 import os
 import sys
-import pandas as pd
 from datetime import datetime, timedelta
+
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 from airflow.utils.dates import days_ago
-from sqlalchemy import text
 
 # --- KONFIGURASI PATH ---
 PROJECT_ROOT = os.environ.get("WASTE_PROJECT_ROOT", "/opt/airflow/dags/repo")
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-# --- IMPORT MODULE PROYEK ---
+# --- DAFTAR KOTA ---
+# Satu rantai task per kota (data/cities.json): kota yang filenya bermasalah hanya
+# menggagalkan rantainya sendiri, kota lain tetap ter-update.
+DATA_ROOT = os.path.join(PROJECT_ROOT, "data")
+DEFAULT_CITY = "jakarta"   # sama dengan warehouse.city.DEFAULT_CITY (tanpa mengimpornya saat parse)
+
+def load_city_codes(data_root=DATA_ROOT):
+    """Kode kota dari data/cities.json; [DEFAULT_CITY] jika file tidak ada."""
+    path = os.path.join(data_root, "cities.json")
+    if not os.path.exists(path):
+        return [DEFAULT_CITY]
+    with open(path, encoding="utf-8") as f:
+        return [c["code"] for c in json.load(f)]
+
 try:
-    from utils import get_engine
-    from elt.setup_elt import setup_elt_database
-    from elt.validator import validate_waste_data, validate_sipsn_data
-    from warehouse.dim_time import load_dim_time
-    from warehouse.dim_location import load_dim_location
-    from warehouse.dim_fleet import load_dim_fleet
-    from warehouse.fact_waste import load_fact_waste
-except ImportError as e:
-    print(f"❌ Gagal Import Module: {e}")
-    print(f"Current Path: {sys.path}")
+    CITIES = load_city_codes()
+except Exception as e:
+    print(f"❌ Gagal membaca daftar kota: {e}")
+    CITIES = [DEFAULT_CITY]
 
 # --- FUNGSI WRAPPER UNTUK AIRFLOW TASKS ---
 
 def task_setup_db():
+    from elt.setup_elt import setup_elt_database
+
     print("🛠️ Mempersiapkan Database ELT...")
     setup_elt_database()
 
-def task_process_waste(**kwargs):
-    print("📥 Extract, Validate & Load: Waste Data")
+def check_drift(engine, city, dataset, df, file_path):
+    """Profil file input & bandingkan dengan load sebelumnya; drift 'error' menghentikan task."""
+    from elt.profiling import check_and_record_profile, format_drift, profile_frame
+
+    with engine.begin() as conn:
+        profile_id, status, drift = check_and_record_profile(conn, city, dataset, profile_frame(df, dataset), file_path)
+    if status == "drift":
+        raise ValueError(f"Drift data {dataset} ({city}): {format_drift(drift)}. "
+                         f"Jika perubahan ini benar: python elt/profiling.py accept {profile_id}")
+    print(f"📊 Profil {dataset} ({city}) tersimpan (id {profile_id}, {len(drift)} peringatan drift)")
+
+def task_process_waste(city=None, **kwargs):
+    import pandas as pd
+    from sqlalchemy import text
+    from utils import get_engine
+    from elt.validator import validate_waste_data
+    from warehouse.city import city_data_dir
+
+    city = city or DEFAULT_CITY
+    print(f"📥 Extract, Validate & Load: Waste Data ({city})")
     engine = get_engine()
-    data_dir = os.path.join(PROJECT_ROOT, "data")
+    data_dir = city_data_dir(city, DATA_ROOT)
     file_path = os.path.join(data_dir, "waste.csv")
     
     if not os.path.exists(file_path):
@@ -46,18 +85,26 @@ def task_process_waste(**kwargs):
     # 2. Validate (Firewall)
     if not validate_waste_data(df):
         raise ValueError("Validasi Data Waste GAGAL. Pipeline dihentikan.")
+    check_drift(engine, city, "waste", df, file_path)
     
-    # 3. Load to Staging
+    # 3. Load to Staging (hanya mengganti baris kota ini)
+    df["city"] = city
     with engine.begin() as conn:
-        conn.execute(text("TRUNCATE TABLE staging.raw_waste;"))
-    
-    df.to_sql('raw_waste', engine, schema='staging', if_exists='append', index=False)
-    print(f"✅ Berhasil memuat {len(df)} baris ke staging.raw_waste")
+        conn.execute(text("DELETE FROM staging.raw_waste WHERE city = :city;"), {"city": city})
+        df.to_sql('raw_waste', conn, schema='staging', if_exists='append', index=False)
+    print(f"✅ Berhasil memuat {len(df)} baris ke staging.raw_waste ({city})")
+
+def task_process_sipsn(city=None, **kwargs):
+    import pandas as pd
+    from sqlalchemy import text
+    from utils import get_engine
+    from elt.validator import validate_sipsn_data
+    from warehouse.city import city_data_dir
 
-def task_process_sipsn(**kwargs):
-    print("📥 Extract, Validate & Load: SIPSN Data")
+    city = city or DEFAULT_CITY
+    print(f"📥 Extract, Validate & Load: SIPSN Data ({city})")
     engine = get_engine()
-    data_dir = os.path.join(PROJECT_ROOT, "data")
+    data_dir = city_data_dir(city, DATA_ROOT)
     file_path = os.path.join(data_dir, "sipsn.csv")
     
     if not os.path.exists(file_path):
@@ -69,21 +116,96 @@ def task_process_sipsn(**kwargs):
     # 2. Validate (Firewall)
     if not validate_sipsn_data(df):
         raise ValueError("Validasi Data SIPSN GAGAL. Pipeline dihentikan.")
+    check_drift(engine, city, "sipsn", df, file_path)
     
-    # 3. Load to Staging
+    # 3. Load to Staging (hanya mengganti baris kota ini)
+    df["city"] = city
     with engine.begin() as conn:
-        conn.execute(text("TRUNCATE TABLE staging.raw_sipsn;"))
-        
-    df.to_sql('raw_sipsn', engine, schema='staging', if_exists='append', index=False)
-    print(f"✅ Berhasil memuat {len(df)} baris ke staging.raw_sipsn")
-
-def task_update_warehouse():
-    print("🏭 Memperbarui Data Warehouse (Transform via SQL Views)...")
-    load_dim_time()
-    load_dim_location()
-    load_dim_fleet()
-    load_fact_waste()
-    print("✅ Warehouse Updated Successfully.")
+        conn.execute(text("DELETE FROM staging.raw_sipsn WHERE city = :city;"), {"city": city})
+        df.to_sql('raw_sipsn', conn, schema='staging', if_exists='append', index=False)
+    print(f"✅ Berhasil memuat {len(df)} baris ke staging.raw_sipsn ({city})")
+
+def task_backfill_warehouse(city, conf):
+    """
+    Mode backfill (DAG di-trigger dengan conf backfill_start/backfill_end): hanya hari-hari di
+    rentang tsb yang diganti, paralel per chunk, dan bisa dilanjutkan jika task di-retry.
+    """
+    from elt.kecamatan_alias import resolve_kecamatan_aliases
+    from warehouse.backfill import DEFAULT_CHUNK_DAYS, DEFAULT_WORKERS, run_backfill
+
+    start = datetime.strptime(conf["backfill_start"], "%Y-%m-%d").date()
+    end = datetime.strptime(conf["backfill_end"], "%Y-%m-%d").date()
+    print(f"🧱 Backfill warehouse {city}: {start} s/d {end}...")
+    resolve_kecamatan_aliases(city=city)
+    summary = run_backfill(
+        start, end, city,
+        chunk_days=int(conf.get("chunk_days", DEFAULT_CHUNK_DAYS)),
+        workers=int(conf.get("workers", DEFAULT_WORKERS)),
+        force=bool(conf.get("force", False)),
+    )
+    print(f"🧱 {summary['chunks'] - summary['skipped']} chunk diproses ({summary['skipped']} dilewati), "
+          f"{summary['fact_rows']} baris fakta.")
+    if summary["failed"]:
+        raise RuntimeError(f"{len(summary['failed'])} chunk backfill gagal: {summary['failed']}")
+    return summary["chunks"] - summary["skipped"]  # 0: semua chunk sudah selesai sebelumnya
+
+def task_update_warehouse(city=None, **kwargs):
+    from elt.kecamatan_alias import resolve_kecamatan_aliases
+    from warehouse.dim_time import load_dim_time
+    from warehouse.dim_location import load_dim_location
+    from warehouse.dim_fleet import load_dim_fleet
+    from warehouse.fact_waste import load_fact_waste
+    from warehouse.cube import refresh_cube_waste
+    from warehouse.retention import compact_fact_waste
+    from warehouse.forecast import load_forecast_daily
+    from warehouse.capacity_risk import load_capacity_risk
+    from warehouse.anomalies import load_anomalies, raise_anomaly_alerts
+    from warehouse.etl_runs import record_etl_run
+    from warehouse.result_cache import prewarm_result_cache
+
+    city = city or DEFAULT_CITY
+    # airflow dags trigger waste_tracker_elt_pipeline \
+    #     --conf '{"backfill_start": "2024-02-01", "backfill_end": "2024-02-29", "backfill_city": "jakarta"}'
+    dag_run = kwargs.get("dag_run")
+    conf = (dag_run.conf if dag_run else None) or {}
+    if "backfill_start" in conf:
+        if conf.get("backfill_city", city) != city:
+            print(f"⏭️ Backfill untuk kota {conf['backfill_city']}, {city} dilewati.")
+            return
+        if not task_backfill_warehouse(city, conf):
+            return
+        version = record_etl_run(city=city)
+        print(f"✅ Backfill selesai (versi data {version}).")
+        _, n_queries = prewarm_result_cache(city=city)
+        if n_queries:
+            print(f"🔥 Cache dashboard diisi ulang ({n_queries} query).")
+        return
+
+    print(f"🏭 Memperbarui Data Warehouse {city} (Transform via SQL Views)...")
+    n_resolved, unresolved = resolve_kecamatan_aliases(city=city)
+    print(f"🔤 {n_resolved} nama kecamatan baru dicocokkan ke nama resmi.")
+    if unresolved:
+        print(f"⚠️ Nama kecamatan belum dikenali: {', '.join(unresolved)}")
+    load_dim_time(city)
+    load_dim_location(city)
+    load_dim_fleet(city=city)
+    load_fact_waste(city)
+    compacted = compact_fact_waste(city)
+    if compacted:
+        print(f"🗜️  {len(compacted)} bulan detail lama dipadatkan ke rollup.")
+    n_days = refresh_cube_waste(city)
+    print(f"🧊 Kubus agregat diperbarui untuk {n_days} hari.")
+    load_forecast_daily(city=city)
+    n_risk = load_capacity_risk(city)
+    print(f"🎲 Risiko overload armada disimulasikan untuk {n_risk} kecamatan.")
+    n_anomalies = load_anomalies(city)
+    print(f"🚨 {n_anomalies} anomali volume baru terdeteksi.")
+    raise_anomaly_alerts(city)
+    version = record_etl_run(city=city)
+    print(f"✅ Warehouse Updated Successfully (versi data {version}).")
+    _, n_queries = prewarm_result_cache(city=city)
+    if n_queries:
+        print(f"🔥 Cache dashboard diisi ulang ({n_queries} query).")
 
 # --- DEFINISI DAG ---
 
@@ -112,21 +234,27 @@ with DAG(
         python_callable=task_setup_db,
     )
 
-    t2_waste = PythonOperator(
-        task_id='process_waste_data',
-        python_callable=task_process_waste,
-    )
+    # 2. Define Dependencies
+    # Setup dulu (termasuk registrasi kota & partisi), lalu per kota: load Waste & SIPSN
+    # secara paralel, setelah keduanya selesai baru update Warehouse kota tsb.
+    # Rantai antar kota saling independen dan berjalan paralel.
+    for city in CITIES:
+        t2_waste = PythonOperator(
+            task_id=f'process_waste_data_{city}',
+            python_callable=task_process_waste,
+            op_kwargs={'city': city},
+        )
 
-    t3_sipsn = PythonOperator(
-        task_id='process_sipsn_data',
-        python_callable=task_process_sipsn,
-    )
+        t3_sipsn = PythonOperator(
+            task_id=f'process_sipsn_data_{city}',
+            python_callable=task_process_sipsn,
+            op_kwargs={'city': city},
+        )
 
-    t4_warehouse = PythonOperator(
-        task_id='update_warehouse',
-        python_callable=task_update_warehouse,
-    )
+        t4_warehouse = PythonOperator(
+            task_id=f'update_warehouse_{city}',
+            python_callable=task_update_warehouse,
+            op_kwargs={'city': city},
+        )
 
-    # 2. Define Dependencies
-    # Setup dulu, lalu load Waste & SIPSN secara paralel, setelah keduanya selesai baru update Warehouse
-    t1_setup >> [t2_waste, t3_sipsn] >> t4_warehouse
\ No newline at end of file
+        t1_setup >> [t2_waste, t3_sipsn] >> t4_warehouse
\ No newline at end of file
@@ -2,7 +2,9 @@
 from sqlalchemy import text
 import os
 import logging
-from etl.connection import get_engine 
+from elt.connection import get_engine
+from elt.migrate import migrate
+from warehouse.city import register_cities
 
 # Inisialisasi Logger
 logger = logging.getLogger("waste_tracker")
@@ -15,9 +17,12 @@ logger.setLevel(logging.INFO)
 
 def create_warehouse_tables():
     """
-    Menghapus dan membuat ulang semua skema dan tabel dimensional/fakta.
+    Menghapus dan membuat ulang semua tabel dimensional/fakta (reset untuk development;
+    pipeline tidak pernah memanggilnya). DDL-nya sama dengan setup_elt_database: riwayat
+    migrasi di elt/migrations diputar ulang setelah tabel lama di-drop.
     Perintah DROP TABLE CASCADE diperlukan untuk mengatasi masalah UndefinedColumn
     jika skema lama tidak lengkap.
+    Profil query & profil data input tidak di-drop (riwayatnya dipakai sebagai pembanding).
     """
     engine = get_engine()
     logger.info("Memulai DDL: Menghapus dan membuat ulang skema.")
@@ -30,57 +35,36 @@ def create_warehouse_tables():
         # 2. DROP TABEL LAMA
         # DROP TABLE CASCADE menghapus tabel fakta yang memiliki foreign key ke dimensi
         conn.execute(text("DROP TABLE IF EXISTS warehouse.fact_waste CASCADE;"))
+        conn.execute(text("DROP SCHEMA IF EXISTS warehouse_shadow CASCADE;"))  # partisi blue/green (warehouse/publish.py)
+        conn.execute(text("DROP SCHEMA IF EXISTS warehouse_prev CASCADE;"))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.fact_waste_rollup;"))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.fact_retention;"))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.forecast_daily;"))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.anomaly_state;"))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.anomalies;"))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.capacity_risk;"))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.etl_runs;"))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.cube_waste;"))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.backfill_progress;"))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.pipeline_stages;"))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.pipeline_runs;"))
         conn.execute(text("DROP TABLE IF EXISTS warehouse.dim_time;"))
         conn.execute(text("DROP TABLE IF EXISTS warehouse.dim_location;"))
         conn.execute(text("DROP TABLE IF EXISTS warehouse.dim_fleet;"))
-        
-        # 3. DIMENSI WAKTU
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS warehouse.dim_time (
-                id SERIAL PRIMARY KEY,
-                date DATE UNIQUE,
-                year INTEGER,
-                month INTEGER,
-                day INTEGER
-            );
-        """))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.dim_category;"))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.dim_source;"))
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.dim_city;"))
+        # 3. RIWAYAT MIGRASI DIKOSONGKAN: semua migrasi (idempoten) dijalankan ulang di bawah
+        conn.execute(text("DROP TABLE IF EXISTS warehouse.schema_migrations;"))
 
-        # 4. DIMENSI LOKASI (Memastikan kolom penduduk & luas_km2 ada)
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS warehouse.dim_location (
-                id SERIAL PRIMARY KEY,
-                kecamatan VARCHAR(100) UNIQUE, -- Kunci Bisnis
-                kota_administrasi VARCHAR(100),
-                penduduk INTEGER,             -- Kolom yang hilang
-                luas_km2 DECIMAL              -- Kolom yang hilang
-            );
-        """))
-        
-        # 5. DIMENSI ARMADA (Fleet)
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS warehouse.dim_fleet (
-                id SERIAL PRIMARY KEY,
-                kecamatan VARCHAR(100) UNIQUE,
-                armada_total INTEGER,
-                armada_operasional INTEGER,
-                ritase_harian DECIMAL,
-                kapasitas_m3 DECIMAL
-            );
-        """))
+    # 4. SKEMA DARI MIGRASI (staging & view yang sudah ada dipertahankan, tabel warehouse dibuat ulang)
+    applied = migrate(engine)
+    logger.info("Migrasi dijalankan: %s", ", ".join(f"{v:04d}_{n}" for v, n in applied))
 
-        # 6. TABEL FAKTA
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS warehouse.fact_waste (
-                id SERIAL PRIMARY KEY,
-                time_id INTEGER REFERENCES warehouse.dim_time(id),
-                location_id INTEGER REFERENCES warehouse.dim_location(id),
-                fleet_id INTEGER, 
-                volume DECIMAL(10, 2) NOT NULL,
-                category VARCHAR(50), 
-                source VARCHAR(50)
-            );
-        """))
+    # 5. KOTA & PARTISI FAKTA (dari data/cities.json)
+    with engine.begin() as conn:
+        register_cities(conn)
     logger.info("DDL Warehouse Tables berhasil dibuat ulang dengan skema baru.")
 
 if __name__ == "__main__":
-    create_warehouse_tables()
\ No newline at end of file
+    create_warehouse_tables()
@@ -0,0 +1,476 @@
+# elt/ingest_stream.py
+"""
+Ingestor stream (asyncio) untuk event timbangan / truk, sebagai pelengkap batch harian 01:00.
+
+Alur: sumber (file JSONL yang di-tail dan/atau socket TCP, satu JSON per baris)
+  -> antrean terbatas (backpressure) -> micro-batch (per ukuran atau waktu)
+  -> filter baris elt/validator.py -> COPY ke staging.raw_waste_events
+  -> update inkremental fact_waste untuk batch tsb, semua dalam satu transaksi.
+
+Event idempoten per event_id (indeks unik, migrasi 0005): event yang sudah pernah dimuat
+dilewati, sehingga retry batch, kiriman ulang sumber, atau pemutaran ulang file tidak
+menggandakan baris fakta.
+
+Backpressure: hanya satu batch ditulis ke DB pada satu waktu. Jika DB lambat, antrean
+penuh dan sumber berhenti membaca (tail tertahan, socket tidak dibaca sehingga TCP
+window pengirim menutup) sampai ada ruang lagi.
+
+Batch yang gagal ditulis (DB down, deadlock, ...) di-retry dengan jeda yang makin panjang
+sambil tetap dipegang: selama itu antrean penuh dan sumber ikut tertahan, tidak ada event yang
+hilang. Setelah WRITE_ATTEMPTS percobaan, batch ditulis ke file dead-letter (JSONL dengan format
+event yang sama) lalu ingestor lanjut; file tsb bisa diputar ulang setelah masalahnya beres:
+    python elt/ingest_stream.py --jsonl data/events_dead_letter.jsonl --from-start
+
+Versi data (ETag read API & kunci cache dashboard) kota yang mendapat baris baru dinaikkan oleh
+timer tiap VERSION_INTERVAL detik, juga saat stream sedang sepi, dan sekali lagi saat ingestor
+berhenti: baris yang sudah di-commit selalu terlihat paling lambat satu interval kemudian.
+
+Format event:
+    {"event_id": "...", "event_time": "2024-03-01T07:15:00+07:00", "tanggal": "2024-03-01",
+     "kecamatan": "GAMBIR", "volume_ton": 4.2, "jenis_sampah": "Organik", "sumber_sampah": "Rumah Tangga",
+     "city": "jakarta"}
+"city" opsional (kode kota di data/cities.json, default jakarta); satu batch boleh berisi
+beberapa kota, baris fakta masuk ke partisi kotanya masing-masing.
+
+Metrik (format teks Prometheus) di http://<host>:<metrics-port>/metrics:
+latensi end-to-end (event_time -> commit), ukuran batch, durasi tulis, kedalaman antrean,
+jumlah retry, event duplikat, dan event yang masuk dead-letter.
+
+Cara pakai:
+    python elt/ingest_stream.py --jsonl data/events.jsonl --socket 0.0.0.0:9009 --metrics-port 9108
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import text
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils import get_engine
+from elt.kecamatan_alias import resolve_kecamatan_aliases
+from elt.validator import filter_waste_rows
+from warehouse.city import DEFAULT_CITY, ensure_batch_month_partitions
+from warehouse.etl_runs import record_etl_run
+from warehouse.fact_waste import load_fact_waste_batch
+
+logger = logging.getLogger("waste_tracker")
+
+# --- KONFIGURASI ---
+BATCH_SIZE = 500          # batch ditulis jika sudah berisi sebanyak ini ...
+MAX_WAIT = 1.0            # ... atau paling lama 1 detik setelah event pertama masuk batch
+QUEUE_SIZE = 10000        # batas antrean; di atas ini sumber ditahan (backpressure)
+VERSION_INTERVAL = 60.0   # versi data (ETag read API) kota yang berubah dinaikkan tiap 60 detik
+WRITE_ATTEMPTS = 5        # percobaan tulis per batch sebelum masuk dead-letter
+RETRY_BACKOFF = 1.0       # jeda retry pertama (detik), berlipat dua tiap percobaan ...
+RETRY_BACKOFF_MAX = 30.0  # ... paling lama 30 detik
+DEAD_LETTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "events_dead_letter.jsonl")
+
+EVENT_COLUMNS = ['event_id', 'event_time', 'tanggal', 'kecamatan', 'volume_ton', 'jenis_sampah', 'sumber_sampah', 'city']
+Q_NEXT_BATCH = "SELECT nextval('staging.raw_waste_events_batch_seq');"
+# COPY tidak mendukung ON CONFLICT: batch di-COPY ke tabel sementara dulu, lalu disalin
+# ke staging dengan melewati event_id yang sudah ada
+Q_CREATE_INCOMING = """
+CREATE TEMP TABLE incoming_waste_events (LIKE staging.raw_waste_events INCLUDING DEFAULTS) ON COMMIT DROP;
+"""
+COPY_SQL = f"COPY incoming_waste_events (batch_id, {', '.join(EVENT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+Q_INSERT_EVENTS = f"""
+INSERT INTO staging.raw_waste_events (batch_id, {', '.join(EVENT_COLUMNS)})
+SELECT batch_id, {', '.join(EVENT_COLUMNS)} FROM incoming_waste_events
+ON CONFLICT (event_id) DO NOTHING;
+"""
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+BATCH_SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000)
+WRITE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    """Histogram kumulatif sederhana ala Prometheus (tanpa dependency client)."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name, self.help_text, self.buckets = name, help_text, buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        lines += [f'{self.name}_bucket{{le="{b}"}} {c}' for b, c in zip(self.buckets, self.counts)]
+        lines += [f'{self.name}_bucket{{le="+Inf"}} {self.total}',
+                  f"{self.name}_sum {self.sum:.6f}", f"{self.name}_count {self.total}"]
+        return lines
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = {
+            "waste_ingest_events_received_total": 0,
+            "waste_ingest_events_rejected_total": 0,
+            "waste_ingest_events_loaded_total": 0,
+            "waste_ingest_fact_rows_total": 0,
+            "waste_ingest_batches_total": 0,
+            "waste_ingest_events_duplicate_total": 0,
+            "waste_ingest_events_dead_letter_total": 0,
+            "waste_ingest_batch_errors_total": 0,
+            "waste_ingest_batch_retries_total": 0,
+        }
+        self.latency = Histogram("waste_ingest_e2e_latency_seconds",
+                                 "Latensi event_time (atau waktu terima) sampai commit", LATENCY_BUCKETS)
+        self.batch_size = Histogram("waste_ingest_batch_size", "Jumlah event per batch", BATCH_SIZE_BUCKETS)
+        self.write_seconds = Histogram("waste_ingest_batch_write_seconds",
+                                       "Durasi COPY + update warehouse per batch", WRITE_BUCKETS)
+        self.queue_depth = lambda: 0
+
+    def inc(self, name, value=1):
+        self.counters[name] += value
+
+    def render(self):
+        lines = []
+        for name, value in self.counters.items():
+            lines += [f"# TYPE {name} counter", f"{name} {value}"]
+        lines += ["# TYPE waste_ingest_queue_depth gauge", f"waste_ingest_queue_depth {self.queue_depth()}"]
+        for hist in (self.latency, self.batch_size, self.write_seconds):
+            lines += hist.render()
+        return "\n".join(lines) + "\n"
+
+
+def _event_timestamp(value, fallback):
+    """Epoch detik dari event_time (ISO 8601); fallback ke waktu terima jika kosong/tidak valid."""
+    if not value:
+        return fallback
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return fallback
+
+
+class StreamIngestor:
+    def __init__(self, engine=None, batch_size=BATCH_SIZE, max_wait=MAX_WAIT, queue_size=QUEUE_SIZE,
+                 version_interval=VERSION_INTERVAL, write_attempts=WRITE_ATTEMPTS, dead_letter_path=DEAD_LETTER_PATH):
+        self.engine = engine or get_engine()
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.version_interval = version_interval
+        self.write_attempts = write_attempts
+        self.dead_letter_path = dead_letter_path
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.metrics = Metrics()
+        self.metrics.queue_depth = self.queue.qsize
+        # Kota dengan baris yang sudah di-commit tapi versi datanya belum dinaikkan
+        self._unpublished = set()
+        self._unpublished_lock = threading.Lock()
+
+    async def submit(self, event):
+        """Memasukkan satu event (dict). Menunggu jika antrean penuh (backpressure)."""
+        self.metrics.inc("waste_ingest_events_received_total")
+        await self.queue.put((event, time.time()))
+
+    async def submit_line(self, line):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            event = json.loads(line)
+            if not isinstance(event, dict):
+                raise ValueError("event harus berupa objek JSON")
+        except ValueError:
+            self.metrics.inc("waste_ingest_events_received_total")
+            self.metrics.inc("waste_ingest_events_rejected_total")
+            logger.warning("⚠️ Baris event bukan JSON valid, dilewati: %.80s", line)
+            return
+        await self.submit(event)
+
+    async def _next_batch(self, poll=0.5):
+        """
+        Tunggu event pertama (maks. `poll` detik, agar loop bisa memeriksa sinyal berhenti),
+        lalu kumpulkan sampai batch_size atau max_wait habis. List kosong jika tidak ada event.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            batch = [await asyncio.wait_for(self.queue.get(), poll)]
+        except asyncio.TimeoutError:
+            return []
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _write_batch(self, batch):
+        """
+        COPY batch ke staging + update inkremental warehouse (blocking, dijalankan di thread).
+        Mengembalikan (event dimuat, baris fakta, event ditolak validator, event duplikat).
+        """
+        df = pd.DataFrame([event for event, _ in batch]).reindex(columns=EVENT_COLUMNS)
+        df["city"] = df["city"].fillna(DEFAULT_CITY)
+        df, n_rejected = filter_waste_rows(df)
+        if df.empty:
+            return 0, 0, n_rejected, 0
+
+        # Partisi bulan baru (DDL) di transaksi pendek sendiri, bukan di transaksi batch
+        days = df[["city", "tanggal"]].drop_duplicates()
+        ensure_batch_month_partitions(self.engine, days["city"], days["tanggal"])
+        with self.engine.begin() as conn:
+            batch_id = conn.execute(text(Q_NEXT_BATCH)).scalar()
+            buf = io.StringIO()
+            df.insert(0, "batch_id", batch_id)
+            df.to_csv(buf, index=False, header=False)
+            buf.seek(0)
+            conn.execute(text(Q_CREATE_INCOMING))
+            with conn.connection.cursor() as cur:
+                cur.copy_expert(COPY_SQL, buf)
+            n_loaded = conn.execute(text(Q_INSERT_EVENTS)).rowcount
+            # Nama kecamatan yang belum pernah muncul dicocokkan dulu (sekali per nama)
+            _, unresolved = resolve_kecamatan_aliases(conn, batch_id)
+            if unresolved:
+                logger.warning("⚠️ Nama kecamatan belum dikenali: %s", ", ".join(unresolved))
+            n_fact = load_fact_waste_batch(conn, batch_id)
+        if n_loaded:
+            with self._unpublished_lock:
+                self._unpublished.update(df["city"].unique())
+        return n_loaded, n_fact, n_rejected, len(df) - n_loaded
+
+    def _publish_versions(self):
+        """
+        Menaikkan versi data kota yang punya baris baru sejak kenaikan terakhir (blocking).
+        Jika gagal, kota tsb dicoba lagi pada tick berikutnya. Mengembalikan kota yang dinaikkan.
+        """
+        with self._unpublished_lock:
+            cities, self._unpublished = sorted(self._unpublished), set()
+        if not cities:
+            return []
+        try:
+            with self.engine.begin() as conn:
+                for city in cities:
+                    record_etl_run(conn, city)
+        except Exception:
+            with self._unpublished_lock:
+                self._unpublished.update(cities)
+            raise
+        return cities
+
+    async def _version_timer(self):
+        """Tiap version_interval detik, termasuk saat tidak ada batch masuk."""
+        while True:
+            await asyncio.sleep(self.version_interval)
+            try:
+                cities = await asyncio.to_thread(self._publish_versions)
+            except Exception:
+                logger.exception("❌ Gagal menaikkan versi data, dicoba lagi tick berikutnya")
+                continue
+            if cities:
+                logger.info("🔖 Versi data dinaikkan: %s", ", ".join(cities))
+
+    def _write_dead_letter(self, batch):
+        """Menambahkan event batch yang gagal ke file dead-letter (satu JSON per baris)."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.dead_letter_path)), exist_ok=True)
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for event, _ in batch:
+                f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+
+    async def _write_with_retry(self, batch):
+        """
+        Menulis batch, retry dengan jeda berlipat jika gagal. Selama retry batch tetap dipegang
+        dan antrean tidak dikonsumsi (backpressure ke sumber). None jika semua percobaan gagal.
+        """
+        delay = RETRY_BACKOFF
+        for attempt in range(1, self.write_attempts + 1):
+            try:
+                return await asyncio.to_thread(self._write_batch, batch)
+            except Exception:
+                self.metrics.inc("waste_ingest_batch_errors_total")
+                logger.exception("❌ Gagal menulis batch (%d event), percobaan %d/%d",
+                                 len(batch), attempt, self.write_attempts)
+            if attempt < self.write_attempts:
+                self.metrics.inc("waste_ingest_batch_retries_total")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_BACKOFF_MAX)
+        return None
+
+    async def run(self, stop):
+        """Loop konsumen: berjalan sampai `stop` di-set (sumber sudah berhenti) dan antrean kosong."""
+        timer = asyncio.create_task(self._version_timer())
+        try:
+            await self._consume(stop)
+        finally:
+            timer.cancel()
+            await asyncio.gather(timer, return_exceptions=True)
+            # Baris batch terakhir langsung terlihat, tanpa menunggu run ELT berikutnya
+            cities = await asyncio.to_thread(self._publish_versions)
+            if cities:
+                logger.info("🔖 Versi data dinaikkan: %s", ", ".join(cities))
+
+    async def _consume(self, stop):
+        while not (stop.is_set() and self.queue.empty()):
+            batch = await self._next_batch()
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            result = await self._write_with_retry(batch)
+            if result is None:
+                # Batch tidak di-retry tanpa batas: disimpan ke dead-letter lalu lanjut
+                await asyncio.to_thread(self._write_dead_letter, batch)
+                self.metrics.inc("waste_ingest_events_dead_letter_total", len(batch))
+                logger.error("🪦 Batch %d event dipindah ke dead-letter %s", len(batch), self.dead_letter_path)
+                continue
+            n_loaded, n_fact, n_rejected, n_duplicate = result
+            committed = time.time()
+
+            self.metrics.write_seconds.observe(time.perf_counter() - started)
+            self.metrics.batch_size.observe(len(batch))
+            self.metrics.inc("waste_ingest_batches_total")
+            self.metrics.inc("waste_ingest_events_loaded_total", n_loaded)
+            self.metrics.inc("waste_ingest_events_rejected_total", n_rejected)
+            self.metrics.inc("waste_ingest_fact_rows_total", n_fact)
+            self.metrics.inc("waste_ingest_events_duplicate_total", n_duplicate)
+            for event, received in batch:
+                self.metrics.latency.observe(max(committed - _event_timestamp(event.get("event_time"), received), 0.0))
+            logger.info("📦 Batch %d event -> %d dimuat, %d ditolak, %d duplikat, %d baris fakta",
+                        len(batch), n_loaded, n_rejected, n_duplicate, n_fact)
+
+
+async def tail_jsonl(ingestor, path, stop, from_start=False, poll=0.5):
+    """Membaca baris baru dari file JSONL (seperti `tail -f`), termasuk saat file di-rotate."""
+    handle, inode = None, None
+    while not stop.is_set():
+        if handle is None:
+            try:
+                handle = open(path, "rb")
+                inode = os.fstat(handle.fileno()).st_ino
+                if not from_start:
+                    handle.seek(0, os.SEEK_END)
+                from_start = True  # file hasil rotate selalu dibaca dari awal
+            except FileNotFoundError:
+                await asyncio.sleep(poll)
+                continue
+
+        line = handle.readline()
+        if line.endswith(b"\n"):
+            await ingestor.submit_line(line.decode("utf-8", errors="replace"))
+            continue
+        if line:
+            # Baris belum lengkap (penulis belum selesai): mundur dan coba lagi nanti
+            handle.seek(-len(line), os.SEEK_CUR)
+
+        try:
+            rotated = os.stat(path).st_ino != inode
+        except FileNotFoundError:
+            rotated = True
+        if rotated:
+            handle.close()
+            handle = None
+        else:
+            await asyncio.sleep(poll)
+    if handle is not None:
+        handle.close()
+
+
+async def serve_socket(ingestor, host, port):
+    """Server TCP: satu event JSON per baris. Pembacaan berhenti selama antrean penuh."""
+    async def handle(reader, writer):
+        peer = writer.get_extra_info("peername")
+        try:
+            while line := await reader.readline():
+                await ingestor.submit_line(line.decode("utf-8", errors="replace"))
+        finally:
+            writer.close()
+            logger.info("🔌 Koneksi %s ditutup", peer)
+
+    return await asyncio.start_server(handle, host, port, limit=1 << 20)
+
+
+async def serve_metrics(metrics, host, port):
+    """Endpoint /metrics (teks Prometheus) minimal di atas asyncio."""
+    async def handle(reader, writer):
+        request = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        if request.split(b" ")[1:2] == [b"/metrics"]:
+            body, status = metrics.render().encode("utf-8"), "200 OK"
+        else:
+            body, status = b"not found\n", "404 Not Found"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body
+        )
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def main(args):
+    ingestor = StreamIngestor(batch_size=args.batch_size, max_wait=args.max_wait, queue_size=args.queue_size,
+                              write_attempts=args.write_attempts, dead_letter_path=args.dead_letter)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    servers, sources = [], []
+    if args.metrics_port:
+        servers.append(await serve_metrics(ingestor.metrics, args.metrics_host, args.metrics_port))
+    if args.socket:
+        host, _, port = args.socket.rpartition(":")
+        servers.append(await serve_socket(ingestor, host or "0.0.0.0", int(port)))
+    if args.jsonl:
+        sources.append(asyncio.create_task(tail_jsonl(ingestor, args.jsonl, stop, from_start=args.from_start)))
+    if not (args.socket or args.jsonl):
+        raise SystemExit("Minimal satu sumber: --jsonl dan/atau --socket")
+
+    logger.info("🚰 Ingestor berjalan (batch %d event / %.1f detik, antrean %d)",
+                args.batch_size, args.max_wait, args.queue_size)
+    drained = asyncio.Event()
+    consumer = asyncio.create_task(ingestor.run(drained))
+
+    # Saat berhenti: tutup sumber dulu, lalu biarkan konsumen menulis sisa antrean
+    await stop.wait()
+    for server in servers:
+        server.close()
+    await asyncio.gather(*sources, return_exceptions=True)
+    drained.set()
+    await consumer
+    logger.info("✅ Ingestor berhenti. %s", ingestor.metrics.counters)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Ingestor stream event timbangan Waste Tracker")
+    parser.add_argument("--jsonl", help="File JSONL yang di-tail")
+    parser.add_argument("--from-start", action="store_true", help="Baca file JSONL dari awal, bukan hanya baris baru")
+    parser.add_argument("--socket", help="host:port server TCP (JSON per baris)")
+    parser.add_argument("--metrics-host", default="0.0.0.0")
+    parser.add_argument("--metrics-port", type=int, default=9108)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-wait", type=float, default=MAX_WAIT)
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--write-attempts", type=int, default=WRITE_ATTEMPTS)
+    parser.add_argument("--dead-letter", default=DEAD_LETTER_PATH, help="File JSONL untuk batch yang gagal ditulis")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,214 @@
+# elt/kecamatan_alias.py
+"""
+Resolusi nama kecamatan kotor ke nama resmi (nama di GeoJSON peta).
+
+Pembersihan regex di view staging hanya menyamakan huruf besar & tanda baca, sehingga
+varian seperti "KEB. BARU" atau "KEBAYORAN BRU" menjadi kecamatan baru yang tidak cocok
+dengan peta maupun armada. Di sini:
+
+  staging.kecamatan_ref    nama resmi per kota (diisi dari artefak GeoJSON kota tsb,
+                           warehouse/geo.py), ber-index trigram (pg_trgm, GiST) untuk
+                           pencarian kemiripan
+  staging.kecamatan_alias  cache hasil resolusi: satu baris per (kota, nama mentah yang sudah
+                           dibersihkan regex), dipakai view staging lewat LEFT JOIN
+
+Setiap nama mentah hanya dicocokkan sekali (saat pertama kali muncul). Urutan aturan:
+  1. exact    sama persis dengan nama resmi (spasi diabaikan)
+  2. prefix   tiap kata adalah awalan kata nama resmi, dan hanya satu kandidat ("KEB BARU")
+  3. trigram  kemiripan >= MIN_SIMILARITY dan unggul >= MIN_MARGIN dari kandidat kedua
+Nama yang tidak lolos disimpan dengan kecamatan NULL (dicoba lagi di run berikutnya),
+dilaporkan, dan tetap dipakai apa adanya oleh view sehingga barisnya tidak hilang.
+Alias manual (method 'manual') tidak pernah ditimpa.
+
+Cara pakai:
+    python elt/kecamatan_alias.py                          # daftar nama yang belum terselesaikan
+    python elt/kecamatan_alias.py --set "KEB LAMA=KEBAYORAN LAMA" [--city jakarta]
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+
+from sqlalchemy import text
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils import get_engine
+from warehouse.city import DEFAULT_CITY
+
+logger = logging.getLogger("waste_tracker")
+
+MIN_SIMILARITY = 0.45
+MIN_MARGIN = 0.1
+N_CANDIDATES = 5
+
+# Sama dengan pembersihan di view staging (elt/setup_elt.py)
+CLEAN_SQL = "TRIM(REGEXP_REPLACE(UPPER({col}), '[^A-Z0-9 ]', '', 'g'))"
+
+# Nama mentah (sudah dibersihkan) yang belum punya hasil resolusi; {source} = daftar (city, alias).
+# Kota yang belum punya nama resmi dilewati: view memakai nama hasil regex apa adanya.
+Q_NEW_NAMES = """
+SELECT DISTINCT n.city, n.alias FROM ({source}) n
+LEFT JOIN staging.kecamatan_alias a ON a.city = n.city AND a.alias = n.alias
+WHERE n.alias IS NOT NULL AND n.alias <> ''
+  AND (a.alias IS NULL OR (a.kecamatan IS NULL AND a.method <> 'manual'))
+  AND EXISTS (SELECT 1 FROM staging.kecamatan_ref r WHERE r.city = n.city);
+"""
+NAMES_CITY = f"""
+    SELECT city, {CLEAN_SQL.format(col='kecamatan')} AS alias FROM staging.raw_waste WHERE city = :city
+    UNION SELECT city, {CLEAN_SQL.format(col='kecamatan')} FROM staging.raw_sipsn WHERE city = :city
+    UNION SELECT city, {CLEAN_SQL.format(col='kecamatan')} FROM staging.raw_waste_events WHERE city = :city
+"""
+NAMES_BATCH = f"""
+    SELECT city, {CLEAN_SQL.format(col='kecamatan')} AS alias FROM staging.raw_waste_events WHERE batch_id = :batch_id
+"""
+
+# Kandidat terdekat per nama di kota yang sama lewat KNN trigram
+# (operator <-> memakai index GiST (city, kecamatan))
+Q_CANDIDATES = f"""
+SELECT n.city, n.alias, c.kecamatan, similarity(c.kecamatan, n.alias) AS score
+FROM unnest(CAST(:cities AS TEXT[]), CAST(:names AS TEXT[])) AS n(city, alias)
+CROSS JOIN LATERAL (
+    SELECT r.kecamatan FROM staging.kecamatan_ref r
+    WHERE r.city = n.city
+    ORDER BY r.kecamatan <-> n.alias
+    LIMIT {N_CANDIDATES}
+) c;
+"""
+
+Q_UPSERT = """
+INSERT INTO staging.kecamatan_alias (city, alias, kecamatan, method, score, updated_at)
+VALUES (:city, :alias, :kecamatan, :method, :score, now())
+ON CONFLICT (city, alias) DO UPDATE
+SET kecamatan = EXCLUDED.kecamatan, method = EXCLUDED.method, score = EXCLUDED.score, updated_at = now()
+WHERE staging.kecamatan_alias.method <> 'manual';
+"""
+
+Q_UNRESOLVED = f"""
+SELECT a.city, a.alias, COUNT(w.kecamatan) AS n_rows
+FROM staging.kecamatan_alias a
+LEFT JOIN staging.raw_waste w ON w.city = a.city AND {CLEAN_SQL.format(col='w.kecamatan')} = a.alias
+WHERE a.kecamatan IS NULL AND (CAST(:city AS TEXT) IS NULL OR a.city = :city)
+GROUP BY a.city, a.alias
+ORDER BY n_rows DESC, a.city, a.alias;
+"""
+
+def clean_name(name):
+    """Padanan Python untuk CLEAN_SQL."""
+    return re.sub(r"[^A-Z0-9 ]", "", name.upper()).strip()
+
+def match_kecamatan(alias, candidates):
+    """
+    Memilih nama resmi untuk `alias` dari kandidat [(kecamatan, skor trigram)], urut skor menurun.
+    Mengembalikan (kecamatan, method, skor); kecamatan None jika tidak yakin.
+    """
+    words = alias.split()
+    for kecamatan, score in candidates:
+        if "".join(words) == kecamatan.replace(" ", ""):
+            return kecamatan, "exact", 1.0
+
+    prefix = [(k, s) for k, s in candidates
+              if len(words) <= len(k.split()) and all(r.startswith(w) for w, r in zip(words, k.split()))]
+    if len(prefix) == 1:
+        return prefix[0][0], "prefix", prefix[0][1]
+
+    if candidates:
+        best, best_score = candidates[0]
+        runner_up = candidates[1][1] if len(candidates) > 1 else 0.0
+        if best_score >= MIN_SIMILARITY and best_score - runner_up >= MIN_MARGIN:
+            return best, "trigram", best_score
+        return None, "unresolved", best_score
+    return None, "unresolved", None
+
+def seed_kecamatan_ref(conn, names, city=DEFAULT_CITY):
+    """Mendaftarkan nama resmi (+ alias identitas) satu kota dari peta. Mengembalikan jumlah nama."""
+    names = sorted({n for n in names if n})
+    if not names:
+        return 0
+    conn.execute(text("""
+    INSERT INTO staging.kecamatan_ref (city, kecamatan)
+    SELECT :city, unnest(CAST(:names AS TEXT[])) ON CONFLICT DO NOTHING;
+    """), {"city": city, "names": names})
+    conn.execute(text(Q_UPSERT), [{"city": city, "alias": n, "kecamatan": n, "method": "exact", "score": 1.0}
+                                  for n in names])
+    return len(names)
+
+def _ref_names_from_geo(city):
+    from warehouse.city import city_data_dir
+    from warehouse.geo import load_geo_artifact
+
+    try:
+        artifact = load_geo_artifact(city_data_dir(city))
+    except Exception as e:
+        logger.warning("Artefak peta %s tidak bisa dibaca: %s", city, e)
+        return []
+    return [f["properties"]["kecamatan"] for f in artifact["features"]] if artifact else []
+
+def resolve_kecamatan_aliases(conn=None, batch_id=None, city=DEFAULT_CITY):
+    """
+    Mencocokkan nama mentah baru di staging ke nama resmi (di kota yang sama) dan menyimpannya
+    ke kecamatan_alias.
+    Tanpa batch_id: semua tabel raw milik `city`, dan nama resmi kota tsb di-seed ulang dari
+    peta (run batch harian per kota).
+    Dengan batch_id: hanya nama di satu batch event stream (semua kota di batch tsb, di
+    transaksi batch tsb).
+    Mengembalikan (jumlah nama baru yang terselesaikan, [nama yang belum terselesaikan]).
+    """
+    if conn is None:
+        with get_engine().begin() as conn:
+            return resolve_kecamatan_aliases(conn, batch_id, city)
+
+    if batch_id is None:
+        seed_kecamatan_ref(conn, _ref_names_from_geo(city), city)
+
+    source = NAMES_CITY if batch_id is None else NAMES_BATCH
+    names = conn.execute(text(Q_NEW_NAMES.format(source=source)), {"batch_id": batch_id, "city": city}).all()
+    if not names:
+        return 0, []
+
+    candidates = {}
+    for r in conn.execute(text(Q_CANDIDATES), {"cities": [n.city for n in names], "names": [n.alias for n in names]}):
+        candidates.setdefault((r.city, r.alias), []).append((r.kecamatan, float(r.score)))
+
+    rows, unresolved = [], []
+    for name_city, alias in names:
+        ranked = sorted(candidates.get((name_city, alias), []), key=lambda c: -c[1])
+        kecamatan, method, score = match_kecamatan(alias, ranked)
+        rows.append({"city": name_city, "alias": alias, "kecamatan": kecamatan, "method": method, "score": score})
+        if kecamatan is None:
+            unresolved.append(alias)
+    conn.execute(text(Q_UPSERT), rows)
+    return len(rows) - len(unresolved), unresolved
+
+def report_unresolved(conn, city=None):
+    """[(kota, nama mentah, jumlah baris raw_waste)] untuk nama yang belum terselesaikan."""
+    return [(r.city, r.alias, r.n_rows) for r in conn.execute(text(Q_UNRESOLVED), {"city": city})]
+
+def set_manual_alias(conn, alias, kecamatan, city=DEFAULT_CITY):
+    """Alias manual dari operator; menimpa hasil otomatis dan tidak akan ditimpa balik."""
+    conn.execute(text("""
+    INSERT INTO staging.kecamatan_alias (city, alias, kecamatan, method, score, updated_at)
+    VALUES (:city, :alias, :kecamatan, 'manual', NULL, now())
+    ON CONFLICT (city, alias) DO UPDATE
+    SET kecamatan = EXCLUDED.kecamatan, method = 'manual', score = NULL, updated_at = now();
+    """), {"city": city, "alias": alias, "kecamatan": kecamatan})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Alias nama kecamatan Waste Tracker")
+    parser.add_argument("--set", metavar="ALIAS=KECAMATAN", action="append", default=[],
+                        help="Tambah alias manual (nama mentah setelah dibersihkan = nama resmi)")
+    parser.add_argument("--city", default=None,
+                        help=f"Kode kota (default: semua kota untuk laporan, {DEFAULT_CITY} untuk --set)")
+    args = parser.parse_args()
+
+    with get_engine().begin() as conn:
+        for item in args.set:
+            alias, _, kecamatan = (clean_name(part) for part in item.partition("="))
+            set_manual_alias(conn, alias, kecamatan, args.city or DEFAULT_CITY)
+            print(f"✅ Alias manual ({args.city or DEFAULT_CITY}): {alias} -> {kecamatan}")
+
+        unresolved = report_unresolved(conn, args.city)
+    if not unresolved:
+        print("✅ Semua nama kecamatan terselesaikan.")
+    for city, alias, n_rows in unresolved:
+        print(f"⚠️ {city}: {alias!r} belum dikenali ({n_rows} baris raw_waste)")
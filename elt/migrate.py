@@ -0,0 +1,148 @@
+# elt/migrate.py
+"""
+Migrasi skema berversi (elt/migrations/NNNN_nama.sql).
+
+Mengirim ulang seluruh DDL (CREATE OR REPLACE VIEW, ALTER TABLE ... ADD COLUMN IF NOT EXISTS,
+blok DO upgrade) di setiap run berarti lock ACCESS EXCLUSIVE di setiap run, termasuk pada
+warehouse.etl_runs yang dibaca dashboard & read API. Karena itu skema dikelola sebagai satu
+riwayat migrasi (dipakai setup_elt_database dan reset elt/create_tables.py):
+
+  - file .sql di elt/migrations diurutkan menurut nomor versinya; yang sudah dijalankan
+    dicatat di warehouse.schema_migrations (versi, nama, checksum, durasi)
+  - migrate() membandingkan versi database dengan versi file terakhir (satu SELECT kecil);
+    jika sama, tidak ada DDL yang dikirim sama sekali
+  - migrasi yang tertunda dijalankan masing-masing dalam satu transaksi di bawah advisory lock
+    MIGRATION_LOCK, sehingga pipeline / DAG yang start bersamaan tidak menjalankannya dua kali
+  - 0001-0003 adalah skema saat migrasi diperkenalkan, termasuk blok DO yang meng-upgrade
+    database lama; database yang sudah ada cukup menjalankannya sekali
+
+Perubahan skema berikutnya = file baru dengan nomor berikutnya (jangan ubah file yang sudah
+dijalankan; checksum yang berbeda dilaporkan oleh `status`). Tulis migrasi secara idempoten
+(IF NOT EXISTS / OR REPLACE): reset warehouse (elt/create_tables.py) memutar ulang semuanya.
+
+Cara pakai:
+    python elt/migrate.py              # jalankan migrasi yang tertunda
+    python elt/migrate.py status
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+import time
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils import get_engine
+
+logger = logging.getLogger("waste_tracker")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_LOCK = 7303
+FILE_PATTERN = re.compile(r"^(\d{4})_([a-z0-9_]+)\.sql$")
+
+Q_CREATE_MIGRATIONS = """
+CREATE SCHEMA IF NOT EXISTS warehouse;
+CREATE TABLE IF NOT EXISTS warehouse.schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    checksum CHAR(16) NOT NULL,         -- sha1 isi file saat dijalankan
+    applied_at TIMESTAMP NOT NULL DEFAULT now(),
+    duration_ms DOUBLE PRECISION
+);
+"""
+
+def load_migrations(path=MIGRATIONS_DIR):
+    """[(versi, nama, sql)] urut versi. Nama file harus NNNN_nama.sql dan versinya unik."""
+    migrations = []
+    for file_name in sorted(os.listdir(path)):
+        match = FILE_PATTERN.match(file_name)
+        if not match:
+            continue
+        with open(os.path.join(path, file_name), encoding="utf-8") as f:
+            migrations.append((int(match.group(1)), match.group(2), f.read()))
+    versions = [v for v, _, _ in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"Nomor versi migrasi ganda di {path}")
+    return migrations
+
+def checksum(sql):
+    return hashlib.sha1(sql.encode("utf-8")).hexdigest()[:16]
+
+def schema_version(conn):
+    """Versi migrasi terakhir yang sudah dijalankan (0 jika belum pernah)."""
+    if conn.execute(text("SELECT to_regclass('warehouse.schema_migrations') IS NULL;")).scalar():
+        return 0
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM warehouse.schema_migrations;")).scalar()
+
+def migrate(engine=None, migrations=None):
+    """
+    Menjalankan migrasi yang belum tercatat. Mengembalikan [(versi, nama)] yang baru dijalankan
+    ([] jika skema sudah terbaru: hanya satu query pengecekan versi).
+    """
+    engine = engine or get_engine()
+    migrations = migrations if migrations is not None else load_migrations()
+    if not migrations:
+        return []
+
+    with engine.connect() as conn:
+        if schema_version(conn) >= migrations[-1][0]:
+            return []
+
+    applied = []
+    for version, name, sql in migrations:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key);"), {"key": MIGRATION_LOCK})
+            conn.execute(text(Q_CREATE_MIGRATIONS))
+            done = conn.execute(text("SELECT 1 FROM warehouse.schema_migrations WHERE version = :version;"),
+                                {"version": version}).first()
+            if done:
+                continue   # sudah dijalankan (juga oleh proses lain selagi menunggu lock)
+            t = time.perf_counter()
+            conn.execute(text(sql))
+            duration_ms = (time.perf_counter() - t) * 1000
+            conn.execute(text("""
+            INSERT INTO warehouse.schema_migrations (version, name, checksum, duration_ms)
+            VALUES (:version, :name, :checksum, :duration_ms);
+            """), {"version": version, "name": name, "checksum": checksum(sql), "duration_ms": duration_ms})
+        logger.info("Migrasi %04d_%s dijalankan (%.0f ms)", version, name, duration_ms)
+        applied.append((version, name))
+    return applied
+
+def migration_status(conn, migrations=None):
+    """[(versi, nama, status, applied_at)] dengan status 'applied' / 'pending' / 'changed' (file diubah setelah dijalankan)."""
+    migrations = migrations if migrations is not None else load_migrations()
+    recorded = {}
+    if schema_version(conn):
+        recorded = {r.version: r for r in conn.execute(text(
+            "SELECT version, checksum, applied_at FROM warehouse.schema_migrations;"
+        ))}
+    status = []
+    for version, name, sql in migrations:
+        row = recorded.get(version)
+        if row is None:
+            status.append((version, name, "pending", None))
+        else:
+            status.append((version, name, "applied" if row.checksum == checksum(sql) else "changed", row.applied_at))
+    return status
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Migrasi skema berversi Waste Tracker")
+    parser.add_argument("command", nargs="?", choices=["up", "status"], default="up")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        with get_engine().connect() as conn:
+            rows = migration_status(conn)
+        for version, name, status, applied_at in rows:
+            print(f"{version:04d}_{name:<32} {status:<8} {applied_at or ''}")
+        sys.exit(1 if any(s == "changed" for _, _, s, _ in rows) else 0)
+
+    applied = migrate()
+    if applied:
+        print(f"✅ {len(applied)} migrasi dijalankan: {', '.join(f'{v:04d}_{n}' for v, n in applied)}")
+    else:
+        print("✅ Skema sudah versi terbaru.")
@@ -0,0 +1,87 @@
+-- 0001: tabel staging (raw CSV, event stream, kamus & alias kecamatan)
+
+CREATE SCHEMA IF NOT EXISTS staging;
+
+-- Tabel raw menyimpan kode kota (warehouse/city.py). Tidak di-drop saat setup: pipeline
+-- per kota hanya mengganti baris kotanya sendiri, sehingga kota lain tidak terganggu.
+-- Baris lama tanpa kota dianggap milik kota default ('jakarta').
+
+-- Raw Waste: Semua kolom TEXT agar loading tidak pernah gagal
+CREATE TABLE IF NOT EXISTS staging.raw_waste (
+    tanggal TEXT,
+    kecamatan TEXT,
+    volume_ton TEXT,
+    jenis_sampah TEXT,
+    sumber_sampah TEXT,
+    city TEXT NOT NULL DEFAULT 'jakarta'
+);
+ALTER TABLE staging.raw_waste ADD COLUMN IF NOT EXISTS city TEXT NOT NULL DEFAULT 'jakarta';
+CREATE INDEX IF NOT EXISTS raw_waste_city_idx ON staging.raw_waste (city);
+
+-- Raw SIPSN
+CREATE TABLE IF NOT EXISTS staging.raw_sipsn (
+    kecamatan TEXT,
+    armada_total TEXT,
+    armada_operasional TEXT,
+    ritase_harian TEXT,
+    kapasitas_m3 TEXT,
+    penduduk TEXT,
+    luas_km2 TEXT,
+    city TEXT NOT NULL DEFAULT 'jakarta'
+);
+ALTER TABLE staging.raw_sipsn ADD COLUMN IF NOT EXISTS city TEXT NOT NULL DEFAULT 'jakarta';
+
+-- Raw Waste Events: event timbangan dari ingestor stream (elt/ingest_stream.py).
+-- Tidak di-drop saat setup karena terus diisi di antara run batch harian.
+CREATE TABLE IF NOT EXISTS staging.raw_waste_events (
+    batch_id BIGINT NOT NULL,
+    event_id TEXT,
+    event_time TEXT,
+    received_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    tanggal TEXT,
+    kecamatan TEXT,
+    volume_ton TEXT,
+    jenis_sampah TEXT,
+    sumber_sampah TEXT,
+    city TEXT NOT NULL DEFAULT 'jakarta'
+);
+ALTER TABLE staging.raw_waste_events ADD COLUMN IF NOT EXISTS city TEXT NOT NULL DEFAULT 'jakarta';
+CREATE INDEX IF NOT EXISTS raw_waste_events_batch_idx ON staging.raw_waste_events (batch_id);
+CREATE SEQUENCE IF NOT EXISTS staging.raw_waste_events_batch_seq;
+
+-- Resolusi nama kecamatan (elt/kecamatan_alias.py): nama resmi dari GeoJSON peta
+-- (index trigram untuk pencarian kemiripan) dan cache hasil pencocokan nama mentah.
+-- Tidak di-drop: alias yang sudah terselesaikan / manual dipakai lintas run.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+-- Nama resmi & alias berlaku per kota.
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+CREATE TABLE IF NOT EXISTS staging.kecamatan_ref (
+    city TEXT NOT NULL DEFAULT 'jakarta',
+    kecamatan TEXT NOT NULL,
+    PRIMARY KEY (city, kecamatan)
+);
+CREATE TABLE IF NOT EXISTS staging.kecamatan_alias (
+    city TEXT NOT NULL DEFAULT 'jakarta',
+    alias TEXT NOT NULL,                -- nama mentah setelah pembersihan regex
+    kecamatan TEXT,                     -- nama resmi; NULL = belum terselesaikan
+    method VARCHAR(10) NOT NULL,        -- exact / prefix / trigram / manual / unresolved
+    score REAL,
+    updated_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (city, alias)
+);
+
+-- Upgrade tabel alias versi lama (satu kota, key hanya nama)
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'staging' AND table_name = 'kecamatan_alias' AND column_name = 'city'
+    ) THEN
+        DROP INDEX IF EXISTS staging.kecamatan_ref_trgm_idx;
+        ALTER TABLE staging.kecamatan_ref ADD COLUMN city TEXT NOT NULL DEFAULT 'jakarta';
+        ALTER TABLE staging.kecamatan_ref DROP CONSTRAINT kecamatan_ref_pkey, ADD PRIMARY KEY (city, kecamatan);
+        ALTER TABLE staging.kecamatan_alias ADD COLUMN city TEXT NOT NULL DEFAULT 'jakarta';
+        ALTER TABLE staging.kecamatan_alias DROP CONSTRAINT kecamatan_alias_pkey, ADD PRIMARY KEY (city, alias);
+    END IF;
+END $$;
+CREATE INDEX IF NOT EXISTS kecamatan_ref_trgm_idx ON staging.kecamatan_ref USING gist (city, kecamatan gist_trgm_ops);
@@ -0,0 +1,79 @@
+-- 0002: view pembersihan staging (dibaca pipeline warehouse)
+
+-- Nama kecamatan: pembersihan regex, lalu dipetakan ke nama resmi lewat staging.kecamatan_alias.
+-- Nama yang belum terselesaikan tetap dipakai apa adanya (dilaporkan oleh elt/kecamatan_alias.py).
+
+-- VIEW: Waste Events Cleaned (aturan pembersihan sama dengan view_waste_clean)
+CREATE OR REPLACE VIEW staging.view_waste_events_clean AS
+SELECT
+    e.batch_id,
+    e.tanggal,
+    COALESCE(a.kecamatan, e.kecamatan) AS kecamatan,
+    e.volume_ton,
+    e.jenis_sampah,
+    e.sumber_sampah,
+    e.city
+FROM (
+    SELECT
+        batch_id,
+        TO_DATE(tanggal, 'YYYY-MM-DD') AS tanggal,
+        TRIM(REGEXP_REPLACE(UPPER(kecamatan), '[^A-Z0-9 ]', '', 'g')) AS kecamatan,
+        CAST(NULLIF(volume_ton, '') AS DECIMAL(10,2)) AS volume_ton,
+        jenis_sampah,
+        sumber_sampah,
+        city
+    FROM staging.raw_waste_events
+    WHERE volume_ton IS NOT NULL
+) e
+LEFT JOIN staging.kecamatan_alias a ON a.city = e.city AND a.alias = e.kecamatan;
+
+-- VIEW: Waste Cleaned
+-- Membersihkan spasi, karakter aneh, dan casting tipe data
+-- Event stream ikut di-union agar rebuild harian fact_waste tidak menghapus data stream.
+CREATE OR REPLACE VIEW staging.view_waste_clean AS
+SELECT
+    w.tanggal,
+    COALESCE(a.kecamatan, w.kecamatan) AS kecamatan,
+    w.volume_ton,
+    w.jenis_sampah,
+    w.sumber_sampah,
+    w.city
+FROM (
+    SELECT
+        TO_DATE(tanggal, 'YYYY-MM-DD') AS tanggal,
+        -- LOGIKA AGGRESSIVE CLEAN DI SQL:
+        -- 1. UpperCase
+        -- 2. Hapus karakter non-alphanumeric (kecuali spasi)
+        -- 3. Trim spasi ganda menjadi tunggal
+        TRIM(REGEXP_REPLACE(UPPER(kecamatan), '[^A-Z0-9 ]', '', 'g')) AS kecamatan,
+        CAST(NULLIF(volume_ton, '') AS DECIMAL(10,2)) AS volume_ton,
+        jenis_sampah,
+        sumber_sampah,
+        city
+    FROM staging.raw_waste
+    WHERE volume_ton IS NOT NULL
+) w
+LEFT JOIN staging.kecamatan_alias a ON a.city = w.city AND a.alias = w.kecamatan
+UNION ALL
+SELECT tanggal, kecamatan, volume_ton, jenis_sampah, sumber_sampah, city
+FROM staging.view_waste_events_clean;
+
+-- VIEW: SIPSN Cleaned
+CREATE OR REPLACE VIEW staging.view_sipsn_clean AS
+SELECT
+    COALESCE(a.kecamatan, s.kecamatan) AS kecamatan,
+    s.armada_total, s.armada_operasional, s.ritase_harian, s.kapasitas_m3, s.penduduk, s.luas_km2,
+    s.city
+FROM (
+    SELECT
+        TRIM(REGEXP_REPLACE(UPPER(kecamatan), '[^A-Z0-9 ]', '', 'g')) AS kecamatan,
+        CAST(NULLIF(armada_total, '') AS INTEGER) AS armada_total,
+        CAST(NULLIF(armada_operasional, '') AS INTEGER) AS armada_operasional,
+        CAST(NULLIF(ritase_harian, '') AS DECIMAL(5,1)) AS ritase_harian,
+        CAST(NULLIF(kapasitas_m3, '') AS DECIMAL(10,1)) AS kapasitas_m3,
+        CAST(NULLIF(penduduk, '') AS INTEGER) AS penduduk,
+        CAST(NULLIF(luas_km2, '') AS DECIMAL(10,2)) AS luas_km2,
+        city
+    FROM staging.raw_sipsn
+) s
+LEFT JOIN staging.kecamatan_alias a ON a.city = s.city AND a.alias = s.kecamatan;
@@ -0,0 +1,333 @@
+-- 0003: skema warehouse (dimensi, fakta terpartisi, tier rollup, kubus, tabel pendukung)
+
+CREATE SCHEMA IF NOT EXISTS warehouse;
+
+-- Dimensi Waktu (smart key yyyymmdd: urutan id = urutan tanggal, dipakai sub-partisi bulan fact_waste)
+CREATE TABLE IF NOT EXISTS warehouse.dim_time (
+    id INTEGER PRIMARY KEY,
+    date DATE UNIQUE,
+    year INTEGER,
+    month INTEGER,
+    day INTEGER
+);
+
+-- Dimensi Kota (diisi dari data/cities.json oleh register_cities, warehouse/city.py)
+CREATE TABLE IF NOT EXISTS warehouse.dim_city (
+    id SMALLSERIAL PRIMARY KEY,
+    code VARCHAR(32) NOT NULL UNIQUE,   -- juga nama partisi fact_waste_<code>
+    name VARCHAR(100),
+    center_lat DOUBLE PRECISION,        -- titik tengah & zoom peta dashboard
+    center_lon DOUBLE PRECISION,
+    zoom REAL
+);
+
+-- Dimensi Lokasi (nama kecamatan unik per kota)
+CREATE TABLE IF NOT EXISTS warehouse.dim_location (
+    id SERIAL PRIMARY KEY,
+    city_id SMALLINT NOT NULL REFERENCES warehouse.dim_city(id),
+    kecamatan VARCHAR(100),
+    kota_administrasi VARCHAR(100),
+    penduduk INTEGER,
+    luas_km2 DECIMAL,
+    CONSTRAINT dim_location_city_kecamatan_key UNIQUE (city_id, kecamatan)
+);
+
+-- Dimensi Armada (SCD Type 2: satu baris per versi armada)
+-- validity = [valid_from, valid_to), dijaga tidak tumpang tindih per kecamatan (EXCLUDE GiST).
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+CREATE TABLE IF NOT EXISTS warehouse.dim_fleet (
+    id SERIAL PRIMARY KEY,
+    city_id SMALLINT NOT NULL REFERENCES warehouse.dim_city(id),
+    kecamatan VARCHAR(100) NOT NULL,
+    armada_total INTEGER,
+    armada_operasional INTEGER,
+    ritase_harian DECIMAL,
+    kapasitas_m3 DECIMAL,
+    valid_from DATE NOT NULL DEFAULT DATE '1900-01-01',
+    valid_to DATE NOT NULL DEFAULT DATE '9999-12-31',
+    validity DATERANGE GENERATED ALWAYS AS (daterange(valid_from, valid_to, '[)')) STORED,
+    CONSTRAINT dim_fleet_no_overlap EXCLUDE USING gist (city_id WITH =, kecamatan WITH =, validity WITH &&)
+);
+
+-- Upgrade dim_fleet versi lama (UNIQUE kecamatan, tanpa riwayat)
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'warehouse' AND table_name = 'dim_fleet' AND column_name = 'valid_from'
+    ) THEN
+        ALTER TABLE warehouse.dim_fleet DROP CONSTRAINT IF EXISTS dim_fleet_kecamatan_key;
+        ALTER TABLE warehouse.dim_fleet
+            ALTER COLUMN kecamatan SET NOT NULL,
+            ADD COLUMN valid_from DATE NOT NULL DEFAULT DATE '1900-01-01',
+            ADD COLUMN valid_to DATE NOT NULL DEFAULT DATE '9999-12-31',
+            ADD COLUMN validity DATERANGE GENERATED ALWAYS AS (daterange(valid_from, valid_to, '[)')) STORED,
+            ADD CONSTRAINT dim_fleet_no_overlap EXCLUDE USING gist (kecamatan WITH =, validity WITH &&);
+    END IF;
+END $$;
+
+-- Upgrade dimensi versi satu kota (tanpa city_id): semua baris lama milik kota default
+DO $$
+DECLARE
+    default_city SMALLINT;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'warehouse' AND table_name = 'dim_location' AND column_name = 'city_id'
+    ) THEN
+        INSERT INTO warehouse.dim_city (code, name) VALUES ('jakarta', 'DKI Jakarta') ON CONFLICT (code) DO NOTHING;
+        SELECT id INTO default_city FROM warehouse.dim_city WHERE code = 'jakarta';
+
+        ALTER TABLE warehouse.dim_location ADD COLUMN city_id SMALLINT REFERENCES warehouse.dim_city(id);
+        UPDATE warehouse.dim_location SET city_id = default_city;
+        ALTER TABLE warehouse.dim_location
+            ALTER COLUMN city_id SET NOT NULL,
+            DROP CONSTRAINT IF EXISTS dim_location_kecamatan_key,
+            ADD CONSTRAINT dim_location_city_kecamatan_key UNIQUE (city_id, kecamatan);
+
+        DROP INDEX IF EXISTS warehouse.dim_fleet_asof_idx;
+        ALTER TABLE warehouse.dim_fleet ADD COLUMN city_id SMALLINT REFERENCES warehouse.dim_city(id);
+        UPDATE warehouse.dim_fleet SET city_id = default_city;
+        ALTER TABLE warehouse.dim_fleet
+            ALTER COLUMN city_id SET NOT NULL,
+            DROP CONSTRAINT dim_fleet_no_overlap,
+            ADD CONSTRAINT dim_fleet_no_overlap EXCLUDE USING gist (city_id WITH =, kecamatan WITH =, validity WITH &&);
+    END IF;
+END $$;
+
+-- Index untuk as-of join (kota & kecamatan = .. AND tanggal >= valid_from AND tanggal < valid_to)
+-- dan lookup versi yang sedang berlaku
+CREATE INDEX IF NOT EXISTS dim_fleet_asof_idx
+    ON warehouse.dim_fleet (city_id, kecamatan, valid_from, valid_to);
+
+-- Dimensi Kategori (jenis_sampah) & Sumber (sumber_sampah): kamus kecil ber-key SMALLINT
+CREATE TABLE IF NOT EXISTS warehouse.dim_category (
+    id SMALLSERIAL PRIMARY KEY,
+    name VARCHAR(50) NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS warehouse.dim_source (
+    id SMALLSERIAL PRIMARY KEY,
+    name VARCHAR(50) NOT NULL UNIQUE
+);
+
+-- Upgrade fact_waste versi lama (category/source VARCHAR, volume DECIMAL, atau belum
+-- dipartisi per kota). Isinya selalu dibangun ulang oleh load_fact_waste, jadi cukup di-drop.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'warehouse' AND c.relname = 'fact_waste' AND c.relkind <> 'p'
+    ) THEN
+        DROP TABLE warehouse.fact_waste CASCADE;
+    END IF;
+END $$;
+
+-- Upgrade ke sub-partisi bulan: dim_time lama ber-id SERIAL diubah ke smart key yyyymmdd,
+-- dan partisi kota yang belum dipecah per bulan di-drop (dibangun ulang oleh load_fact_waste)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM warehouse.dim_time WHERE id <> CAST(to_char(date, 'YYYYMMDD') AS INTEGER))
+       OR EXISTS (
+           SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = to_regclass('warehouse.fact_waste') AND c.relkind <> 'p'
+       ) THEN
+        DROP TABLE IF EXISTS warehouse.fact_waste CASCADE;
+        UPDATE warehouse.dim_time SET id = CAST(to_char(date, 'YYYYMMDD') AS INTEGER);
+        ALTER TABLE warehouse.dim_time ALTER COLUMN id DROP DEFAULT;
+        DROP SEQUENCE IF EXISTS warehouse.dim_time_id_seq;
+    END IF;
+END $$;
+
+-- Fact Waste (baris ringkas: kolom 4 byte dulu, lalu SMALLINT agar tanpa padding).
+-- Dipartisi per kota (LIST city_id): partisi warehouse.fact_waste_<code> dibuat register_cities,
+-- sehingga load satu kota hanya menyentuh partisinya dan query dashboard ter-prune ke satu kota.
+-- Tiap partisi kota dipecah lagi per bulan (RANGE time_id, warehouse.fact_waste_<code>_<yyyymm>)
+-- agar detail lama bisa dilepas utuh oleh retensi (warehouse/retention.py).
+CREATE TABLE IF NOT EXISTS warehouse.fact_waste (
+    id SERIAL,
+    time_id INTEGER REFERENCES warehouse.dim_time(id),
+    location_id INTEGER REFERENCES warehouse.dim_location(id),
+    fleet_id INTEGER REFERENCES warehouse.dim_fleet(id), -- versi armada yang berlaku pada tanggal fakta
+    volume_kg INTEGER NOT NULL,                          -- fixed-point: ton * 1000
+    city_id SMALLINT NOT NULL REFERENCES warehouse.dim_city(id),
+    category_id SMALLINT REFERENCES warehouse.dim_category(id),
+    source_id SMALLINT REFERENCES warehouse.dim_source(id),
+    PRIMARY KEY (city_id, time_id, id)
+) PARTITION BY LIST (city_id);
+
+-- Akses fakta per rentang tanggal (dim_time difilter dulu, lalu lookup ke fakta)
+CREATE INDEX IF NOT EXISTS fact_waste_time_idx ON warehouse.fact_waste (time_id);
+
+-- Tier rollup fact_waste: detail yang sudah melewati masa retensi, dijumlahkan per minggu/bulan
+-- per (kecamatan, versi armada, jenis, sumber). Minggu dipotong di batas bulan agar satu
+-- baris rollup selalu berasal dari satu partisi bulan.
+CREATE TABLE IF NOT EXISTS warehouse.fact_waste_rollup (
+    city_id SMALLINT NOT NULL REFERENCES warehouse.dim_city(id),
+    grain VARCHAR(5) NOT NULL,          -- 'week' / 'month'
+    period_start DATE NOT NULL,
+    period_end DATE NOT NULL,           -- inklusif
+    location_id INTEGER REFERENCES warehouse.dim_location(id),
+    fleet_id INTEGER REFERENCES warehouse.dim_fleet(id),
+    category_id SMALLINT REFERENCES warehouse.dim_category(id),
+    source_id SMALLINT REFERENCES warehouse.dim_source(id),
+    volume_kg BIGINT NOT NULL,
+    n_rows INTEGER NOT NULL,            -- jumlah baris detail yang dipadatkan
+    CONSTRAINT fact_waste_rollup_key UNIQUE NULLS NOT DISTINCT
+        (city_id, grain, period_start, location_id, fleet_id, category_id, source_id)
+);
+CREATE INDEX IF NOT EXISTS fact_waste_rollup_period_idx
+    ON warehouse.fact_waste_rollup (city_id, period_start, period_end);
+
+-- Batas tier per kota: tanggal < detail_from hanya ada di rollup (tidak di-load ulang dari staging)
+CREATE TABLE IF NOT EXISTS warehouse.fact_retention (
+    city_id SMALLINT PRIMARY KEY REFERENCES warehouse.dim_city(id),
+    detail_from DATE NOT NULL,          -- selalu awal bulan
+    grain VARCHAR(5) NOT NULL,          -- grain rollup untuk data terlambat
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Kubus agregat (OLAP) fact_waste per hari & bulan: GROUPING SETS atas kecamatan x jenis x sumber.
+-- gset = GROUPING(location_id, category_id, source_id), bit 1 = kolom diagregasi (warehouse/cube.py).
+-- Selalu per kota (city_id tidak pernah diagregasi).
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.tables
+        WHERE table_schema = 'warehouse' AND table_name = 'cube_waste'
+    ) AND NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'warehouse' AND table_name = 'cube_waste' AND column_name = 'city_id'
+    ) THEN
+        DROP TABLE warehouse.cube_waste;  -- dibangun ulang oleh refresh_cube_waste (semua hari dianggap berubah)
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS warehouse.cube_waste (
+    grain VARCHAR(5) NOT NULL,          -- 'day' / 'month'
+    period_start DATE NOT NULL,         -- tanggal (day) atau awal bulan (month)
+    city_id SMALLINT NOT NULL,
+    gset SMALLINT NOT NULL,
+    location_id INTEGER,
+    category_id SMALLINT,
+    source_id SMALLINT,
+    volume_kg BIGINT NOT NULL,
+    n_rows INTEGER NOT NULL,
+    checksum BIGINT NOT NULL,           -- jumlah hash isi baris, untuk deteksi hari yang berubah
+    CONSTRAINT cube_waste_key UNIQUE NULLS NOT DISTINCT (grain, period_start, city_id, gset, location_id, category_id, source_id)
+);
+CREATE INDEX IF NOT EXISTS cube_waste_gset_idx ON warehouse.cube_waste (city_id, grain, gset, period_start);
+
+-- Prakiraan volume harian per kecamatan (dibangun ulang setiap load warehouse)
+CREATE TABLE IF NOT EXISTS warehouse.forecast_daily (
+    location_id INTEGER REFERENCES warehouse.dim_location(id),
+    target_date DATE NOT NULL,
+    volume_ton DECIMAL(10, 2),
+    lower_ton DECIMAL(10, 2),
+    upper_ton DECIMAL(10, 2),
+    generated_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (location_id, target_date)
+);
+
+-- State detektor anomali: EWMA mean/variance per (kecamatan, hari dalam minggu)
+CREATE TABLE IF NOT EXISTS warehouse.anomaly_state (
+    location_id INTEGER REFERENCES warehouse.dim_location(id),
+    weekday SMALLINT NOT NULL,          -- 0 = Senin .. 6 = Minggu
+    ewma_mean DOUBLE PRECISION NOT NULL,
+    ewma_var DOUBLE PRECISION NOT NULL,
+    n_obs INTEGER NOT NULL,
+    last_date DATE NOT NULL,            -- watermark: hari terakhir yang sudah diproses
+    PRIMARY KEY (location_id, weekday)
+);
+
+-- Hari-hari yang ditandai sebagai lonjakan volume
+CREATE TABLE IF NOT EXISTS warehouse.anomalies (
+    location_id INTEGER REFERENCES warehouse.dim_location(id),
+    date DATE NOT NULL,
+    volume_ton DECIMAL(10, 2),
+    expected_ton DECIMAL(10, 2),
+    zscore DECIMAL(8, 2),
+    ratio DECIMAL(6, 2),
+    detected_at TIMESTAMP NOT NULL DEFAULT now(),
+    alerted_at TIMESTAMP,
+    PRIMARY KEY (location_id, date)
+);
+
+-- Riwayat run ELT yang selesai; id terakhir = versi data (dipakai ETag read API)
+CREATE TABLE IF NOT EXISTS warehouse.etl_runs (
+    id SERIAL PRIMARY KEY,
+    finished_at TIMESTAMP NOT NULL DEFAULT now(),
+    fact_rows INTEGER,
+    city VARCHAR(32)                    -- kota yang di-load pada run ini (NULL = semua)
+);
+ALTER TABLE warehouse.etl_runs ADD COLUMN IF NOT EXISTS city VARCHAR(32);
+
+-- Profil query SQL (opt-in, WASTE_SQL_PROFILE=1): durasi tiap statement + plan
+-- EXPLAIN (ANALYZE, BUFFERS) untuk statement lambat (elt/query_profile.py)
+CREATE TABLE IF NOT EXISTS warehouse.query_profile (
+    id BIGSERIAL PRIMARY KEY,
+    run_id VARCHAR(64) NOT NULL,
+    recorded_at TIMESTAMP NOT NULL DEFAULT now(),
+    caller VARCHAR(200),
+    fingerprint CHAR(16) NOT NULL,      -- hash statement yang dinormalisasi
+    statement TEXT NOT NULL,
+    duration_ms DOUBLE PRECISION NOT NULL,
+    n_rows INTEGER,
+    plan JSONB,
+    plan_hash CHAR(16)                  -- hash bentuk plan (node, tabel, index), tanpa angka
+);
+CREATE INDEX IF NOT EXISTS query_profile_fp_idx ON warehouse.query_profile (fingerprint, recorded_at);
+CREATE INDEX IF NOT EXISTS query_profile_run_idx ON warehouse.query_profile (run_id);
+
+-- Progres backfill per chunk tanggal (warehouse/backfill.py); chunk 'done' dilewati saat diulang
+CREATE TABLE IF NOT EXISTS warehouse.backfill_progress (
+    backfill_id CHAR(16) NOT NULL,      -- hash (kota, start, end, chunk_days)
+    city VARCHAR(32) NOT NULL,
+    chunk_start DATE NOT NULL,
+    chunk_end DATE NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',  -- pending / running / done / failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    fact_rows INTEGER,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    error TEXT,
+    PRIMARY KEY (backfill_id, chunk_start)
+);
+
+-- Profil file input per load (elt/profiling.py): ringkasan, sketch HLL/t-digest, hasil drift
+CREATE TABLE IF NOT EXISTS warehouse.data_profile (
+    id SERIAL PRIMARY KEY,
+    profiled_at TIMESTAMP NOT NULL DEFAULT now(),
+    city VARCHAR(32) NOT NULL,
+    dataset VARCHAR(16) NOT NULL,       -- waste / sipsn
+    source_file TEXT,
+    n_rows INTEGER NOT NULL,
+    summary JSONB NOT NULL,             -- statistik per kolom (pembanding drift)
+    sketches JSONB NOT NULL,            -- register HLL & centroid t-digest (bisa digabung)
+    drift JSONB NOT NULL DEFAULT '[]',
+    status VARCHAR(5) NOT NULL          -- ok / drift (drift tidak dipakai sebagai pembanding)
+);
+CREATE INDEX IF NOT EXISTS data_profile_city_idx ON warehouse.data_profile (city, dataset, profiled_at);
+
+-- Checkpoint runner pipeline lokal (elt/runner.py); run yang belum 'done' dilanjutkan
+CREATE TABLE IF NOT EXISTS warehouse.pipeline_runs (
+    id SERIAL PRIMARY KEY,
+    started_at TIMESTAMP NOT NULL DEFAULT now(),
+    finished_at TIMESTAMP,
+    status VARCHAR(10) NOT NULL DEFAULT 'running',  -- running / done / failed
+    cities TEXT[] NOT NULL
+);
+CREATE TABLE IF NOT EXISTS warehouse.pipeline_stages (
+    run_id INTEGER NOT NULL REFERENCES warehouse.pipeline_runs(id) ON DELETE CASCADE,
+    stage VARCHAR(64) NOT NULL,         -- mis. 'fact_waste:jakarta'
+    city VARCHAR(32),
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',  -- pending / running / done / failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    input_key CHAR(16),                 -- sidik file CSV untuk tahap load
+    detail TEXT,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    error TEXT,
+    PRIMARY KEY (run_id, stage)
+);
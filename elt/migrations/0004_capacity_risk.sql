@@ -0,0 +1,15 @@
+-- 0004: risiko overload kapasitas per kecamatan (simulasi Monte Carlo, warehouse/capacity_risk.py)
+
+-- Dibangun ulang setiap load warehouse, satu baris per kecamatan
+CREATE TABLE IF NOT EXISTS warehouse.capacity_risk (
+    location_id INTEGER PRIMARY KEY REFERENCES warehouse.dim_location(id),
+    fleet_id INTEGER REFERENCES warehouse.dim_fleet(id),   -- versi armada yang disimulasikan
+    n_scenarios INTEGER NOT NULL,
+    history_days INTEGER NOT NULL,      -- jumlah hari historis yang di-resample
+    p_overload DOUBLE PRECISION NOT NULL,   -- P(volume > kapasitas)
+    p_critical DOUBLE PRECISION NOT NULL,   -- P(volume > 110% kapasitas), batas status CRITICAL
+    expected_shortfall_ton DECIMAL(10, 2),  -- rata-rata volume tak terangkut per hari
+    volume_p95_ton DECIMAL(10, 2),
+    capacity_p05_ton DECIMAL(10, 2),
+    generated_at TIMESTAMP NOT NULL DEFAULT now()
+);
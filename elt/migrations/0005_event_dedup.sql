@@ -0,0 +1,12 @@
+-- 0005: event stream idempoten (elt/ingest_stream.py)
+-- Batch yang di-retry, event yang dikirim ulang sumber, atau file dead-letter yang diputar ulang
+-- tidak boleh menggandakan baris fakta: event_id unik, duplikat dilewati (ON CONFLICT DO NOTHING).
+-- Event tanpa event_id (NULL) tetap diterima apa adanya.
+
+-- Duplikat yang sudah terlanjur masuk dibuang dulu, menyisakan yang pertama diterima
+DELETE FROM staging.raw_waste_events e
+USING staging.raw_waste_events d
+WHERE e.event_id = d.event_id
+  AND (e.received_at, e.ctid) > (d.received_at, d.ctid);
+
+CREATE UNIQUE INDEX IF NOT EXISTS raw_waste_events_event_id_key ON staging.raw_waste_events (event_id);
@@ -0,0 +1,4 @@
+-- 0006: versi data per kota (warehouse/etl_runs.py get_data_version)
+-- MAX(id) per kota dibaca dashboard & read API tiap beberapa detik; etl_runs bertambah satu
+-- baris per batch stream, sehingga tanpa index ini pembacaan versi menjadi scan penuh.
+CREATE INDEX IF NOT EXISTS etl_runs_city_id_idx ON warehouse.etl_runs (city, id);
@@ -0,0 +1,4 @@
+-- 0007: simpangan baku residual per seri prakiraan (warehouse/forecast.py)
+-- Interval gabungan beberapa kecamatan (grafik tren kota) dihitung dari sqrt(jumlah varians),
+-- bukan dari jumlah batas bawah/atas per kecamatan yang jauh lebih lebar dari 95%.
+ALTER TABLE warehouse.forecast_daily ADD COLUMN IF NOT EXISTS sigma_ton DOUBLE PRECISION;
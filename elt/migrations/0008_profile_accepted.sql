@@ -0,0 +1,4 @@
+-- 0008: penanda profil yang diterima manual (python elt/profiling.py accept <id>)
+-- Pembanding drift hanya memakai profil sejak penerimaan terakhir, sehingga load ulang file
+-- yang sama setelah accept tidak lagi dibandingkan dengan profil lama (satuan lama).
+ALTER TABLE warehouse.data_profile ADD COLUMN IF NOT EXISTS accepted_at TIMESTAMP;
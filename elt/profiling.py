@@ -0,0 +1,398 @@
+# elt/profiling.py
+"""
+Profil data input (waste.csv, sipsn.csv) dalam satu kali baca, disimpan per load dan
+dibandingkan dengan load-load sebelumnya sebelum data masuk warehouse.
+
+Validasi (elt/validator.py) hanya memeriksa skema & teks non-numerik; kesalahan satuan
+(mis. volume_ton dikirim dalam kg, 1000x) tetap lolos. Di sini tiap kolom diringkas dengan
+struktur berukuran tetap yang bisa digabung (mergeable), sehingga file dibaca per chunk dan
+memori tidak tumbuh bersama ukuran file:
+
+  semua kolom   : jumlah baris, null, distinct (HyperLogLog, p=12, galat ~1.6%)
+  kolom numerik : non-numerik, min/max/rata-rata, kuantil (t-digest, compression 100)
+
+Profil disimpan ke warehouse.data_profile (satu baris per file per load). Drift dihitung
+terhadap median profil 'ok' terakhir (DRIFT_HISTORY) untuk kota & dataset yang sama, mulai dari
+profil terakhir yang diterima (accept) jika ada:
+
+  error   : kuantil p05/p50/p95 kolom numerik bergeser > QUANTILE_RATIO kali (salah satuan)
+  warning : jumlah baris, rasio null/non-numerik, atau distinct berubah jauh
+
+Load dengan drift 'error' dihentikan sebelum staging diganti dan profilnya berstatus 'drift'
+(tidak dipakai sebagai pembanding). Jika perubahannya memang benar, terima profil tsb lalu
+jalankan ulang pipeline; profil yang diterima menjadi pembanding baru (profil sebelumnya diabaikan):
+    python elt/profiling.py accept <id>
+
+Cara pakai:
+    python elt/profiling.py profile data/waste.csv --dataset waste      # profil tanpa menyimpan
+    python elt/profiling.py history --city jakarta --dataset waste
+"""
+import argparse
+import base64
+import json
+import logging
+import os
+import statistics
+import sys
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+logger = logging.getLogger("waste_tracker")
+
+CHUNK_ROWS = 100_000
+HLL_P = 12                 # 2^12 register
+TDIGEST_COMPRESSION = 100
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Kolom numerik per dataset (kolom lain diprofil sebagai teks)
+NUMERIC_COLUMNS = {
+    "waste": ["volume_ton"],
+    "sipsn": ["armada_total", "penduduk", "luas_km2"],
+}
+
+# Ambang drift
+DRIFT_HISTORY = 5          # profil 'ok' terakhir yang dijadikan pembanding
+QUANTILE_RATIO = 3.0       # p05/p50/p95 naik/turun lebih dari 3x -> error
+ROW_RATIO = 2.0            # jumlah baris naik/turun lebih dari 2x -> warning
+RATE_DELTA = 0.05          # rasio null / non-numerik naik > 5 poin -> warning
+DISTINCT_RATIO = 1.5       # distinct naik/turun lebih dari 1.5x -> warning
+
+
+# --- SKETCH ---
+
+class HyperLogLog:
+    """Estimasi jumlah nilai distinct dengan 2^p register 6-bit (digabung dengan max)."""
+
+    def __init__(self, p=HLL_P, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8) if registers is None else registers
+
+    def add_hashes(self, hashes):
+        """hashes: array uint64 (pd.util.hash_array)."""
+        if len(hashes) == 0:
+            return
+        low_bits = 64 - self.p
+        idx = (hashes >> np.uint64(low_bits)).astype(np.intp)
+        # 52 bit terbawah cukup (p=12) dan bisa dihitung panjang bitnya secara eksak lewat float64
+        rest = (hashes & np.uint64((1 << min(low_bits, 52)) - 1)).astype(np.float64)
+        rank = (min(low_bits, 52) + 1 - np.frexp(rest)[1]).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * np.log(self.m / zeros)   # linear counting untuk kardinalitas kecil
+        return int(round(estimate))
+
+    def to_dict(self):
+        return {"p": self.p, "registers": base64.b64encode(self.registers.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["p"], np.frombuffer(base64.b64decode(d["registers"]), dtype=np.uint8).copy())
+
+
+class TDigest:
+    """
+    Estimasi kuantil (merging t-digest): centroid (mean, bobot) yang rapat di ekor distribusi.
+    Nilai baru ditampung lalu dipadatkan; ukuran tetap ~compression centroid.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION, means=None, weights=None):
+        self.compression = compression
+        self.means = np.empty(0) if means is None else np.asarray(means, dtype=np.float64)
+        self.weights = np.empty(0) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    def add(self, values, weights=None):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, weights]))
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        # Fungsi skala k1: satu centroid mencakup paling banyak satu satuan k
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        bucket = np.floor(k - k[0])
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        merged_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_weights
+        self.weights = merged_weights
+
+    def merge(self, other):
+        self.add(other.means, other.weights)
+        return self
+
+    def quantile(self, q, vmin=None, vmax=None):
+        if len(self.means) == 0:
+            return None
+        cum = np.cumsum(self.weights) - self.weights / 2
+        value = float(np.interp(q * self.weights.sum(), cum, self.means))
+        if vmin is not None:
+            value = min(max(value, vmin), vmax)
+        return value
+
+    def to_dict(self):
+        return {"compression": self.compression, "means": self.means.round(6).tolist(), "weights": self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["compression"], d["means"], d["weights"])
+
+
+# --- PROFIL KOLOM ---
+
+class ColumnProfile:
+    """Statistik satu kolom, diisi per chunk (add) dan bisa digabung (merge)."""
+
+    def __init__(self, numeric=False):
+        self.numeric = numeric
+        self.count = 0
+        self.nulls = 0
+        self.hll = HyperLogLog()
+        self.non_numeric = 0
+        self.min = self.max = None
+        self.sum = 0.0
+        self.digest = TDigest() if numeric else None
+
+    def add(self, series):
+        values = series.astype("string").str.strip()
+        present = values.notna() & values.ne("")
+        self.count += len(values)
+        self.nulls += int((~present).sum())
+        self.hll.add_hashes(pd.util.hash_array(values[present].to_numpy(dtype=object)))
+        if not self.numeric:
+            return
+        numbers = pd.to_numeric(values[present], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        finite = numbers[np.isfinite(numbers)]
+        self.non_numeric += int(len(numbers) - len(finite))
+        if len(finite):
+            self.min = float(finite.min()) if self.min is None else min(self.min, float(finite.min()))
+            self.max = float(finite.max()) if self.max is None else max(self.max, float(finite.max()))
+            self.sum += float(finite.sum())
+            self.digest.add(finite)
+
+    def merge(self, other):
+        self.count += other.count
+        self.nulls += other.nulls
+        self.hll.merge(other.hll)
+        if self.numeric:
+            self.non_numeric += other.non_numeric
+            for attr, pick in (("min", min), ("max", max)):
+                mine, theirs = getattr(self, attr), getattr(other, attr)
+                setattr(self, attr, theirs if mine is None else mine if theirs is None else pick(mine, theirs))
+            self.sum += other.sum
+            self.digest.merge(other.digest)
+        return self
+
+    def summary(self):
+        """Statistik ringkas (JSON) yang dipakai untuk perbandingan drift."""
+        s = {
+            "count": self.count,
+            "null_rate": self.nulls / self.count if self.count else 0.0,
+            "distinct": self.hll.count(),
+        }
+        if self.numeric:
+            n_valid = self.count - self.nulls - self.non_numeric
+            s.update({
+                "non_numeric_rate": self.non_numeric / self.count if self.count else 0.0,
+                "min": self.min, "max": self.max,
+                "mean": self.sum / n_valid if n_valid else None,
+            })
+            for q in QUANTILES:
+                s[f"p{round(q * 100):02d}"] = self.digest.quantile(q, self.min, self.max)
+        return s
+
+    def to_dict(self):
+        d = {"summary": self.summary(), "hll": self.hll.to_dict()}
+        if self.numeric:
+            d["tdigest"] = self.digest.to_dict()
+        return d
+
+
+def profile_chunks(chunks, numeric_columns=()):
+    """
+    Profil dari iterable DataFrame (chunk file yang sama). Mengembalikan
+    {"n_rows": ..., "columns": {kolom: ColumnProfile}}.
+    """
+    columns = {}
+    n_rows = 0
+    for chunk in chunks:
+        n_rows += len(chunk)
+        for col in chunk.columns:
+            if col not in columns:
+                columns[col] = ColumnProfile(numeric=col in numeric_columns)
+            columns[col].add(chunk[col])
+    return {"n_rows": n_rows, "columns": columns}
+
+def profile_frame(df, dataset):
+    """Profil DataFrame yang sudah di-extract (diproses per CHUNK_ROWS baris)."""
+    chunks = (df.iloc[i:i + CHUNK_ROWS] for i in range(0, len(df), CHUNK_ROWS))
+    return profile_chunks(chunks, NUMERIC_COLUMNS.get(dataset, ()))
+
+def profile_csv(path, dataset, chunk_rows=CHUNK_ROWS):
+    """Profil file CSV dalam satu kali baca per chunk (memori tidak bergantung ukuran file)."""
+    chunks = pd.read_csv(path, dtype=str, chunksize=chunk_rows)
+    return profile_chunks(chunks, NUMERIC_COLUMNS.get(dataset, ()))
+
+def profile_summary(profile):
+    return {"n_rows": profile["n_rows"], "columns": {c: p.summary() for c, p in profile["columns"].items()}}
+
+
+# --- DRIFT ---
+
+def _ratio(value, base):
+    if value is None or base is None:
+        return None
+    if base == 0 or value == 0:
+        return None if value == base else float("inf")
+    return max(value / base, base / value) if (value > 0) == (base > 0) else float("inf")
+
+def detect_drift(summary, history):
+    """
+    Membandingkan ringkasan profil dengan median ringkasan-ringkasan sebelumnya.
+    Mengembalikan [{"column", "stat", "value", "baseline", "severity"}], kosong jika tidak ada riwayat.
+    """
+    if not history:
+        return []
+
+    def baseline(get):
+        values = [v for v in (get(h) for h in history) if v is not None]
+        return statistics.median(values) if values else None
+
+    issues = []
+
+    def flag(column, stat, value, base, severity):
+        issues.append({"column": column, "stat": stat, "value": value, "baseline": base, "severity": severity})
+
+    base_rows = baseline(lambda h: h["n_rows"])
+    ratio = _ratio(summary["n_rows"], base_rows)
+    if ratio is not None and ratio > ROW_RATIO:
+        flag(None, "n_rows", summary["n_rows"], base_rows, "warning")
+
+    for col, s in summary["columns"].items():
+        def base_of(stat):
+            return baseline(lambda h: h["columns"].get(col, {}).get(stat))
+
+        for stat in ("null_rate", "non_numeric_rate"):
+            base = base_of(stat)
+            if stat in s and base is not None and s[stat] - base > RATE_DELTA:
+                flag(col, stat, s[stat], base, "warning")
+
+        base = base_of("distinct")
+        ratio = _ratio(s["distinct"], base)
+        if ratio is not None and ratio > DISTINCT_RATIO:
+            flag(col, "distinct", s["distinct"], base, "warning")
+
+        for q in QUANTILES[::2]:   # p05, p50, p95
+            stat = f"p{round(q * 100):02d}"
+            base = base_of(stat)
+            ratio = _ratio(s.get(stat), base)
+            if ratio is not None and ratio > QUANTILE_RATIO:
+                flag(col, stat, s[stat], base, "error")
+    return issues
+
+def format_drift(issues):
+    return "; ".join(
+        f"{i['column'] + '.' if i['column'] else ''}{i['stat']} {i['value']:.4g} (biasanya {i['baseline']:.4g})"
+        for i in issues
+    )
+
+
+# --- PENYIMPANAN ---
+
+Q_HISTORY = """
+SELECT summary FROM warehouse.data_profile
+WHERE city = :city AND dataset = :dataset AND status = 'ok'
+  AND id >= COALESCE((SELECT MAX(id) FROM warehouse.data_profile
+                      WHERE city = :city AND dataset = :dataset AND accepted_at IS NOT NULL), 0)
+ORDER BY profiled_at DESC, id DESC
+LIMIT :limit;
+"""
+
+Q_INSERT_PROFILE = """
+INSERT INTO warehouse.data_profile (city, dataset, source_file, n_rows, summary, sketches, drift, status)
+VALUES (:city, :dataset, :source_file, :n_rows, CAST(:summary AS JSONB), CAST(:sketches AS JSONB),
+        CAST(:drift AS JSONB), :status)
+RETURNING id;
+"""
+
+def check_and_record_profile(conn, city, dataset, profile, source_file=None):
+    """
+    Menyimpan profil satu load dan membandingkannya dengan DRIFT_HISTORY profil 'ok' sebelumnya.
+    Mengembalikan (profile_id, status, daftar drift); status 'drift' jika ada drift severity
+    'error' (load sebaiknya dihentikan), selain itu 'ok'.
+    """
+    summary = profile_summary(profile)
+    history = [r.summary for r in conn.execute(text(Q_HISTORY),
+                                               {"city": city, "dataset": dataset, "limit": DRIFT_HISTORY})]
+    issues = detect_drift(summary, history)
+    status = "drift" if any(i["severity"] == "error" for i in issues) else "ok"
+    sketches = {col: {k: v for k, v in p.to_dict().items() if k != "summary"} for col, p in profile["columns"].items()}
+    profile_id = conn.execute(text(Q_INSERT_PROFILE), {
+        "city": city, "dataset": dataset, "source_file": source_file, "n_rows": profile["n_rows"],
+        "summary": json.dumps(summary), "sketches": json.dumps(sketches), "drift": json.dumps(issues),
+        "status": status,
+    }).scalar()
+    for issue in issues:
+        log = logger.error if issue["severity"] == "error" else logger.warning
+        log("Drift %s/%s: %s", city, dataset, format_drift([issue]))
+    return profile_id, status, issues
+
+def accept_profile(conn, profile_id):
+    """
+    Menandai profil 'drift' sebagai 'ok' (perubahan data memang disengaja). Profil ini menjadi
+    awal pembanding baru: profil kota & dataset yang sama sebelum profil ini tidak dipakai lagi.
+    """
+    return conn.execute(text("""
+    UPDATE warehouse.data_profile SET status = 'ok', accepted_at = now() WHERE id = :id;
+    """), {"id": profile_id}).rowcount
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from utils import get_engine
+
+    parser = argparse.ArgumentParser(description="Profil & drift data input Waste Tracker")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_profile = sub.add_parser("profile", help="Profil satu file CSV (tidak disimpan)")
+    p_profile.add_argument("path")
+    p_profile.add_argument("--dataset", choices=sorted(NUMERIC_COLUMNS), required=True)
+    p_profile.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    p_history = sub.add_parser("history", help="Riwayat profil satu kota & dataset")
+    p_history.add_argument("--city", default="jakarta")
+    p_history.add_argument("--dataset", choices=sorted(NUMERIC_COLUMNS), default="waste")
+    p_history.add_argument("--limit", type=int, default=10)
+    p_accept = sub.add_parser("accept", help="Terima profil berstatus drift sebagai pembanding baru")
+    p_accept.add_argument("profile_id", type=int)
+    args = parser.parse_args()
+
+    if args.command == "profile":
+        print(json.dumps(profile_summary(profile_csv(args.path, args.dataset, args.chunk_rows)), indent=2))
+    elif args.command == "history":
+        with get_engine().connect() as conn:
+            rows = conn.execute(text("""
+            SELECT id, profiled_at, n_rows, status, drift FROM warehouse.data_profile
+            WHERE city = :city AND dataset = :dataset ORDER BY id DESC LIMIT :limit;
+            """), {"city": args.city, "dataset": args.dataset, "limit": args.limit}).all()
+        for r in rows:
+            print(f"{r.id:>6} {r.profiled_at:%Y-%m-%d %H:%M} {r.n_rows:>9} baris  {r.status:<5} {format_drift(r.drift)}")
+    else:
+        with get_engine().begin() as conn:
+            if not accept_profile(conn, args.profile_id):
+                print(f"Profil {args.profile_id} tidak ditemukan.")
+                sys.exit(1)
+        print(f"✅ Profil {args.profile_id} diterima sebagai pembanding.")
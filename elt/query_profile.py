@@ -0,0 +1,269 @@
+# elt/query_profile.py
+"""
+Profil query SQL (opt-in) untuk loader warehouse, setup ELT, dan dashboard.
+
+Aktif jika WASTE_SQL_PROFILE=1: hook SQLAlchemy dipasang pada semua engine di proses tsb
+(utils.get_engine, elt/connection.py, get_db_engine di streamlit/app.py). Setiap statement
+dicatat durasinya ke warehouse.query_profile bersama fingerprint (statement yang
+dinormalisasi) dan fungsi pemanggilnya di repo ini. Statement yang lebih lambat dari
+WASTE_SQL_PROFILE_SLOW_MS (default 500) juga dijalankan ulang dengan
+EXPLAIN (ANALYZE, BUFFERS) di koneksi & transaksi yang sama, di dalam SAVEPOINT yang
+langsung di-rollback, sehingga INSERT/DELETE tidak tereksekusi dua kali.
+
+Catatan ditampung di memori dan ditulis lewat koneksi terpisah (per 100 catatan,
+tiap 10 detik, dan saat proses selesai), jadi tidak ikut transaksi yang sedang diprofil.
+
+Laporan:
+    python elt/query_profile.py top --days 7          # statement dengan total waktu terbesar
+    python elt/query_profile.py changes --days 30     # plan yang berubah antar run
+"""
+import argparse
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("waste_tracker")
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SLOW_MS = float(os.environ.get("WASTE_SQL_PROFILE_SLOW_MS", "500"))
+FLUSH_EVERY = 100        # catatan
+FLUSH_INTERVAL = 10.0    # detik
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "MERGE")
+
+Q_INSERT = """
+INSERT INTO warehouse.query_profile
+    (run_id, caller, fingerprint, statement, duration_ms, n_rows, plan, plan_hash)
+VALUES (:run_id, :caller, :fingerprint, :statement, :duration_ms, :n_rows, CAST(:plan AS JSONB), :plan_hash);
+"""
+
+_lock = threading.Lock()
+_state = {"enabled": False, "run_id": None, "slow_ms": SLOW_MS, "buffer": [], "engine": None, "flushed_at": 0.0}
+
+
+# --- NORMALISASI ---
+
+def normalize_statement(statement):
+    """Statement tanpa literal & spasi berlebih: statement yang sama dengan nilai berbeda = satu fingerprint."""
+    s = re.sub(r"--[^\n]*", " ", statement)
+    s = re.sub(r"'(?:[^']|'')*'", "?", s)
+    s = re.sub(r"\b\d+(\.\d+)?\b", "?", s)
+    return re.sub(r"\s+", " ", s).strip()
+
+def fingerprint(statement):
+    return hashlib.sha1(normalize_statement(statement).encode()).hexdigest()[:16]
+
+def plan_shape(plan):
+    """Ringkasan bentuk plan (jenis node, join, tabel, index) per baris, tanpa biaya/waktu/jumlah baris."""
+    lines = []
+
+    def walk(node, depth):
+        parts = [node.get("Node Type", "?")]
+        for key in ("Join Type", "Strategy", "Relation Name", "Index Name"):
+            if node.get(key):
+                parts.append(f"{key.split()[0].lower()}={node[key]}")
+        lines.append("  " * depth + " ".join(parts))
+        for child in node.get("Plans", []):
+            walk(child, depth + 1)
+
+    walk(plan[0]["Plan"], 0)
+    return "\n".join(lines)
+
+def plan_hash(plan):
+    return hashlib.sha1(plan_shape(plan).encode()).hexdigest()[:16]
+
+
+# --- HOOK ENGINE ---
+
+def _caller():
+    """Fungsi terdalam di repo ini (di luar modul ini) yang menjalankan statement."""
+    frame = sys._getframe(2)
+    this_file = os.path.abspath(__file__)
+    while frame is not None:
+        path = os.path.abspath(frame.f_code.co_filename)
+        if path.startswith(ROOT_DIR) and path != this_file and "site-packages" not in path:
+            return f"{os.path.relpath(path, ROOT_DIR)}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+def _explain(conn, statement, parameters):
+    """EXPLAIN (ANALYZE, BUFFERS) di transaksi yang sama, efek samping di-rollback lewat SAVEPOINT."""
+    dbapi_conn = conn.connection.dbapi_connection
+    is_read = statement.lstrip().upper().startswith(("SELECT", "WITH"))
+    if getattr(dbapi_conn, "autocommit", False) and not is_read:
+        return None  # tanpa transaksi tidak ada SAVEPOINT: statement tulis tidak di-explain
+
+    cur = dbapi_conn.cursor()
+    use_savepoint = not getattr(dbapi_conn, "autocommit", False)
+    try:
+        if use_savepoint:
+            cur.execute("SAVEPOINT query_profile")
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+        plan = cur.fetchone()[0]
+        return json.loads(plan) if isinstance(plan, str) else plan
+    except Exception as e:
+        logger.warning("EXPLAIN gagal untuk statement lambat: %s", e)
+        return None
+    finally:
+        if use_savepoint:
+            try:
+                cur.execute("ROLLBACK TO SAVEPOINT query_profile")
+                cur.execute("RELEASE SAVEPOINT query_profile")
+            except Exception:
+                pass
+        cur.close()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_profile_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_profile_start")
+    if not starts:
+        return
+    duration_ms = (time.perf_counter() - starts.pop()) * 1000
+    if not conn.get_execution_options().get("query_profile", True):
+        return
+
+    plan = None
+    first_word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    if duration_ms >= _state["slow_ms"] and not executemany and first_word in EXPLAINABLE:
+        plan = _explain(conn, statement, parameters)
+
+    record = {
+        "run_id": _state["run_id"],
+        "caller": _caller(),
+        "fingerprint": fingerprint(statement),
+        "statement": statement.strip(),
+        "duration_ms": round(duration_ms, 3),
+        "n_rows": cursor.rowcount if cursor.rowcount >= 0 else None,
+        "plan": json.dumps(plan) if plan else None,
+        "plan_hash": plan_hash(plan) if plan else None,
+    }
+    with _lock:
+        _state["buffer"].append(record)
+        _state["engine"] = conn.engine
+        due = (len(_state["buffer"]) >= FLUSH_EVERY or plan is not None
+               or time.monotonic() - _state["flushed_at"] > FLUSH_INTERVAL)
+    if due:
+        flush_query_profile()
+
+def flush_query_profile():
+    """Menulis catatan yang tertampung ke warehouse.query_profile lewat koneksi terpisah."""
+    with _lock:
+        records, _state["buffer"] = _state["buffer"], []
+        engine = _state["engine"]
+        _state["flushed_at"] = time.monotonic()
+    if not records or engine is None:
+        return 0
+    try:
+        with engine.connect().execution_options(query_profile=False) as conn:
+            conn.execute(text(Q_INSERT), records)
+            conn.commit()
+    except Exception as e:
+        # Tabel belum dibuat (setup_elt belum jalan) / DB tidak bisa dihubungi: catatan dibuang
+        logger.warning("Gagal menyimpan %d catatan profil query: %s", len(records), str(e).splitlines()[0])
+        return 0
+    return len(records)
+
+def enable_query_profiling(run_id=None, slow_ms=None):
+    """Memasang hook profil pada semua engine SQLAlchemy di proses ini (idempoten)."""
+    with _lock:
+        if _state["enabled"]:
+            return _state["run_id"]
+        script = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+        _state["run_id"] = run_id or os.environ.get("WASTE_PROFILE_RUN") or f"{script}-{time.strftime('%Y%m%dT%H%M%S')}"
+        _state["slow_ms"] = slow_ms if slow_ms is not None else SLOW_MS
+        _state["flushed_at"] = time.monotonic()
+        _state["enabled"] = True
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    atexit.register(flush_query_profile)
+    logger.info("🔬 Profil SQL aktif (run %s, EXPLAIN ANALYZE >= %.0f ms)", _state["run_id"], _state["slow_ms"])
+    return _state["run_id"]
+
+def maybe_enable_query_profiling():
+    """Dipanggil saat engine dibuat: aktifkan profil hanya jika WASTE_SQL_PROFILE=1."""
+    if os.environ.get("WASTE_SQL_PROFILE", "").lower() in ("1", "true", "yes"):
+        enable_query_profiling()
+
+
+# --- LAPORAN ---
+
+Q_TOP = """
+SELECT fingerprint, MIN(caller) AS caller, COUNT(*) AS calls,
+       SUM(duration_ms) AS total_ms, AVG(duration_ms) AS avg_ms, MAX(duration_ms) AS max_ms,
+       MIN(LEFT(regexp_replace(statement, '\\s+', ' ', 'g'), 90)) AS statement
+FROM warehouse.query_profile
+WHERE recorded_at >= now() - make_interval(days => :days)
+  AND (CAST(:run_id AS TEXT) IS NULL OR run_id = :run_id)
+GROUP BY fingerprint
+ORDER BY total_ms DESC
+LIMIT :limit;
+"""
+
+# Plan terakhir per (fingerprint, run) lalu dibandingkan dengan plan run sebelumnya
+Q_PLAN_CHANGES = """
+WITH per_run AS (
+    SELECT DISTINCT ON (fingerprint, run_id)
+        fingerprint, run_id, recorded_at, caller, plan_hash, plan, duration_ms
+    FROM warehouse.query_profile
+    WHERE plan_hash IS NOT NULL AND recorded_at >= now() - make_interval(days => :days)
+    ORDER BY fingerprint, run_id, recorded_at DESC
+),
+ordered AS (
+    SELECT *, LAG(plan_hash) OVER w AS prev_hash, LAG(plan) OVER w AS prev_plan,
+           LAG(run_id) OVER w AS prev_run, LAG(duration_ms) OVER w AS prev_ms
+    FROM per_run
+    WINDOW w AS (PARTITION BY fingerprint ORDER BY recorded_at)
+)
+SELECT fingerprint, caller, prev_run, run_id, prev_ms, duration_ms, prev_plan, plan
+FROM ordered
+WHERE prev_hash IS NOT NULL AND prev_hash <> plan_hash
+ORDER BY recorded_at DESC;
+"""
+
+def report_top(conn, days=7, limit=20, run_id=None):
+    rows = conn.execute(text(Q_TOP), {"days": days, "limit": limit, "run_id": run_id}).fetchall()
+    print(f"{'fingerprint':<16} {'calls':>6} {'total ms':>10} {'avg ms':>9} {'max ms':>9}  caller / statement")
+    for r in rows:
+        print(f"{r.fingerprint:<16} {r.calls:>6} {r.total_ms:>10.1f} {r.avg_ms:>9.1f} {r.max_ms:>9.1f}  {r.caller}")
+        print(f"{'':<55}{r.statement}")
+    return rows
+
+def report_plan_changes(conn, days=30):
+    rows = conn.execute(text(Q_PLAN_CHANGES), {"days": days}).fetchall()
+    if not rows:
+        print("✅ Tidak ada perubahan plan.")
+    for r in rows:
+        print(f"⚠️ {r.fingerprint} ({r.caller}): {r.prev_run} {r.prev_ms:.0f} ms -> {r.run_id} {r.duration_ms:.0f} ms")
+        print("   sebelum:\n" + "\n".join("     " + line for line in plan_shape(r.prev_plan).splitlines()))
+        print("   sesudah:\n" + "\n".join("     " + line for line in plan_shape(r.plan).splitlines()))
+    return rows
+
+if __name__ == "__main__":
+    sys.path.insert(0, ROOT_DIR)
+    from utils import get_engine
+
+    parser = argparse.ArgumentParser(description="Laporan profil query SQL Waste Tracker")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_top = sub.add_parser("top", help="Statement dengan total waktu terbesar")
+    p_top.add_argument("--days", type=int, default=7)
+    p_top.add_argument("--limit", type=int, default=20)
+    p_top.add_argument("--run", help="Batasi ke satu run_id")
+    p_changes = sub.add_parser("changes", help="Statement yang plan-nya berubah antar run")
+    p_changes.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    with get_engine().connect().execution_options(query_profile=False) as conn:
+        if args.command == "top":
+            report_top(conn, args.days, args.limit, args.run)
+        else:
+            report_plan_changes(conn, args.days)
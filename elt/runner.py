@@ -0,0 +1,418 @@
+# elt/runner.py
+"""
+Runner pipeline ELT lokal (tanpa Airflow): tahap-tahap dengan dependensi, tahap yang saling
+independen berjalan paralel, dan checkpoint tiap tahap di database.
+
+Pada pipeline linear, satu langkah yang gagal membuat percobaan berikutnya mulai lagi dari
+setup_elt_database() dan memuat ulang semuanya. Di sini pipeline dipecah menjadi tahap per
+kota (STAGE_DEPS):
+
+  setup -> load_waste:<kota>, load_sipsn:<kota> -> aliases:<kota>
+        -> dim_time, dim_location, dim_fleet -> fact_waste -> retention
+        -> cube, forecast, anomalies, capacity_risk -> record_run:<kota>
+
+Status tiap tahap disimpan di warehouse.pipeline_stages (pending / running / done / failed).
+Tahap yang gagal hanya menahan turunannya; tahap lain (termasuk kota lain) tetap berjalan.
+Menjalankan runner lagi melanjutkan run terakhir yang belum selesai: tahap 'done' dilewati
+karena hasilnya (staging, dimensi, partisi fakta) sudah ada di database, dan eksekusi mulai
+dari tahap yang gagal. Tahap load menyimpan sidik file CSV-nya (input_key); jika file diganti
+sejak checkpoint, tahap tsb beserta semua turunannya diulang.
+
+Satu runner aktif pada satu waktu (advisory lock RUNNER_LOCK). Cache dashboard diisi ulang
+di akhir jika ada kota yang selesai pada run ini.
+
+Cara pakai:
+    python elt/runner.py                    # lanjutkan run yang gagal, atau mulai run baru
+    python elt/runner.py --fresh            # run baru dari awal
+    python elt/runner.py --city jakarta --workers 2
+    python elt/runner.py status             # status tahap run terakhir
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils import get_engine
+
+logger = logging.getLogger("waste_tracker")
+
+DATA_DIR = os.environ.get("WASTE_DATA_DIR", "./data")
+DEFAULT_WORKERS = 4
+RUNNER_LOCK = 7302
+
+# tahap per kota -> tahap yang harus selesai lebih dulu (kota yang sama; "setup" global)
+STAGE_DEPS = {
+    "load_waste": ["setup"],
+    "load_sipsn": ["setup"],
+    "aliases": ["load_waste", "load_sipsn"],
+    "dim_time": ["aliases"],
+    "dim_location": ["aliases"],
+    "dim_fleet": ["aliases"],
+    "fact_waste": ["dim_time", "dim_location", "dim_fleet"],
+    "retention": ["fact_waste"],
+    "cube": ["retention"],
+    "forecast": ["retention"],
+    "anomalies": ["retention"],
+    "capacity_risk": ["retention"],
+    "record_run": ["cube", "forecast", "anomalies", "capacity_risk"],
+}
+
+# tahap load -> (file di folder data kota, tabel staging)
+RAW_FILES = {
+    "load_waste": ("waste.csv", "raw_waste"),
+    "load_sipsn": ("sipsn.csv", "raw_sipsn"),
+}
+
+Q_STAGE_INIT = """
+INSERT INTO warehouse.pipeline_stages (run_id, stage, city)
+VALUES (:run_id, :stage, :city)
+ON CONFLICT (run_id, stage) DO NOTHING;
+"""
+
+Q_STAGE_CLAIM = """
+UPDATE warehouse.pipeline_stages
+SET status = 'running', attempts = attempts + 1, started_at = now(), finished_at = NULL, error = NULL
+WHERE run_id = :run_id AND stage = :stage;
+"""
+
+Q_STAGE_DONE = """
+UPDATE warehouse.pipeline_stages
+SET status = 'done', input_key = :input_key, detail = :detail, finished_at = now()
+WHERE run_id = :run_id AND stage = :stage;
+"""
+
+Q_STAGE_FAILED = """
+UPDATE warehouse.pipeline_stages
+SET status = 'failed', error = :error, finished_at = now()
+WHERE run_id = :run_id AND stage = :stage;
+"""
+
+Q_STAGE_RESET = """
+UPDATE warehouse.pipeline_stages
+SET status = 'pending'
+WHERE run_id = :run_id AND stage = ANY(:stages);
+"""
+
+class StageFailed(Exception):
+    """Tahap berhenti dengan sengaja (validasi / drift gagal), tanpa traceback."""
+
+def stage_name(stage, city=None):
+    return stage if city is None else f"{stage}:{city}"
+
+def build_graph(cities):
+    """{nama tahap: (tahap, kota, [nama tahap dependensi])} untuk daftar kota, urut topologis."""
+    graph = {"setup": ("setup", None, [])}
+    for city in cities:
+        for stage, deps in STAGE_DEPS.items():
+            graph[stage_name(stage, city)] = (
+                stage, city, [d if d == "setup" else stage_name(d, city) for d in deps],
+            )
+    return graph
+
+def descendants(graph, names):
+    """Nama tahap `names` beserta semua tahap yang (tidak langsung) bergantung padanya."""
+    found = set(names)
+    for name, (_, _, deps) in graph.items():   # urut topologis: satu lintasan cukup
+        if found.intersection(deps):
+            found.add(name)
+    return found
+
+def file_key(path):
+    """Sidik isi file (sha1, 16 hex), None jika file tidak ada."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+def input_key(stage, city):
+    if stage not in RAW_FILES:
+        return None
+    from warehouse.city import city_data_dir
+    return file_key(os.path.join(city_data_dir(city, DATA_DIR), RAW_FILES[stage][0]))
+
+def load_raw_file(engine, path, table, validate, city):
+    """
+    Extract + validasi + profil + load satu CSV ke staging, hanya mengganti baris kota ini.
+    Mengembalikan jumlah baris; StageFailed jika file tidak ada, validasi gagal, atau drift.
+    """
+    from elt.profiling import check_and_record_profile, format_drift, profile_frame
+
+    if not os.path.exists(path):
+        raise StageFailed(f"File {path} tidak ditemukan!")
+
+    df = pd.read_csv(path, dtype=str) # Baca sebagai string dulu
+
+    # 🔥 DATA QUALITY FIREWALL 🔥
+    if not validate(df):
+        raise StageFailed(f"Validasi {os.path.basename(path)} gagal")
+
+    # 📊 PROFIL & DRIFT (dibandingkan dengan load-load sebelumnya, sebelum staging diganti)
+    dataset = table.replace("raw_", "")
+    with engine.begin() as conn:
+        profile_id, status, drift = check_and_record_profile(conn, city, dataset, profile_frame(df, dataset), path)
+    if status == "drift":
+        raise StageFailed(f"Drift pada {os.path.basename(path)}: {format_drift(drift)} "
+                          f"(jika benar: python elt/profiling.py accept {profile_id})")
+
+    df["city"] = city
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM staging.{table} WHERE city = :city;"), {"city": city})
+        df.to_sql(table, conn, schema='staging', if_exists='append', index=False)
+    return len(df)
+
+def run_stage(engine, stage, city):
+    """Menjalankan satu tahap. Mengembalikan keterangan singkat hasilnya (untuk log & status)."""
+    if stage == "setup":
+        from elt.setup_elt import setup_elt_database
+        setup_elt_database()
+        return "skema siap"
+
+    if stage in RAW_FILES:
+        from elt.validator import validate_sipsn_data, validate_waste_data
+        from warehouse.city import city_data_dir
+
+        file_name, table = RAW_FILES[stage]
+        validate = validate_waste_data if stage == "load_waste" else validate_sipsn_data
+        n_rows = load_raw_file(engine, os.path.join(city_data_dir(city, DATA_DIR), file_name), table, validate, city)
+        return f"{file_name}: {n_rows} baris"
+
+    if stage == "aliases":
+        from elt.kecamatan_alias import resolve_kecamatan_aliases
+        n_resolved, unresolved = resolve_kecamatan_aliases(city=city)
+        if unresolved:
+            logger.warning(f"⚠️ [{city}] Nama kecamatan belum dikenali: {', '.join(unresolved)}")
+        return f"{n_resolved} nama baru, {len(unresolved)} belum dikenali"
+
+    if stage == "dim_time":
+        from warehouse.dim_time import load_dim_time
+        load_dim_time(city)
+    elif stage == "dim_location":
+        from warehouse.dim_location import load_dim_location
+        load_dim_location(city)
+    elif stage == "dim_fleet":
+        from warehouse.dim_fleet import load_dim_fleet
+        load_dim_fleet(city=city)
+    elif stage == "fact_waste":
+        from warehouse.fact_waste import load_fact_waste
+        return f"{load_fact_waste(city)} baris fakta"
+    elif stage == "retention":
+        from warehouse.retention import compact_fact_waste
+        return f"{len(compact_fact_waste(city) or [])} bulan dipadatkan"
+    elif stage == "cube":
+        from warehouse.cube import refresh_cube_waste
+        return f"{refresh_cube_waste(city)} hari berubah"
+    elif stage == "forecast":
+        from warehouse.forecast import load_forecast_daily
+        return f"{load_forecast_daily(city=city)} kecamatan"
+    elif stage == "anomalies":
+        from warehouse.anomalies import load_anomalies, raise_anomaly_alerts
+        n_anomalies = load_anomalies(city)
+        # Webhook yang down tidak menggagalkan tahap: alert yang gagal dikirim ulang run berikutnya
+        n_alerts = raise_anomaly_alerts(city)
+        return f"{n_anomalies} anomali baru, {n_alerts} alert terkirim"
+    elif stage == "capacity_risk":
+        from warehouse.capacity_risk import load_capacity_risk
+        return f"{load_capacity_risk(city)} kecamatan disimulasikan"
+    elif stage == "record_run":
+        from warehouse.etl_runs import record_etl_run
+        return f"versi data {record_etl_run(city=city)}"
+    else:
+        raise ValueError(f"Tahap tidak dikenal: {stage}")
+    return ""
+
+def _start_run(conn, cities, fresh):
+    """(run_id, dilanjutkan?) : run terakhir yang belum selesai untuk kota yang sama, atau run baru."""
+    if not fresh:
+        row = conn.execute(text("""
+        SELECT id FROM warehouse.pipeline_runs
+        WHERE status <> 'done' AND cities = CAST(:cities AS TEXT[])
+        ORDER BY id DESC LIMIT 1;
+        """), {"cities": cities}).first()
+        if row:
+            conn.execute(text("UPDATE warehouse.pipeline_runs SET status = 'running', finished_at = NULL WHERE id = :id;"),
+                         {"id": row.id})
+            return row.id, True
+    run_id = conn.execute(text("""
+    INSERT INTO warehouse.pipeline_runs (cities) VALUES (CAST(:cities AS TEXT[])) RETURNING id;
+    """), {"cities": cities}).scalar()
+    return run_id, False
+
+def _checkpoints(conn, run_id):
+    return {r.stage: r for r in conn.execute(text("""
+    SELECT stage, status, input_key FROM warehouse.pipeline_stages WHERE run_id = :run_id;
+    """), {"run_id": run_id})}
+
+def run_pipeline(cities=None, workers=DEFAULT_WORKERS, fresh=False, engine=None):
+    """
+    Menjalankan (atau melanjutkan) pipeline untuk kota-kota di data/cities.json (atau `cities`).
+    Mengembalikan dict ringkasan (run_id, resumed, done, skipped, failed, blocked).
+    """
+    from warehouse.city import load_city_config
+
+    engine = engine or get_engine()
+    cities = sorted(cities or [c["code"] for c in load_city_config(DATA_DIR)])
+    graph = build_graph(cities)
+
+    # Koneksi terpisah memegang kunci runner selama run berlangsung
+    lock_conn = engine.connect()
+    try:
+        if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:key);"), {"key": RUNNER_LOCK}).scalar():
+            raise RuntimeError("Runner pipeline lain sedang berjalan")
+        lock_conn.commit()
+
+        # Instalasi pertama: tabel checkpoint dibuat oleh setup, jadi setup dijalankan dulu
+        with engine.connect() as conn:
+            bootstrap = conn.execute(text("SELECT to_regclass('warehouse.pipeline_stages') IS NULL;")).scalar()
+        if bootstrap:
+            run_stage(engine, "setup", None)
+
+        with engine.begin() as conn:
+            run_id, resumed = _start_run(conn, cities, fresh)
+            conn.execute(text(Q_STAGE_INIT), [
+                {"run_id": run_id, "stage": name, "city": city} for name, (_, city, _) in graph.items()
+            ])
+            if bootstrap:
+                conn.execute(text("UPDATE warehouse.pipeline_stages SET status = 'done', detail = 'skema siap' "
+                                  "WHERE run_id = :run_id AND stage = 'setup';"), {"run_id": run_id})
+            checkpoints = _checkpoints(conn, run_id)
+
+            # Tahap load yang file-nya berubah sejak checkpoint diulang beserta turunannya;
+            # tahap yang tertinggal 'running' (proses mati) diulang
+            changed = [name for name, (stage, city, _) in graph.items()
+                       if checkpoints[name].status == "done" and stage in RAW_FILES
+                       and checkpoints[name].input_key != input_key(stage, city)]
+            reset = descendants(graph, changed) | {n for n, c in checkpoints.items() if c.status == "running"}
+            if reset:
+                conn.execute(text(Q_STAGE_RESET), {"run_id": run_id, "stages": sorted(reset)})
+            done = {n for n, c in checkpoints.items() if c.status == "done" and n not in reset}
+
+        if resumed:
+            logger.info("▶️ Melanjutkan run %d: %d dari %d tahap sudah selesai%s", run_id, len(done), len(graph),
+                        f" ({len(changed)} file input berubah)" if changed else "")
+        else:
+            logger.info("🚀 Run pipeline %d: %d tahap, %d kota", run_id, len(graph), len(cities))
+
+        skipped = set(done) - ({"setup"} if bootstrap else set())
+        failed = {}
+
+        def execute(name):
+            stage, city, _ = graph[name]
+            with engine.begin() as conn:
+                conn.execute(text(Q_STAGE_CLAIM), {"run_id": run_id, "stage": name})
+            t = time.perf_counter()
+            try:
+                detail = run_stage(engine, stage, city)
+            except Exception as e:
+                message = str(e).splitlines()[0][:500] if str(e) else type(e).__name__
+                if not isinstance(e, StageFailed):
+                    logger.exception("❌ %s gagal", name)
+                with engine.begin() as conn:
+                    conn.execute(text(Q_STAGE_FAILED), {"run_id": run_id, "stage": name, "error": message})
+                raise
+            with engine.begin() as conn:
+                conn.execute(text(Q_STAGE_DONE), {
+                    "run_id": run_id, "stage": name, "input_key": input_key(stage, city), "detail": detail,
+                })
+            logger.info("   ✅ %s (%.1f s) %s", name, time.perf_counter() - t, detail)
+
+        pending = [n for n in graph if n not in done]
+        running = {}
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while pending or running:
+                ready = [n for n in pending if all(d in done for d in graph[n][2])]
+                for name in ready:
+                    pending.remove(name)
+                    running[pool.submit(execute, name)] = name
+                if not running:
+                    break   # sisa tahap tertahan oleh tahap yang gagal
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    if future.exception() is None:
+                        done.add(name)
+                    else:
+                        failed[name] = str(future.exception()).splitlines()[0] if str(future.exception()) else ""
+                        logger.error("⛔ %s gagal: %s", name, failed[name])
+
+        blocked = sorted(pending)
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE warehouse.pipeline_runs SET status = :status, finished_at = now() WHERE id = :id;"),
+                         {"id": run_id, "status": "failed" if failed or blocked else "done"})
+    finally:
+        lock_conn.execute(text("SELECT pg_advisory_unlock(:key);"), {"key": RUNNER_LOCK})
+        lock_conn.close()
+
+    return {
+        "run_id": run_id,
+        "resumed": resumed,
+        "done": sorted(done - skipped),
+        "skipped": sorted(skipped),
+        "failed": failed,
+        "blocked": blocked,
+        "cities_done": [c for c in cities if stage_name("record_run", c) in done - skipped],
+    }
+
+def pipeline_status(conn, run_id=None):
+    """(run, [tahap]) untuk run_id atau run terakhir; (None, []) jika belum ada run."""
+    run = conn.execute(text("""
+    SELECT id, started_at, finished_at, status, cities FROM warehouse.pipeline_runs
+    WHERE CAST(:run_id AS INTEGER) IS NULL OR id = :run_id
+    ORDER BY id DESC LIMIT 1;
+    """), {"run_id": run_id}).first()
+    if run is None:
+        return None, []
+    stages = conn.execute(text("""
+    SELECT stage, status, attempts, detail, error, started_at, finished_at
+    FROM warehouse.pipeline_stages WHERE run_id = :run_id;
+    """), {"run_id": run.id}).all()
+    order = {name: i for i, name in enumerate(build_graph(run.cities))}
+    return run, sorted(stages, key=lambda s: order.get(s.stage, len(order)))
+
+if __name__ == "__main__":
+    from warehouse.result_cache import prewarm_result_cache
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Runner pipeline ELT dengan checkpoint")
+    parser.add_argument("command", nargs="?", choices=["run", "status"], default="run")
+    parser.add_argument("--city", action="append", help="Kota (bisa diulang); default semua di data/cities.json")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Tahap paralel maksimum")
+    parser.add_argument("--fresh", action="store_true", help="Mulai run baru walau run terakhir belum selesai")
+    parser.add_argument("--run", type=int, help="Id run untuk status (default: terakhir)")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        with get_engine().connect() as conn:
+            run, stages = pipeline_status(conn, args.run)
+        if run is None:
+            print("Belum ada run pipeline.")
+            sys.exit(0)
+        print(f"Run {run.id} ({', '.join(run.cities)}): {run.status}, mulai {run.started_at:%Y-%m-%d %H:%M:%S}")
+        for s in stages:
+            took = f"{(s.finished_at - s.started_at).total_seconds():.1f}s" if s.started_at and s.finished_at else "-"
+            print(f"  {s.stage:<28} {s.status:<8} percobaan={s.attempts} {took:>7}  {s.error or s.detail or ''}")
+        sys.exit(0)
+
+    summary = run_pipeline(args.city, args.workers, args.fresh)
+    # Hanya kota yang selesai di-load pada run ini: versi data (dan cache) kota lain tidak berubah
+    n_queries = sum(prewarm_result_cache(city=city)[1] for city in summary["cities_done"])
+    if n_queries:
+        print(f"🔥 Cache dashboard {', '.join(summary['cities_done'])} diisi ulang ({n_queries} query).")
+    print(f"{'▶️ Run dilanjutkan' if summary['resumed'] else '🚀 Run'} {summary['run_id']}: "
+          f"{len(summary['done'])} tahap dijalankan, {len(summary['skipped'])} dilewati (checkpoint).")
+    if summary["failed"]:
+        for name, error in summary["failed"].items():
+            print(f"❌ {name}: {error}")
+        print(f"⏸️ {len(summary['blocked'])} tahap menunggu. Perbaiki penyebabnya lalu jalankan ulang "
+              f"`python elt/runner.py` untuk melanjutkan dari tahap yang gagal.")
+        sys.exit(1)
+    print("🎉 Pipeline selesai.")
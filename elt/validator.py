@@ -62,6 +62,31 @@ def validate_waste_data(df):
     print("   ✅ Validasi Waste Data Lulus.")
     return True
 
+def filter_waste_rows(df):
+    """
+    Versi per-baris dari validate_waste_data untuk data stream (event timbangan):
+    alih-alih menolak seluruh batch, hanya baris yang melanggar aturan yang dibuang.
+    Aturan: kecamatan & tanggal (YYYY-MM-DD) terisi, volume_ton numerik dan >= 0.
+    Mengembalikan (df_valid, jumlah_ditolak).
+    """
+    REQUIRED_COLS = ['tanggal', 'kecamatan', 'volume_ton', 'jenis_sampah', 'sumber_sampah']
+
+    if df.empty:
+        return df, 0
+
+    if not validate_schema(df, REQUIRED_COLS, "Waste Stream"):
+        return df.iloc[0:0], len(df)
+
+    kecamatan = df['kecamatan'].astype('string').str.strip()
+    tanggal = pd.to_datetime(df['tanggal'], format='%Y-%m-%d', errors='coerce')
+    volume = pd.to_numeric(df['volume_ton'], errors='coerce')
+
+    mask = kecamatan.fillna('').ne('') & tanggal.notna() & volume.notna() & (volume >= 0)
+    n_rejected = int((~mask).sum())
+    if n_rejected:
+        logger.warning(f"⚠️ [VALIDASI WARNING] Waste Stream: {n_rejected} baris ditolak.")
+    return df[mask.to_numpy()], n_rejected
+
 def validate_sipsn_data(df):
     """
     Validasi spesifik untuk sipsn.csv
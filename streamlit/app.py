@@ -1,15 +1,29 @@
 # streamlit/app.py
 import streamlit as st
-import pandas as pd
-import geopandas as gpd
+import logging
 import os
 import sys
-import re
-import plotly.express as px
-from sqlalchemy import create_engine, text
+import time
+from contextlib import contextmanager
 
 # Setup Page Config
-st.set_page_config("Waste Tracker Jakarta", layout="wide")
+st.set_page_config("Waste Tracker", layout="wide")
+
+SCRIPT_START = time.perf_counter()
+logger = logging.getLogger("waste_tracker")
+
+# Mode debug: waktu render tiap seksi ditampilkan di bawah seksi tsb (?debug=1 di URL
+# atau WASTE_DASHBOARD_DEBUG=1). Angkanya ikut diperbarui saat hanya satu fragment yang rerun.
+DEBUG_TIMINGS = os.environ.get("WASTE_DASHBOARD_DEBUG") == "1" or st.query_params.get("debug") == "1"
+
+@contextmanager
+def section_timer(name):
+    t = time.perf_counter()
+    yield
+    if DEBUG_TIMINGS:
+        runs = st.session_state.setdefault("section_runs", {})
+        runs[name] = runs.get(name, 0) + 1
+        st.caption(f"⏱️ {name}: {(time.perf_counter() - t) * 1000:.0f} ms (render ke-{runs[name]})")
 
 # --- PATH CONFIGURATION ---
 try:
@@ -19,17 +33,19 @@ try:
 except Exception:
     pass
 
-# --- HELPER FUNCTIONS ---
-def aggressive_clean_py(text):
-    if not isinstance(text, str): return None
-    text = text.strip().upper()
-    text = text.replace('\xa0', ' ')
-    text = re.sub(r'[^\w\s]', '', text) 
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+# Library berat (pandas, plotly.express, sqlalchemy, geopandas/scipy) diimpor di dalam fungsi
+# atau seksi yang memakainya: judul & metrik tampil dulu dari query ringkasan kecil, baru
+# kemudian tren, peta, dan armada. Anggaran waktu: benchmarks/bench_dashboard_startup.py
 
 # --- DATABASE CONNECTION ---
+@st.cache_resource
 def get_db_engine():
+    from sqlalchemy import create_engine
+    from elt.query_profile import maybe_enable_query_profiling
+
+    # Profil SQL opt-in (WASTE_SQL_PROFILE=1), lihat elt/query_profile.py
+    maybe_enable_query_profiling()
+
     if not (st.secrets and "connections" in st.secrets and "postgresql" in st.secrets["connections"]):
         st.error("❌ Kredensial Database tidak ditemukan!")
         st.stop()
@@ -45,120 +61,441 @@ def get_db_engine():
         return None
 
 # --- LOAD DATA FUNCTIONS ---
-@st.cache_data
-def load_data():
+# Hasil query disimpan di cache disk bersama semua proses dashboard (warehouse/result_cache.py),
+# dikunci dengan versi data kota terpilih: setelah pipeline kota tsb selesai, versinya naik dan
+# data baru langsung dipakai tanpa restart; load kota lain tidak membuat cache kota ini basi.
+# @st.cache_data tetap ada sebagai lapisan memori per proses (kunci ikut versi).
+DATA_VERSION_TTL = 30  # detik
+TREND_MARKER_POINTS = 120  # penanda titik di grafik tren hanya jika titiknya sedikit
+
+@st.cache_resource
+def get_result_cache():
+    from warehouse.result_cache import ResultCache
+    return ResultCache()
+
+def _missing_table(e):
+    """True jika query gagal karena tabelnya belum ada (undefined_table)."""
+    # SQLAlchemy membungkus error psycopg2 (e.orig); fetch_frame bisa melempar error psycopg2 langsung
+    return getattr(getattr(e, "orig", e), "pgcode", None) == "42P01"
+
+def _query_failed(name, e):
+    logger.error("Query dashboard %s gagal", name, exc_info=e)
+    st.error(f"Terjadi kesalahan koneksi Database ({name}): {e}")
+    st.stop()
+
+@st.cache_data(ttl=DATA_VERSION_TTL, show_spinner=False)
+def load_data_version(city_code=None):
+    from warehouse.etl_runs import get_data_version
+
+    engine = get_db_engine()
+    try:
+        with engine.connect() as conn:
+            return get_data_version(conn, city_code)
+    except Exception as e:
+        if not _missing_table(e):
+            _query_failed("load_data_version", e)
+        # Tabel etl_runs belum ada: semua hasil dianggap versi 0
+        return 0
+
+@st.cache_data(max_entries=8)
+def load_cities(version):
+    from warehouse.queries import fetch_cities
+
     engine = get_db_engine()
-    
-    q = """
-    SELECT t.date::date as date, l.kecamatan, SUM(f.volume) as volume
-    FROM warehouse.fact_waste f
-    JOIN warehouse.dim_time t ON f.time_id = t.id
-    JOIN warehouse.dim_location l ON f.location_id = l.id
-    GROUP BY t.date, l.kecamatan
-    ORDER BY t.date;
-    """
-    
     try:
         with engine.connect() as conn:
-            # 1. Eksekusi Query
-            result = conn.execute(text(q))
-            # 2. Manual DataFrame
-            df = pd.DataFrame(result.fetchall(), columns=result.keys())
-        
-        # 3. Post-Processing (Fix Tipe Data)
-        df['volume'] = pd.to_numeric(df['volume'], errors='coerce').fillna(0)
-        df['date'] = pd.to_datetime(df['date']).dt.date
-        
+            return fetch_cities(conn)
+    except Exception as e:
+        st.error(f"Terjadi kesalahan koneksi Database (load_cities): {e}")
+        st.stop()
+
+# Semua query di bawah menerima city_id: fact_waste dipartisi per kota, sehingga tiap query
+# hanya membaca partisi kota yang dipilih di sidebar.
+@st.cache_data(max_entries=8)
+def load_summary(city_id, version):
+    from warehouse.result_cache import cached_summary
+
+    engine = get_db_engine()
+    try:
+        with engine.connect() as conn:
+            return cached_summary(get_result_cache(), conn, version, city_id)
+    except Exception as e:
+        st.error(f"Terjadi kesalahan koneksi Database (load_summary): {e}")
+        st.stop()
+
+@st.cache_data(max_entries=256)
+def load_total_volume(city_id, start_date, end_date, kecamatan, version):
+    from warehouse.result_cache import cached_total_volume
+
+    engine = get_db_engine()
+    with engine.connect() as conn:
+        return cached_total_volume(get_result_cache(), conn, version, start_date, end_date, kecamatan, city_id)
+
+@st.cache_data(max_entries=64)
+def load_data(city_id, start_date, end_date, kecamatan, version):
+    from warehouse.result_cache import cached_daily
+
+    engine = get_db_engine()
+
+    try:
+        with engine.connect() as conn:
+            # Query yang sama dipakai read API (warehouse/queries.py), difilter di database
+            df = cached_daily(get_result_cache(), conn, version, start_date, end_date, kecamatan, city_id)
         return df
     except Exception as e:
         st.error(f"Terjadi kesalahan koneksi Database (load_data): {e}")
         st.stop()
 
-@st.cache_data
-def load_geo():
-    # Load GeoJSON (File lokal)
-    path = os.environ.get("WASTE_DATA_DIR", "./data")
-    if not os.path.exists(path):
-        path = os.path.join(os.path.dirname(__file__), "..", "data")
+# Tren sudah di-downsample di database (Q_TREND): paling banyak TREND_POINTS titik ke browser
+@st.cache_data(max_entries=64)
+def load_trend(city_id, start_date, end_date, kecamatan, version):
+    from warehouse.result_cache import cached_trend
+
+    engine = get_db_engine()
+    try:
+        with engine.connect() as conn:
+            return cached_trend(get_result_cache(), conn, version, start_date, end_date, kecamatan, city_id)
+    except Exception as e:
+        st.error(f"Terjadi kesalahan koneksi Database (load_trend): {e}")
+        st.stop()
 
-    gfile = os.path.join(path, "kecamatan.geojson")
-    
-    if not os.path.exists(gfile) and os.path.exists("data/kecamatan.geojson"):
-        gfile = "data/kecamatan.geojson"
+# Tabel di bawah diisi tahap opsional (prakiraan, simulasi risiko, anomali, kubus). Hanya tabel yang
+# belum dibuat yang diganti frame kosong - di luar cache, agar data tampil begitu tahapnya dijalankan;
+# kesalahan lain dicatat ke log lalu dashboard berhenti seperti loader di atas.
+@st.cache_data(max_entries=8)
+def _load_forecast(city_id, version):
+    from warehouse.forecast import Z_95
+    from warehouse.frames import fetch_frame
 
-    if not os.path.exists(gfile):
-        return None
+    engine = get_db_engine()
+
+    q = """
+    SELECT fc.target_date AS date, l.kecamatan, fc.volume_ton, fc.lower_ton, fc.upper_ton,
+           COALESCE(fc.sigma_ton, (fc.upper_ton - fc.volume_ton) / :z) AS sigma_ton
+    FROM warehouse.forecast_daily fc
+    JOIN warehouse.dim_location l ON fc.location_id = l.id
+    WHERE l.city_id = :city_id
+    ORDER BY fc.target_date;
+    """
+
+    with engine.connect() as conn:
+        df = fetch_frame(conn, q, {"city_id": city_id, "z": Z_95}, dtypes={
+            'date': 'date', 'kecamatan': 'category',
+            'volume_ton': 'float', 'lower_ton': 'float', 'upper_ton': 'float', 'sigma_ton': 'float',
+        })
+    cols = ['volume_ton', 'lower_ton', 'upper_ton', 'sigma_ton']
+    df[cols] = df[cols].fillna(0)
+    return df
+
+def load_forecast(city_id, version):
+    import pandas as pd
+
+    try:
+        return _load_forecast(city_id, version)
+    except Exception as e:
+        if not _missing_table(e):
+            _query_failed("load_forecast", e)
+        # Tabel prakiraan belum ada: grafik tren tetap tampil tanpa overlay
+        return pd.DataFrame(columns=['date', 'kecamatan', 'volume_ton', 'lower_ton', 'upper_ton', 'sigma_ton'])
+
+@st.cache_data(max_entries=8)
+def _load_capacity_risk(city_id, version):
+    from warehouse.queries import fetch_capacity_risk
+
+    engine = get_db_engine()
+    with engine.connect() as conn:
+        return fetch_capacity_risk(conn, city_id)
+
+def load_capacity_risk(city_id, version):
+    import pandas as pd
+
+    try:
+        return _load_capacity_risk(city_id, version)
+    except Exception as e:
+        if not _missing_table(e):
+            _query_failed("load_capacity_risk", e)
+        # Simulasi risiko belum pernah dijalankan: tabel status tetap tampil tanpa kolom risiko
+        return pd.DataFrame(columns=['kecamatan', 'p_overload', 'p_critical', 'expected_shortfall_ton'])
+
+@st.cache_data(max_entries=8)
+def _load_anomaly_events(city_id, version):
+    from warehouse.frames import fetch_frame
+
+    engine = get_db_engine()
+
+    q = """
+    SELECT a.date, l.kecamatan, a.volume_ton, a.expected_ton, a.ratio, a.zscore
+    FROM warehouse.anomalies a
+    JOIN warehouse.dim_location l ON a.location_id = l.id
+    WHERE l.city_id = :city_id
+    ORDER BY a.date DESC, a.ratio DESC;
+    """
+
+    with engine.connect() as conn:
+        return fetch_frame(conn, q, {"city_id": city_id}, dtypes={
+            'date': 'date', 'kecamatan': 'category',
+            'volume_ton': 'float', 'expected_ton': 'float', 'ratio': 'float', 'zscore': 'float',
+        })
+
+def load_anomaly_events(city_id, version):
+    import pandas as pd
 
     try:
-        gdf = gpd.read_file(gfile).to_crs(4326)
-        if "district" in gdf.columns:
-            gdf = gdf.rename(columns={"district": "kecamatan"})
-        if "kecamatan" in gdf.columns:
-            gdf["kecamatan"] = gdf["kecamatan"].apply(aggressive_clean_py)
-        return gdf
+        return _load_anomaly_events(city_id, version)
+    except Exception as e:
+        if not _missing_table(e):
+            _query_failed("load_anomaly_events", e)
+        return pd.DataFrame(columns=['date', 'kecamatan', 'volume_ton', 'expected_ton', 'ratio', 'zscore'])
+
+@st.cache_data(max_entries=64)
+def _load_breakdown(city_id, start_date, end_date, kecamatan, version):
+    from warehouse.result_cache import cached_breakdown
+
+    engine = get_db_engine()
+
+    # Hanya membaca kubus warehouse.cube_waste (lihat warehouse/cube.py), tanpa scan fact_waste
+    with engine.connect() as conn:
+        cache = get_result_cache()
+        return (cached_breakdown(cache, conn, version, "category", start_date, end_date, kecamatan, city_id),
+                cached_breakdown(cache, conn, version, "source", start_date, end_date, kecamatan, city_id))
+
+def load_breakdown(city_id, start_date, end_date, kecamatan, version):
+    import pandas as pd
+
+    try:
+        return _load_breakdown(city_id, start_date, end_date, kecamatan, version)
+    except Exception as e:
+        if not _missing_table(e):
+            _query_failed("load_breakdown", e)
+        # Kubus belum dibuat: seksi komposisi tampil kosong
+        empty = pd.DataFrame(columns=['name', 'volume'])
+        return empty, empty
+
+@st.cache_resource
+def load_geo(city_code):
+    # Artefak GeoJSON ringkas (nama bersih, geometri disederhanakan, tetangga) - lihat warehouse/geo.py
+    from warehouse.city import city_data_dir
+    from warehouse.geo import load_geo_artifact
+
+    try:
+        return load_geo_artifact(city_data_dir(city_code))
     except Exception:
         return None
 
-@st.cache_data
-def load_fleet_analysis(start_date, end_date):
+@st.cache_data(max_entries=64)
+def load_fleet_analysis(city_id, start_date, end_date, version):
+    from warehouse.result_cache import cached_fleet_analysis
+
     engine = get_db_engine()
-    
+
     try:
         with engine.connect() as conn:
-            # --- 1. Query Armada ---
-            q_fleet = "SELECT kecamatan, armada_total, armada_operasional, ritase_harian, kapasitas_m3 FROM warehouse.dim_fleet;"
-            res_fleet = conn.execute(text(q_fleet))
-            df_fleet = pd.DataFrame(res_fleet.fetchall(), columns=res_fleet.keys())
-
-            # Konversi kolom angka agar tidak dianggap string
-            cols_to_numeric = ['armada_total', 'armada_operasional', 'ritase_harian', 'kapasitas_m3']
-            for col in cols_to_numeric:
-                df_fleet[col] = pd.to_numeric(df_fleet[col], errors='coerce').fillna(0)
-
-            # --- 2. Query Waste ---
-            q_waste = f"""
-            SELECT l.kecamatan, AVG(f.volume) as avg_daily_waste_ton
-            FROM warehouse.fact_waste f
-            JOIN warehouse.dim_location l ON f.location_id = l.id
-            JOIN warehouse.dim_time t ON f.time_id = t.id
-            WHERE t.date >= '{start_date}' AND t.date <= '{end_date}'
-            GROUP BY l.kecamatan;
-            """
-            res_waste = conn.execute(text(q_waste))
-            df_waste = pd.DataFrame(res_waste.fetchall(), columns=res_waste.keys())
-            
-            # Fix tipe data waste
-            df_waste['avg_daily_waste_ton'] = pd.to_numeric(df_waste['avg_daily_waste_ton'], errors='coerce').fillna(0)
-        
-        return pd.merge(df_fleet, df_waste, on="kecamatan", how="inner")
+            df_fleet = cached_fleet_analysis(get_result_cache(), conn, version, start_date, end_date, city_id)
+        return df_fleet
     except Exception as e:
         st.error(f"Gagal mengambil data armada (load_fleet_analysis): {e}")
         st.stop()
 
+# --- OLAHAN PER SEKSI (dimemo per input seksi) ---
+# Grafik & tabel tiap seksi dibangun di fungsi ber-cache yang kuncinya hanya input seksi tsb,
+# sehingga rerun karena filter lain tidak membangun ulang figure, merge peta, atau melt armada.
+@st.cache_data(max_entries=32)
+def build_trend_figure(city_id, start_date, end_date, kecamatan, show_forecast, forecast_days, version):
+    import numpy as np
+    import plotly.express as px
+    from warehouse.forecast import Z_95
+    from warehouse.queries import trend_bucket_days
+
+    # Satu titik = rata-rata total harian dalam satu bucket; rentang panjang dipadatkan di database
+    # sehingga jumlah titik (payload & waktu render) tetap. Tanggal yang sudah dipadatkan retensi
+    # (minggu/bulan) ikut sebagai rata-rata hariannya.
+    df_trend = load_trend(city_id, start_date, end_date, kecamatan, version)
+    bucket_days = trend_bucket_days(start_date, end_date)
+    fig_trend = px.line(df_trend, x="date", y="volume", markers=len(df_trend) <= TREND_MARKER_POINTS,
+                        template="plotly_white")
+
+    if bucket_days > 1:
+        # Pita min/max per bucket: lonjakan satu hari tetap terlihat walau garisnya rata-rata bucket
+        fig_trend.add_scatter(x=df_trend["date"], y=df_trend["volume_max"], mode="lines", line=dict(width=0),
+                              showlegend=False, hoverinfo="skip")
+        fig_trend.add_scatter(x=df_trend["date"], y=df_trend["volume_min"], mode="lines", line=dict(width=0),
+                              fill="tonexty", fillcolor="rgba(31,119,180,0.15)", name="Min-maks harian")
+
+    if show_forecast:
+        df_fc = load_forecast(city_id, version)
+        if kecamatan:
+            df_fc = df_fc[df_fc['kecamatan'].isin(kecamatan)]
+        # Interval total kota: batas per kecamatan tidak bisa dijumlahkan (hasilnya jauh lebih lebar
+        # dari 95%). Residual antar kecamatan dianggap independen: varians total = jumlah varians.
+        fc_trend = (df_fc.assign(var_ton=df_fc["sigma_ton"] ** 2)
+                    .groupby("date", as_index=False)[["volume_ton", "var_ton"]].sum().head(forecast_days))
+        half_width = Z_95 * np.sqrt(fc_trend["var_ton"])
+        fc_trend["lower_ton"] = (fc_trend["volume_ton"] - half_width).clip(lower=0)
+        fc_trend["upper_ton"] = fc_trend["volume_ton"] + half_width
+
+        if not fc_trend.empty:
+            # Pita interval (lower -> upper), lalu garis prakiraan putus-putus
+            fig_trend.add_scatter(x=fc_trend["date"], y=fc_trend["upper_ton"], mode="lines", line=dict(width=0), showlegend=False, hoverinfo="skip")
+            fig_trend.add_scatter(x=fc_trend["date"], y=fc_trend["lower_ton"], mode="lines", line=dict(width=0), fill="tonexty",
+                                  fillcolor="rgba(255,127,14,0.15)", name="Interval 95%", hoverinfo="skip")
+            fig_trend.add_scatter(x=fc_trend["date"], y=fc_trend["volume_ton"], mode="lines", line=dict(dash="dash", color="#ff7f0e"), name="Prakiraan")
+
+    return fig_trend, bucket_days
+
+@st.cache_data(max_entries=64)
+def build_anomaly_table(city_id, start_date, end_date, kecamatan, version):
+    import pandas as pd
+
+    df_anom = load_anomaly_events(city_id, version)
+    df_anom = df_anom[(df_anom["date"] >= pd.Timestamp(start_date)) & (df_anom["date"] <= pd.Timestamp(end_date))]
+    if kecamatan:
+        df_anom = df_anom[df_anom["kecamatan"].isin(kecamatan)]
+    return df_anom
+
+@st.cache_data(max_entries=64)
+def build_breakdown_figures(city_id, start_date, end_date, kecamatan, version):
+    """(grafik per jenis, grafik per sumber), atau None jika kubus belum tersedia."""
+    import plotly.express as px
+
+    df_jenis, df_sumber = load_breakdown(city_id, start_date, end_date, kecamatan, version)
+    if df_jenis.empty and df_sumber.empty:
+        return None
+
+    fig_jenis = px.bar(df_jenis, x="volume", y="name", orientation="h", template="plotly_white",
+                       title="Per Jenis Sampah", labels={"volume": "Volume (Ton)", "name": ""})
+    fig_jenis.update_yaxes(categoryorder="total ascending")
+    fig_sumber = px.bar(df_sumber, x="volume", y="name", orientation="h", template="plotly_white",
+                        title="Per Sumber Sampah", labels={"volume": "Volume (Ton)", "name": ""})
+    fig_sumber.update_yaxes(categoryorder="total ascending")
+    return fig_jenis, fig_sumber
+
+@st.cache_data(max_entries=32)
+def build_map_figure(city, start_date, end_date, kecamatan, version):
+    """Choropleth volume per kecamatan, atau None jika geometri wilayah terpilih tidak ada."""
+    import pandas as pd
+    import plotly.express as px
+
+    features = load_geo(city["code"])["features"]
+    if kecamatan:
+        features = [f for f in features if f["properties"]["kecamatan"] in kecamatan]
+
+    df_filtered = load_data(city["id"], start_date, end_date, kecamatan, version)
+    map_agg = df_filtered.groupby("kecamatan", observed=True)["volume"].sum()
+    df_map = pd.DataFrame({"kecamatan": [f["properties"]["kecamatan"] for f in features]})
+    df_map["volume"] = df_map["kecamatan"].map(map_agg).fillna(0)
+
+    if df_map.empty:
+        return None
+
+    fig_map = px.choropleth_mapbox(
+        df_map,
+        geojson={"type": "FeatureCollection", "features": features},
+        locations="kecamatan",
+        featureidkey="properties.kecamatan",
+        color="volume",
+        color_continuous_scale="Reds",
+        mapbox_style="carto-positron",
+        center={"lat": city["center_lat"] or -6.22, "lon": city["center_lon"] or 106.83},
+        zoom=city["zoom"] or 9.8,
+        opacity=0.7,
+        labels={"volume": "Total Volume (Ton)"}
+    )
+    fig_map.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
+    return fig_map
+
+@st.cache_data(max_entries=32)
+def build_fleet_view(city_id, start_date, end_date, kecamatan, version):
+    """(armada + status kapasitas, scatter beban vs kapasitas, bar armada), atau None jika kosong."""
+    import pandas as pd
+    import plotly.express as px
+    from warehouse.fleet_metrics import compute_fleet_status
+
+    df_fleet = load_fleet_analysis(city_id, start_date, end_date, version)
+    if kecamatan:
+        df_fleet = df_fleet[df_fleet['kecamatan'].isin(kecamatan)]
+    if df_fleet.empty:
+        return None
+
+    # HITUNG KAPASITAS & STATUS (SAFE/WARNING/CRITICAL)
+    df_fleet = compute_fleet_status(df_fleet)
+    # Peluang overload dari simulasi Monte Carlo (warehouse/capacity_risk.py)
+    p_overload = load_capacity_risk(city_id, version).set_index('kecamatan')['p_overload']
+    df_fleet['p_overload'] = df_fleet['kecamatan'].astype(str).map(p_overload.rename(index=str)).astype(float)
+
+    fig_sc = px.scatter(
+        df_fleet, x="capacity_ton", y="avg_daily_waste_ton", 
+        color="status", size="armada_total", hover_name="kecamatan",
+        color_discrete_map={"SAFE": "green", "WARNING": "orange", "CRITICAL": "red"},
+        labels={"capacity_ton": "Kapasitas (Ton)", "avg_daily_waste_ton": "Beban Sampah (Ton)"}
+    )
+    max_v = max(df_fleet['capacity_ton'].max(), df_fleet['avg_daily_waste_ton'].max())
+    if pd.isna(max_v): max_v = 100
+    fig_sc.add_shape(type="line", x0=0, y0=0, x1=max_v, y1=max_v, line=dict(dash="dash", color="grey"))
+
+    df_bar = df_fleet.melt(
+        id_vars=["kecamatan"], 
+        value_vars=["armada_total", "armada_operasional"],
+        var_name="Kategori", 
+        value_name="Jumlah Unit"
+    )
+    fig_bar = px.bar(
+        df_bar, x="kecamatan", y="Jumlah Unit", color="Kategori", barmode="group",
+        color_discrete_map={"armada_total": "lightgray", "armada_operasional": "#1f77b4"},
+        height=400
+    )
+    return df_fleet, fig_sc, fig_bar
+
+@st.cache_data(max_entries=64)
+def build_reallocation(city_id, city_code, start_date, end_date, kecamatan, use_forecast, only_neighbours,
+                       forecast_days, version):
+    """(usulan pemindahan truk, overload sebelum, overload sesudah) dalam ton/hari."""
+    from warehouse.fleet_metrics import compute_fleet_status
+    from warehouse.fleet_reallocation import propose_reallocation, total_overload
+    from warehouse.geo import geo_neighbour_pairs
+
+    df_realloc = build_fleet_view(city_id, start_date, end_date, kecamatan, version)[0]
+    load_col = 'avg_daily_waste_ton'
+    if use_forecast:
+        df_fc_all = load_forecast(city_id, version)
+        fc_load = df_fc_all.groupby('kecamatan', observed=True)['volume_ton'].apply(lambda s: s.head(forecast_days).mean())
+        # kecamatan bertipe category: hasil map juga category, dikembalikan ke float
+        df_realloc = df_realloc.assign(forecast_ton=df_realloc['kecamatan'].map(fc_load).astype(float))
+        df_realloc['forecast_ton'] = df_realloc['forecast_ton'].fillna(df_realloc['avg_daily_waste_ton'])
+        load_col = 'forecast_ton'
+
+    geo = load_geo(city_code)
+    neighbours = geo_neighbour_pairs(geo) if (only_neighbours and geo is not None) else None
+    moves, after = propose_reallocation(df_realloc, load_col=load_col, neighbours=neighbours)
+
+    before = compute_fleet_status(df_realloc, load_col=load_col)
+    return moves, total_overload(before, load_col), total_overload(after, load_col)
+
 # --------------------------------------------------------
 # MAIN UI & LOGIC
 # --------------------------------------------------------
 st.title("📊 Waste Tracker — Monitoring Sampah Kota")
 
-# A. LOAD INITIAL DATA
-try:
-    df = load_data()
-except Exception as e:
-    st.error(f"Critical Error: {e}")
-    st.stop()
+# A. RINGKASAN AWAL (query kecil: rentang tanggal & daftar kecamatan, tanpa pandas)
+cities = load_cities(load_data_version())
 
-if df.empty:
+if not cities:
     st.warning("Database Kosong. Silakan jalankan ELT pipeline.")
     st.stop()
 
 # --- SIDEBAR CONFIGURATION ---
 st.sidebar.header("🎛️ Filter Dashboard")
 
-# 1. Filter Tanggal
-df["date"] = pd.to_datetime(df["date"]).dt.date
-min_date = df["date"].min()
-max_date = df["date"].max()
+# 0. Kota (menentukan partisi yang dibaca semua query di bawah)
+city = st.sidebar.selectbox("Kota", cities, format_func=lambda c: c["name"] or c["code"])
+city_id = city["id"]
+data_version = load_data_version(city["code"])
+min_date, max_date, all_kecamatan = load_summary(city_id, data_version)
+
+if min_date is None:
+    st.warning(f"Belum ada data untuk {city['name'] or city['code']}. Silakan jalankan ELT pipeline kota ini.")
+    st.stop()
 
+# 1. Filter Tanggal
 start_date = st.sidebar.date_input("Tanggal Mulai", min_date, min_value=min_date, max_value=max_date)
 end_date = st.sidebar.date_input("Tanggal Akhir", max_date, min_value=min_date, max_value=max_date)
 
@@ -167,138 +504,184 @@ if start_date > end_date:
     st.stop()
 
 # 2. Filter Kecamatan (Multiselect)
-all_kecamatan = sorted(df['kecamatan'].unique())
 selected_kecamatan = st.sidebar.multiselect(
     "Pilih Wilayah (Kecamatan)", 
     options=all_kecamatan,
     placeholder="Pilih wilayah (opsional)..."
 )
 
-# --- FILTERING LOGIC ---
-mask_date = (df["date"] >= start_date) & (df["date"] <= end_date)
+# 3. Prakiraan (overlay pada grafik tren)
+show_forecast = st.sidebar.checkbox("Tampilkan Prakiraan", value=True)
+forecast_days = st.sidebar.slider("Horizon Prakiraan (Hari)", min_value=7, max_value=30, value=14, disabled=not show_forecast)
 
 if selected_kecamatan:
-    mask_loc = df["kecamatan"].isin(selected_kecamatan)
-    df_filtered = df[mask_date & mask_loc]
     st.sidebar.success(f"Filter aktif: {len(selected_kecamatan)} wilayah.")
 else:
-    df_filtered = df[mask_date]
     st.sidebar.info("Menampilkan seluruh wilayah.")
 
-if df_filtered.empty:
-    st.warning("Tidak ada data dengan filter yang dipilih.")
-    st.stop()
-
 # --- VISUALISASI UTAMA ---
+# Tiap seksi adalah fragment (@st.fragment): widget di dalam seksi (mis. realokasi armada) hanya
+# menjalankan ulang seksi tsb. Saat filter sidebar berubah seluruh script berjalan ulang, tetapi
+# hasil olahan tiap seksi dimemo per inputnya (build_* di atas), sehingga hanya seksi yang
+# inputnya berubah yang benar-benar dihitung ulang (mis. horizon prakiraan: hanya tren).
+kecamatan_key = tuple(sorted(selected_kecamatan))
+
+# C. METRIK (langsung dari agregat SQL, tampil sebelum data harian dimuat)
+with section_timer("metrik"):
+    total_vol, n_rows = load_total_volume(city_id, start_date, end_date, kecamatan_key, data_version)
+
+    if n_rows == 0:
+        st.warning("Tidak ada data dengan filter yang dipilih.")
+        st.stop()
 
-# C. METRIK
-total_vol = df_filtered['volume'].sum()
-days_count = (end_date - start_date).days + 1
-avg_vol = total_vol / days_count if days_count > 0 else 0
+    days_count = (end_date - start_date).days + 1
+    avg_vol = total_vol / days_count if days_count > 0 else 0
 
-col1, col2 = st.columns(2)
-col1.metric("Total Volume (Ton)", f"{total_vol:,.0f}")
-col2.metric("Rata-rata Harian (Ton/Hari)", f"{avg_vol:,.0f}")
+    col1, col2 = st.columns(2)
+    col1.metric("Total Volume (Ton)", f"{total_vol:,.0f}")
+    col2.metric("Rata-rata Harian (Ton/Hari)", f"{avg_vol:,.0f}")
 
 st.markdown("---")
 
 # D. GRAFIK TREN
-st.subheader("📈 Tren Volume Sampah")
-daily_trend = df_filtered.groupby("date", as_index=False)["volume"].sum()
-fig_trend = px.line(daily_trend, x="date", y="volume", markers=True, template="plotly_white")
-st.plotly_chart(fig_trend, use_container_width=True)
+@st.fragment
+def section_trend(city_id, start_date, end_date, kecamatan_key, show_forecast, forecast_days, version):
+    with section_timer("tren"):
+        st.subheader("📈 Tren Volume Sampah")
+        fig_trend, bucket_days = build_trend_figure(city_id, start_date, end_date, kecamatan_key,
+                                                    show_forecast, forecast_days, version)
+        st.plotly_chart(fig_trend, use_container_width=True)
+        if bucket_days > 1:
+            st.caption(f"1 titik = rata-rata {bucket_days} hari; pita = total harian terendah-tertinggi dalam periode tsb.")
+
+# D2. ANOMALI VOLUME
+@st.fragment
+def section_anomalies(city_id, start_date, end_date, kecamatan_key, version):
+    with section_timer("anomali"):
+        df_anom = build_anomaly_table(city_id, start_date, end_date, kecamatan_key, version)
+
+        with st.expander(f"🚨 Lonjakan Volume Terdeteksi ({len(df_anom)})", expanded=False):
+            if df_anom.empty:
+                st.info("Tidak ada lonjakan volume pada periode & wilayah terpilih.")
+            else:
+                st.dataframe(
+                    df_anom,
+                    hide_index=True,
+                    column_config={
+                        "date": st.column_config.DateColumn("Tanggal"),
+                        "volume_ton": st.column_config.NumberColumn("Volume (Ton)", format="%.1f"),
+                        "expected_ton": st.column_config.NumberColumn("Normal (Ton)", format="%.1f"),
+                        "ratio": st.column_config.NumberColumn("Rasio", format="%.2fx"),
+                        "zscore": st.column_config.NumberColumn("Z", format="%.1f"),
+                    }
+                )
+
+# D3. KOMPOSISI SAMPAH (dari kubus agregat)
+@st.fragment
+def section_breakdown(city_id, start_date, end_date, kecamatan_key, version):
+    with section_timer("komposisi"):
+        st.subheader("🧪 Komposisi Sampah")
+        figures = build_breakdown_figures(city_id, start_date, end_date, kecamatan_key, version)
+
+        if figures is None:
+            st.info("Kubus agregat belum tersedia. Jalankan ELT pipeline untuk membangunnya.")
+        else:
+            fig_jenis, fig_sumber = figures
+            col_jenis, col_sumber = st.columns(2)
+            with col_jenis:
+                st.plotly_chart(fig_jenis, use_container_width=True)
+            with col_sumber:
+                st.plotly_chart(fig_sumber, use_container_width=True)
 
 # E. PETA HEATMAP
-st.subheader("🗺️ Peta Persebaran")
-gdf = load_geo()
-
-if gdf is not None:
-    if selected_kecamatan:
-        gdf_vis = gdf[gdf['kecamatan'].isin(selected_kecamatan)]
-    else:
-        gdf_vis = gdf
-
-    map_agg = df_filtered.groupby("kecamatan", as_index=False)["volume"].sum()
-    merged = gdf_vis.merge(map_agg, on="kecamatan", how="left").fillna(0).set_index("kecamatan")
-
-    if not merged.empty:
-        fig_map = px.choropleth_mapbox(
-            merged,
-            geojson=merged.geometry,
-            locations=merged.index,
-            color="volume",
-            color_continuous_scale="Reds",
-            mapbox_style="carto-positron",
-            center={"lat": -6.22, "lon": 106.83}, 
-            zoom=9.8,     
-            opacity=0.7,
-            labels={"volume": "Total Volume (Ton)"}
-        )
-        fig_map.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
-        st.plotly_chart(fig_map, use_container_width=True)
-    else:
-        st.warning("Data geometri untuk wilayah terpilih tidak ditemukan.")
-else:
-    st.warning("File GeoJSON tidak ditemukan (cek folder data/).")
+@st.fragment
+def section_map(city, start_date, end_date, kecamatan_key, version):
+    with section_timer("peta"):
+        st.subheader("🗺️ Peta Persebaran")
 
-# F. ANALISIS ARMADA
-st.markdown("---")
-st.subheader("🚚 Analisis Performa & Ketersediaan Armada")
+        if load_geo(city["code"]) is None:
+            st.warning("File GeoJSON tidak ditemukan (cek folder data/).")
+            return
 
-df_fleet_all = load_fleet_analysis(start_date, end_date)
+        fig_map = build_map_figure(city, start_date, end_date, kecamatan_key, version)
+        if fig_map is not None:
+            st.plotly_chart(fig_map, use_container_width=True)
+        else:
+            st.warning("Data geometri untuk wilayah terpilih tidak ditemukan.")
 
-if selected_kecamatan:
-    df_fleet = df_fleet_all[df_fleet_all['kecamatan'].isin(selected_kecamatan)]
-else:
-    df_fleet = df_fleet_all
-
-if not df_fleet.empty:
-    DENSITY = 0.33
-    
-    # HITUNG KAPASITAS 
-    df_fleet['capacity_ton'] = df_fleet['armada_operasional'] * df_fleet['ritase_harian'] * df_fleet['kapasitas_m3'] * DENSITY
-    df_fleet['capacity_ton'] = df_fleet['capacity_ton'].replace(0, 0.1)
-    
-    df_fleet['load_ratio'] = (df_fleet['avg_daily_waste_ton'] / df_fleet['capacity_ton']) * 100
-    df_fleet['status'] = df_fleet['load_ratio'].apply(lambda x: "CRITICAL" if x > 110 else ("WARNING" if x > 90 else "SAFE"))
-
-    col_a, col_b = st.columns([2, 1])
-    
-    with col_a:
-        st.markdown("##### ⚖️ Volume Sampah vs Kapasitas Angkut")
-        fig_sc = px.scatter(
-            df_fleet, x="capacity_ton", y="avg_daily_waste_ton", 
-            color="status", size="armada_total", hover_name="kecamatan",
-            color_discrete_map={"SAFE": "green", "WARNING": "orange", "CRITICAL": "red"},
-            labels={"capacity_ton": "Kapasitas (Ton)", "avg_daily_waste_ton": "Beban Sampah (Ton)"}
-        )
-        max_v = max(df_fleet['capacity_ton'].max(), df_fleet['avg_daily_waste_ton'].max())
-        if pd.isna(max_v): max_v = 100
-        fig_sc.add_shape(type="line", x0=0, y0=0, x1=max_v, y1=max_v, line=dict(dash="dash", color="grey"))
-        st.plotly_chart(fig_sc, use_container_width=True)
-        st.caption("ℹ️ **Titik di atas garis putus-putus** menandakan kecamatan yang kekurangan armada (Overload).")
-
-    with col_b:
-        st.markdown("##### 🚨 Status Beban Kerja")
-        st.dataframe(
-            df_fleet[['kecamatan', 'load_ratio', 'status']].sort_values('load_ratio', ascending=False),
-            hide_index=True,
-            column_config={"load_ratio": st.column_config.ProgressColumn("Load %", format="%.2f%%", min_value=0, max_value=150)}
+# F. ANALISIS ARMADA
+@st.fragment
+def section_fleet(city, start_date, end_date, kecamatan_key, forecast_days, version):
+    with section_timer("armada"):
+        st.markdown("---")
+        st.subheader("🚚 Analisis Performa & Ketersediaan Armada")
+
+        fleet = build_fleet_view(city["id"], start_date, end_date, kecamatan_key, version)
+        if fleet is None:
+            st.info("Tidak ada data armada untuk wilayah yang dipilih.")
+            return
+
+        df_fleet, fig_sc, fig_bar = fleet
+        col_a, col_b = st.columns([2, 1])
+
+        with col_a:
+            st.markdown("##### ⚖️ Volume Sampah vs Kapasitas Angkut")
+            st.plotly_chart(fig_sc, use_container_width=True)
+            st.caption("ℹ️ **Titik di atas garis putus-putus** menandakan kecamatan yang kekurangan armada (Overload).")
+
+        with col_b:
+            st.markdown("##### 🚨 Status Beban Kerja")
+            st.dataframe(
+                df_fleet[['kecamatan', 'load_ratio', 'status', 'p_overload']].sort_values('load_ratio', ascending=False),
+                hide_index=True,
+                column_config={
+                    "load_ratio": st.column_config.ProgressColumn("Load %", format="%.2f%%", min_value=0, max_value=150),
+                    "p_overload": st.column_config.ProgressColumn("Risiko Overload", format="percent", min_value=0, max_value=1),
+                }
+            )
+            st.caption("ℹ️ **Risiko Overload** = peluang volume harian melebihi kapasitas armada yang berlaku, "
+                       "dari simulasi lonjakan volume & truk yang tidak jalan (12 minggu terakhir).")
+
+        st.markdown("##### 🚛 Ketersediaan Armada (Total vs Operasional)")
+        st.plotly_chart(fig_bar, use_container_width=True)
+
+    section_reallocation(city, start_date, end_date, kecamatan_key, forecast_days, version)
+
+# G. USULAN REALOKASI ARMADA (fragment sendiri: radio & checkbox di sini tidak menjalankan ulang seksi lain)
+@st.fragment
+def section_reallocation(city, start_date, end_date, kecamatan_key, forecast_days, version):
+    with section_timer("realokasi"), st.expander("🔁 Usulan Realokasi Armada", expanded=False):
+        col_r1, col_r2 = st.columns(2)
+        load_basis = col_r1.radio("Dasar Beban", ["Rata-rata Historis", "Prakiraan"], horizontal=True)
+        only_neighbours = col_r2.checkbox("Hanya antar kecamatan bertetangga", value=True,
+                                          disabled=load_geo(city["code"]) is None)
+
+        moves, overload_before, overload_after = build_reallocation(
+            city["id"], city["code"], start_date, end_date, kecamatan_key,
+            load_basis == "Prakiraan", only_neighbours, forecast_days if load_basis == "Prakiraan" else None, version,
         )
-
-    st.markdown("##### 🚛 Ketersediaan Armada (Total vs Operasional)")
-    df_bar = df_fleet.melt(
-        id_vars=["kecamatan"], 
-        value_vars=["armada_total", "armada_operasional"],
-        var_name="Kategori", 
-        value_name="Jumlah Unit"
-    )
-    
-    fig_bar = px.bar(
-        df_bar, x="kecamatan", y="Jumlah Unit", color="Kategori", barmode="group",
-        color_discrete_map={"armada_total": "lightgray", "armada_operasional": "#1f77b4"},
-        height=400
-    )
-    st.plotly_chart(fig_bar, use_container_width=True)
-else:
-    st.info("Tidak ada data armada untuk wilayah yang dipilih.")
\ No newline at end of file
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Overload Sebelum (Ton/Hari)", f"{overload_before:,.1f}")
+        m2.metric("Overload Sesudah (Ton/Hari)", f"{overload_after:,.1f}")
+        m3.metric("Truk Dipindah", f"{int(moves['truk'].sum())}")
+
+        if moves.empty:
+            st.info("Tidak ada truk lebih yang bisa dipindahkan ke kecamatan overload.")
+        else:
+            st.dataframe(
+                moves, hide_index=True, use_container_width=True,
+                column_config={
+                    "dari": "Dari", "ke": "Ke", "truk": "Truk",
+                    "tambahan_kapasitas_ton": st.column_config.NumberColumn("Tambahan Kapasitas (Ton)", format="%.1f"),
+                }
+            )
+        st.caption("ℹ️ Donor hanya melepas truk selama rasio bebannya tetap ≤ 90% dan minimal 1 truk tersisa.")
+
+section_trend(city_id, start_date, end_date, kecamatan_key, show_forecast, forecast_days, data_version)
+section_anomalies(city_id, start_date, end_date, kecamatan_key, data_version)
+section_breakdown(city_id, start_date, end_date, kecamatan_key, data_version)
+section_map(city, start_date, end_date, kecamatan_key, data_version)
+section_fleet(city, start_date, end_date, kecamatan_key, forecast_days, data_version)
+
+if DEBUG_TIMINGS:
+    st.sidebar.caption(f"⏱️ Script penuh: {(time.perf_counter() - SCRIPT_START) * 1000:.0f} ms")
@@ -1,13 +1,30 @@
 # utils.py
-import streamlit as st
+import sys
 from sqlalchemy import create_engine
 import os
+from elt.query_profile import maybe_enable_query_profiling
+
+# Lokasi secrets.toml yang dibaca st.secrets (folder kerja, lalu home)
+SECRETS_PATHS = [os.path.join(".streamlit", "secrets.toml"), os.path.expanduser(os.path.join("~", ".streamlit", "secrets.toml"))]
+
+def _streamlit_secrets():
+    """
+    st.secrets jika berjalan di dalam app Streamlit atau ada file secrets.toml, selain itu None.
+    streamlit tidak diimpor di task Airflow / CLI / read API yang tidak memakainya (~0.4 s).
+    """
+    if "streamlit" not in sys.modules and not any(os.path.exists(p) for p in SECRETS_PATHS):
+        return None
+    import streamlit as st
+    return st.secrets
 
 def get_engine():
+    # Profil SQL opt-in (WASTE_SQL_PROFILE=1), lihat elt/query_profile.py
+    maybe_enable_query_profiling()
+
     # 1. Ambil dari Streamlit Secrets (Prioritas Utama untuk Cloud)
     try:
-        # Mengakses section [connections.postgresql] di secrets.toml
-        db_conf = st.secrets["connections"]["postgresql"]
+        # Mengakses section [connections.postgresql] di secrets.toml (None = tidak ada secrets -> fallback)
+        db_conf = _streamlit_secrets()["connections"]["postgresql"]
         
         # Susun Connection String
         db_url = f"postgresql+psycopg2://{db_conf['username']}:{db_conf['password']}@{db_conf['host']}:{db_conf['port']}/{db_conf['database']}"
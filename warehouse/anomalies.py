@@ -0,0 +1,218 @@
+import json
+import logging
+import os
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from utils import get_engine
+from warehouse.city import DEFAULT_CITY, get_city_id
+
+logger = logging.getLogger("waste_tracker")
+
+# --- KONFIGURASI DETEKTOR ---
+# Statistik EWMA disimpan per (kecamatan, hari dalam minggu), sehingga lonjakan Senin
+# yang normal tidak dianggap anomali. Setiap seri hari-X diperbarui sekali per minggu.
+ALPHA = 0.2              # bobot observasi baru (~5 minggu terakhir paling berpengaruh)
+Z_THRESHOLD = 3.0        # simpangan minimal (dalam std EWMA) agar ditandai
+RATIO_THRESHOLD = 1.4    # dan volume minimal 1.4x dari nilai harapan
+WARMUP = 4               # jumlah observasi minimal per hari sebelum boleh menandai
+OPEN_FROM = "1900-01-01"
+
+def _load_state(conn, city_id):
+    res = conn.execute(text("""
+        SELECT s.location_id, s.weekday, s.ewma_mean, s.ewma_var, s.n_obs, s.last_date
+        FROM warehouse.anomaly_state s
+        JOIN warehouse.dim_location l ON s.location_id = l.id
+        WHERE l.city_id = :city_id;
+    """), {"city_id": city_id})
+    return pd.DataFrame(res.fetchall(), columns=res.keys())
+
+def _load_new_days(conn, city_id):
+    """
+    Total harian satu kota yang lebih baru dari watermark state. Hanya hari setelah
+    watermark terkecil yang dibaca (filter di dim_time), bukan seluruh riwayat.
+    """
+    res = conn.execute(text("""
+        SELECT f.location_id, t.date, SUM(f.volume_kg) / 1000.0 AS volume
+        FROM warehouse.fact_waste f
+        JOIN warehouse.dim_time t ON f.time_id = t.id
+        WHERE f.city_id = :city_id AND t.date > COALESCE(
+            (SELECT MIN(w.last_date) FROM (
+                SELECT s.location_id, MAX(s.last_date) AS last_date
+                FROM warehouse.anomaly_state s
+                JOIN warehouse.dim_location l ON s.location_id = l.id
+                WHERE l.city_id = :city_id
+                GROUP BY s.location_id
+            ) w),
+            CAST(:open_from AS DATE))
+        GROUP BY f.location_id, t.date;
+    """), {"open_from": OPEN_FROM, "city_id": city_id})
+    return pd.DataFrame(res.fetchall(), columns=res.keys())
+
+def update_ewma(mean, var, n, x, alpha=ALPHA, z_threshold=Z_THRESHOLD, ratio_threshold=RATIO_THRESHOLD):
+    """
+    Satu langkah O(1) untuk vektor kecamatan pada satu hari.
+    x = NaN berarti tidak ada data (state tidak berubah).
+    Mengembalikan (mean, var, n, flagged, zscore) yang baru.
+    """
+    has_data = ~np.isnan(x)
+    std = np.sqrt(var)
+    # Batas bawah std agar seri yang sangat stabil tidak menghasilkan z tak hingga
+    scale = np.maximum(std, 0.05 * np.abs(mean) + 1e-9)
+    z = np.where(has_data, (x - mean) / scale, 0.0)
+    flagged = has_data & (n >= WARMUP) & (z > z_threshold) & (x >= ratio_threshold * mean)
+
+    # Nilai lonjakan dipotong sebelum masuk EWMA agar satu anomali tidak merusak baseline
+    x_upd = np.where(n >= WARMUP, np.minimum(x, mean + z_threshold * scale), x)
+    first = has_data & (n == 0)
+    diff = x_upd - mean
+    incr = alpha * diff
+    new_mean = np.where(first, x, np.where(has_data, mean + incr, mean))
+    new_var = np.where(first, 0.0, np.where(has_data, (1 - alpha) * (var + diff * incr), var))
+    new_n = n + has_data.astype(int)
+    return new_mean, new_var, new_n, flagged, z
+
+def load_anomalies(city=DEFAULT_CITY):
+    """
+    Memperbarui state EWMA dengan hari-hari baru di fact_waste satu kota dan menyimpan
+    hari yang ditandai ke warehouse.anomalies. Mengembalikan jumlah anomali baru.
+    """
+    engine = get_engine()
+    with engine.connect() as conn:
+        city_id = get_city_id(conn, city)
+        state = _load_state(conn, city_id)
+        new_days = _load_new_days(conn, city_id)
+
+    if new_days.empty:
+        return 0
+
+    new_days["volume"] = pd.to_numeric(new_days["volume"], errors="coerce")
+    new_days["date"] = pd.to_datetime(new_days["date"])
+
+    # Buang hari yang sudah diproses untuk kecamatan tsb (watermark per kecamatan)
+    if not state.empty:
+        watermark = pd.to_datetime(state.groupby("location_id")["last_date"].max())
+        last = new_days["location_id"].map(watermark)
+        new_days = new_days[last.isna() | (new_days["date"] > last)]
+        if new_days.empty:
+            return 0
+
+    matrix = new_days.pivot_table(index="location_id", columns="date", values="volume", aggfunc="sum").sort_index(axis=1)
+    locations = matrix.index.to_numpy()
+
+    # State sebagai array (kecamatan x 7 hari)
+    mean = np.zeros((len(locations), 7))
+    var = np.zeros((len(locations), 7))
+    n = np.zeros((len(locations), 7), dtype=int)
+    last_date = np.full((len(locations), 7), None, dtype=object)
+    if not state.empty:
+        pos = pd.Series(np.arange(len(locations)), index=locations)
+        known = state[state["location_id"].isin(locations)]
+        rows = pos[known["location_id"]].to_numpy()
+        cols = known["weekday"].to_numpy().astype(int)
+        mean[rows, cols] = known["ewma_mean"].astype(float)
+        var[rows, cols] = known["ewma_var"].astype(float)
+        n[rows, cols] = known["n_obs"].astype(int)
+        last_date[rows, cols] = known["last_date"].to_numpy()
+
+    flagged_rows = []
+    for day in matrix.columns:
+        w = day.dayofweek
+        x = matrix[day].to_numpy(dtype=float)
+        expected = mean[:, w].copy()
+        mean[:, w], var[:, w], n[:, w], flagged, z = update_ewma(mean[:, w], var[:, w], n[:, w], x)
+        last_date[~np.isnan(x), w] = day.date()
+        for i in np.flatnonzero(flagged):
+            flagged_rows.append({
+                "location_id": int(locations[i]),
+                "date": day.date(),
+                "volume_ton": round(float(x[i]), 2),
+                "expected_ton": round(float(expected[i]), 2),
+                "zscore": round(float(z[i]), 2),
+                "ratio": round(float(x[i] / expected[i]), 2) if expected[i] > 0 else None,
+            })
+
+    rows_i, cols_w = np.nonzero(n > 0)
+    state_rows = [{
+        "location_id": int(locations[i]),
+        "weekday": int(w),
+        "ewma_mean": float(mean[i, w]),
+        "ewma_var": float(var[i, w]),
+        "n_obs": int(n[i, w]),
+        "last_date": last_date[i, w],
+    } for i, w in zip(rows_i, cols_w)]
+
+    q_state = """
+    INSERT INTO warehouse.anomaly_state (location_id, weekday, ewma_mean, ewma_var, n_obs, last_date)
+    VALUES (:location_id, :weekday, :ewma_mean, :ewma_var, :n_obs, :last_date)
+    ON CONFLICT (location_id, weekday) DO UPDATE
+    SET ewma_mean = EXCLUDED.ewma_mean,
+        ewma_var = EXCLUDED.ewma_var,
+        n_obs = EXCLUDED.n_obs,
+        last_date = EXCLUDED.last_date;
+    """
+    q_anomaly = """
+    INSERT INTO warehouse.anomalies (location_id, date, volume_ton, expected_ton, zscore, ratio)
+    VALUES (:location_id, :date, :volume_ton, :expected_ton, :zscore, :ratio)
+    ON CONFLICT (location_id, date) DO NOTHING;
+    """
+    with engine.begin() as conn:
+        conn.execute(text(q_state), state_rows)
+        if flagged_rows:
+            conn.execute(text(q_anomaly), flagged_rows)
+    return len(flagged_rows)
+
+def raise_anomaly_alerts(city=None):
+    """
+    Mengirim alert untuk anomali yang belum pernah dialertkan (satu kota, atau semua
+    jika city None): selalu ke log, dan ke webhook (POST JSON) jika WASTE_ALERT_WEBHOOK
+    di-set. Webhook yang gagal (down, timeout, HTTP error) tidak menggagalkan load: dicatat
+    di log, alerted_at tetap NULL, dan alert dikirim ulang di run berikutnya.
+    Mengembalikan jumlah alert yang terkirim.
+    """
+    engine = get_engine()
+    q = """
+    SELECT a.location_id, ci.code AS city, l.kecamatan, a.date, a.volume_ton, a.expected_ton, a.ratio
+    FROM warehouse.anomalies a
+    JOIN warehouse.dim_location l ON a.location_id = l.id
+    JOIN warehouse.dim_city ci ON l.city_id = ci.id
+    WHERE a.alerted_at IS NULL AND (CAST(:city AS TEXT) IS NULL OR ci.code = :city)
+    ORDER BY a.date, ci.code, l.kecamatan;
+    """
+    with engine.connect() as conn:
+        rows = conn.execute(text(q), {"city": city}).mappings().all()
+
+    if not rows:
+        return 0
+
+    for r in rows:
+        logger.warning(
+            "🚨 Lonjakan sampah %s (%s) pada %s: %.1f ton (normal ~%.1f ton, %.1fx)",
+            r["kecamatan"], r["city"], r["date"], r["volume_ton"], r["expected_ton"], r["ratio"] or 0,
+        )
+
+    webhook = os.environ.get("WASTE_ALERT_WEBHOOK")
+    if webhook:
+        payload = json.dumps({"anomalies": [
+            {**r, "date": r["date"].isoformat(), "volume_ton": float(r["volume_ton"]),
+             "expected_ton": float(r["expected_ton"]), "ratio": float(r["ratio"] or 0)}
+            for r in map(dict, rows)
+        ]}).encode("utf-8")
+        req = urllib.request.Request(webhook, data=payload, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=10):
+                pass
+        except (urllib.error.URLError, OSError) as e:
+            # HTTPError & URLError turunan OSError; timeout / koneksi putus saat membaca juga OSError
+            logger.error("❌ Webhook alert gagal (%d anomali akan dikirim ulang run berikutnya): %s", len(rows), e)
+            return 0
+
+    with engine.begin() as conn:
+        conn.execute(
+            text("UPDATE warehouse.anomalies SET alerted_at = now() WHERE location_id = :location_id AND date = :date;"),
+            [{"location_id": r["location_id"], "date": r["date"]} for r in rows],
+        )
+    return len(rows)
@@ -0,0 +1,254 @@
+# warehouse/backfill.py
+"""
+Backfill paralel & idempoten untuk rentang tanggal (satu kota).
+
+load_fact_waste selalu membangun ulang seluruh partisi kota; untuk koreksi data satu bulan
+itu berarti reload penuh. Di sini rentang [start, end] dipecah menjadi chunk beberapa hari
+yang diproses paralel oleh beberapa worker (masing-masing satu koneksi, sehingga jumlah
+koneksi DB dibatasi oleh --workers). Tiap chunk dijalankan dalam SATU transaksi:
+
+  1. hapus baris fakta kota tsb pada hari-hari chunk
+  2. isi ulang dari staging.view_waste_clean (hari yang sama)
+  3. hitung ulang baris harian kubus cube_waste untuk hari-hari tsb
+  4. tandai chunk 'done' di warehouse.backfill_progress
+
+Jika worker gagal atau proses mati di tengah jalan, transaksi chunk di-rollback dan
+chunk tsb dijalankan lagi saat perintah yang sama diulang (chunk 'done' dilewati).
+Setelah semua chunk selesai, baris bulanan kubus untuk bulan di rentang tsb dihitung dari
+baris hariannya, lalu prakiraan & risiko kapasitas kota tsb dibangun ulang. State anomali
+(EWMA berurutan) tidak diputar ulang.
+
+Staging harus sudah berisi data koreksi (task process_waste_data_<kota> di DAG).
+
+Cara pakai:
+    python warehouse/backfill.py --city jakarta --start 2024-02-01 --end 2024-02-29
+    python warehouse/backfill.py --start 2024-02-01 --end 2024-02-29 --chunk-days 3 --workers 8
+    python warehouse/backfill.py --start 2024-02-01 --end 2024-02-29 --status
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils import get_engine
+from warehouse.city import (DEFAULT_CITY, ensure_month_partitions, get_city_id, lock_city_partition, lock_fact_ddl,
+                            next_month)
+from warehouse.cube import PERIOD, Q_CUBE, rollup_cube_months
+from warehouse.retention import get_detail_from
+
+logger = logging.getLogger("waste_tracker")
+
+DEFAULT_CHUNK_DAYS = 7
+DEFAULT_WORKERS = 4
+
+Q_DELETE_FACTS = """
+DELETE FROM warehouse.fact_waste f
+USING warehouse.dim_time t
+WHERE f.time_id = t.id AND f.city_id = :city_id AND t.date >= :start AND t.date <= :end;
+"""
+
+Q_DELETE_CUBE_DAYS = """
+DELETE FROM warehouse.cube_waste
+WHERE city_id = :city_id AND grain = 'day' AND period_start >= :start AND period_start <= :end;
+"""
+
+Q_PROGRESS_INIT = """
+INSERT INTO warehouse.backfill_progress (backfill_id, city, chunk_start, chunk_end)
+VALUES (:backfill_id, :city, :chunk_start, :chunk_end)
+ON CONFLICT (backfill_id, chunk_start) DO NOTHING;
+"""
+
+Q_PROGRESS_CLAIM = """
+UPDATE warehouse.backfill_progress
+SET status = 'running', attempts = attempts + 1, started_at = now(), finished_at = NULL, error = NULL
+WHERE backfill_id = :backfill_id AND chunk_start = :chunk_start;
+"""
+
+Q_PROGRESS_DONE = """
+UPDATE warehouse.backfill_progress
+SET status = 'done', fact_rows = :fact_rows, finished_at = now()
+WHERE backfill_id = :backfill_id AND chunk_start = :chunk_start;
+"""
+
+Q_PROGRESS_FAILED = """
+UPDATE warehouse.backfill_progress
+SET status = 'failed', error = :error, finished_at = now()
+WHERE backfill_id = :backfill_id AND chunk_start = :chunk_start;
+"""
+
+def make_chunks(start, end, chunk_days=DEFAULT_CHUNK_DAYS):
+    """[(chunk_start, chunk_end)] inklusif yang menutup [start, end]."""
+    if start > end:
+        raise ValueError("start harus <= end")
+    chunks = []
+    day = start
+    while day <= end:
+        last = min(day + timedelta(days=chunk_days - 1), end)
+        chunks.append((day, last))
+        day = last + timedelta(days=1)
+    return chunks
+
+def make_backfill_id(city, start, end, chunk_days):
+    """Id deterministik: perintah yang sama = backfill yang sama (bisa dilanjutkan)."""
+    return hashlib.sha1(f"{city}|{start}|{end}|{chunk_days}".encode()).hexdigest()[:16]
+
+def _prepare(engine, city):
+    """Dimensi untuk seluruh staging kota (sekali, sebelum chunk paralel)."""
+    from warehouse.dim_fleet import load_dim_fleet
+    from warehouse.dim_location import load_dim_location
+    from warehouse.dim_time import load_dim_time
+    from warehouse.fact_waste import load_dim_category_source
+
+    load_dim_time(city)
+    load_dim_location(city)
+    load_dim_fleet(city=city)
+    with engine.begin() as conn:
+        lock_fact_ddl(conn)
+        load_dim_category_source(conn, where="AND s.city = :city", params={"city": city})
+        ensure_month_partitions(conn, city)
+        return get_city_id(conn, city)
+
+def backfill_chunk(engine, backfill_id, city, city_id, chunk_start, chunk_end):
+    """Mengganti fakta & baris harian kubus satu chunk (satu transaksi). Mengembalikan jumlah baris fakta."""
+    from warehouse.fact_waste import Q_FACT
+
+    params = {"city": city, "city_id": city_id, "start": chunk_start, "end": chunk_end}
+    with engine.begin() as conn:
+        conn.execute(text(Q_PROGRESS_CLAIM), {"backfill_id": backfill_id, "chunk_start": chunk_start})
+
+    try:
+        with engine.begin() as conn:
+            lock_city_partition(conn, city_id)
+            conn.execute(text(Q_DELETE_FACTS), params)
+            n_rows = conn.execute(text(Q_FACT.format(
+                source="staging.view_waste_clean",
+                where="AND s.city = :city AND s.tanggal >= :start AND s.tanggal <= :end",
+            )), params).rowcount
+            conn.execute(text(Q_DELETE_CUBE_DAYS), params)
+            conn.execute(text(Q_CUBE.format(
+                grain="day", period=PERIOD["day"], source="warehouse.fact_waste",
+                where="AND f.city_id = :city_id AND t.date >= :start AND t.date <= :end",
+            )), params)
+            conn.execute(text(Q_PROGRESS_DONE),
+                         {"backfill_id": backfill_id, "chunk_start": chunk_start, "fact_rows": n_rows})
+        return n_rows
+    except Exception as e:
+        with engine.begin() as conn:
+            conn.execute(text(Q_PROGRESS_FAILED),
+                         {"backfill_id": backfill_id, "chunk_start": chunk_start, "error": str(e).splitlines()[0][:500]})
+        raise
+
+def run_backfill(start, end, city=DEFAULT_CITY, chunk_days=DEFAULT_CHUNK_DAYS, workers=DEFAULT_WORKERS,
+                 force=False, engine=None):
+    """
+    Backfill [start, end] untuk satu kota. Chunk yang sudah 'done' di run sebelumnya dengan
+    parameter yang sama dilewati (force=True: semua chunk diulang).
+    Mengembalikan dict ringkasan (backfill_id, chunks, skipped, failed, fact_rows).
+    """
+    from warehouse.capacity_risk import load_capacity_risk
+    from warehouse.forecast import load_forecast_daily
+
+    engine = engine or get_engine()
+    chunks = make_chunks(start, end, chunk_days)
+    backfill_id = make_backfill_id(city, start, end, chunk_days)
+
+    with engine.connect() as conn:
+        detail_from = get_detail_from(conn, get_city_id(conn, city))
+    if detail_from is not None and start < detail_from:
+        raise ValueError(f"{city} sebelum {detail_from} sudah dipadatkan retensi; backfill hanya untuk tier detail")
+
+    with engine.begin() as conn:
+        conn.execute(text(Q_PROGRESS_INIT), [
+            {"backfill_id": backfill_id, "city": city, "chunk_start": s, "chunk_end": e} for s, e in chunks
+        ])
+        if force:
+            conn.execute(text("UPDATE warehouse.backfill_progress SET status = 'pending' WHERE backfill_id = :id;"),
+                         {"id": backfill_id})
+        done = {r.chunk_start for r in conn.execute(text("""
+        SELECT chunk_start FROM warehouse.backfill_progress WHERE backfill_id = :id AND status = 'done';
+        """), {"id": backfill_id})}
+
+    todo = [(s, e) for s, e in chunks if s not in done]
+    logger.info("Backfill %s (%s, %s..%s): %d chunk, %d sudah selesai",
+                backfill_id, city, start, end, len(chunks), len(done))
+    city_id = _prepare(engine, city)
+
+    def work(chunk):
+        try:
+            return backfill_chunk(engine, backfill_id, city, city_id, *chunk)
+        except Exception as e:
+            logger.error("Chunk %s..%s gagal: %s", chunk[0], chunk[1], str(e).splitlines()[0])
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(todo) or 1))) as pool:
+        results = list(pool.map(work, todo))
+    failed = [chunk for chunk, n in zip(todo, results) if n is None]
+
+    # Baris bulanan untuk semua bulan di rentang dihitung dari baris harian (murah, dan tetap
+    # benar jika run sebelumnya mati setelah chunk terakhir selesai)
+    months, month = [], start.replace(day=1)
+    while month <= end:
+        months.append(month)
+        month = next_month(month)
+    with engine.begin() as conn:
+        rollup_cube_months(conn, city_id, months)
+    load_forecast_daily(city=city)
+    load_capacity_risk(city)
+
+    return {
+        "backfill_id": backfill_id,
+        "chunks": len(chunks),
+        "skipped": len(done),
+        "failed": failed,
+        "fact_rows": sum(n for n in results if n is not None),
+    }
+
+def backfill_status(conn, backfill_id):
+    """[(chunk_start, chunk_end, status, attempts, fact_rows, error)] urut tanggal."""
+    return conn.execute(text("""
+    SELECT chunk_start, chunk_end, status, attempts, fact_rows, error
+    FROM warehouse.backfill_progress WHERE backfill_id = :id ORDER BY chunk_start;
+    """), {"id": backfill_id}).all()
+
+if __name__ == "__main__":
+    from warehouse.etl_runs import record_etl_run
+    from warehouse.result_cache import prewarm_result_cache
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Backfill fact_waste & kubus per rentang tanggal")
+    parser.add_argument("--city", default=DEFAULT_CITY)
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="YYYY-MM-DD")
+    parser.add_argument("--end", type=date.fromisoformat, required=True, help="YYYY-MM-DD (inklusif)")
+    parser.add_argument("--chunk-days", type=int, default=DEFAULT_CHUNK_DAYS)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Worker paralel (= koneksi DB)")
+    parser.add_argument("--force", action="store_true", help="Ulangi juga chunk yang sudah selesai")
+    parser.add_argument("--status", action="store_true", help="Hanya tampilkan progres backfill ini")
+    args = parser.parse_args()
+
+    if args.status:
+        with get_engine().connect() as conn:
+            rows = backfill_status(conn, make_backfill_id(args.city, args.start, args.end, args.chunk_days))
+        if not rows:
+            print("Belum ada progres untuk backfill ini.")
+        for r in rows:
+            print(f"{r.chunk_start}..{r.chunk_end}  {r.status:<8} percobaan={r.attempts} "
+                  f"baris={r.fact_rows if r.fact_rows is not None else '-'} {r.error or ''}")
+        sys.exit(0)
+
+    summary = run_backfill(args.start, args.end, args.city, args.chunk_days, args.workers, args.force)
+    print(f"🧱 Backfill {summary['backfill_id']}: {summary['chunks'] - summary['skipped']} chunk diproses "
+          f"({summary['skipped']} dilewati), {summary['fact_rows']} baris fakta")
+    if summary["failed"]:
+        print(f"❌ {len(summary['failed'])} chunk gagal, jalankan ulang perintah yang sama untuk melanjutkan.")
+        sys.exit(1)
+    if summary["skipped"] == summary["chunks"]:
+        sys.exit(0)  # tidak ada yang berubah: versi data & cache tetap
+    version = record_etl_run(city=args.city)
+    _, n_queries = prewarm_result_cache(city=args.city)
+    print(f"✅ Versi data {version}" + (f", cache dashboard diisi ulang ({n_queries} query)." if n_queries else "."))
@@ -0,0 +1,172 @@
+# warehouse/capacity_risk.py
+"""
+Risiko overload kapasitas angkut per kecamatan (simulasi Monte Carlo).
+
+Status SAFE/WARNING/CRITICAL (warehouse/fleet_metrics.py) membandingkan satu rata-rata volume
+dengan satu angka kapasitas, sehingga kecamatan yang rata-ratanya aman tetapi sering melonjak
+(atau armadanya sering tidak jalan) tetap terlihat SAFE. Modul ini mensimulasikan N_SCENARIOS
+hari per kecamatan:
+
+  - volume  : hari historis (HISTORY_DAYS terakhir fact_waste) di-resample dengan indeks hari
+              yang sama untuk semua kecamatan, jadi lonjakan se-kota tetap terjadi serempak
+  - armada  : tiap truk dari versi dim_fleet yang berlaku jalan dengan peluang
+              armada_operasional / armada_total -> Binomial(armada_total, p) truk,
+              kapasitas = truk x ritase x m3 x DENSITY
+
+Semua perhitungan berupa matriks (skenario x kecamatan) NumPy. Kecamatan dipecah per
+DISTRICTS_PER_CHUNK (batas tetap, seed per blok dari SeedSequence), sehingga kota besar bisa
+dihitung di beberapa proses dengan hasil yang sama berapa pun jumlah worker-nya.
+
+Hasil (p_overload, p_critical, kekurangan rata-rata, P95 volume, P5 kapasitas) disimpan di
+warehouse.capacity_risk dan ditampilkan di seksi armada dashboard.
+
+Cara pakai:
+    python warehouse/capacity_risk.py --city jakarta --scenarios 20000
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils import get_engine
+from warehouse.city import DEFAULT_CITY, get_city_id
+from warehouse.dim_fleet import OPEN_TO
+from warehouse.fleet_metrics import DENSITY
+from warehouse.frames import fetch_frame
+
+# --- KONFIGURASI SIMULASI ---
+HISTORY_DAYS = 84          # 12 minggu terakhir sebagai distribusi volume (sama dengan prakiraan)
+N_SCENARIOS = 10000        # hari simulasi per kecamatan
+DISTRICTS_PER_CHUNK = 250  # blok kecamatan per proses (~20 MB per matriks skenario x kecamatan)
+CRITICAL_RATIO = 1.10      # beban > 110% kapasitas = CRITICAL (fleet_metrics.compute_fleet_status)
+SEED = 2024
+
+Q_HISTORY = """
+SELECT f.location_id, t.date, SUM(f.volume_kg) / 1000.0 AS volume
+FROM warehouse.fact_waste f
+JOIN warehouse.dim_time t ON f.time_id = t.id
+WHERE f.city_id = :city_id AND t.date > (
+    SELECT MAX(t2.date) FROM warehouse.fact_waste f2 JOIN warehouse.dim_time t2 ON f2.time_id = t2.id
+    WHERE f2.city_id = :city_id
+) - :history_days
+GROUP BY f.location_id, t.date;
+"""
+
+# Versi armada yang sedang berlaku per kecamatan
+Q_FLEET_CURRENT = """
+SELECT l.id AS location_id, fl.id AS fleet_id,
+       fl.armada_total, fl.armada_operasional, fl.ritase_harian, fl.kapasitas_m3
+FROM warehouse.dim_location l
+JOIN warehouse.dim_fleet fl ON fl.city_id = l.city_id AND fl.kecamatan = l.kecamatan AND fl.valid_to = :open_to
+WHERE l.city_id = :city_id;
+"""
+
+RISK_COLUMNS = ['p_overload', 'p_critical', 'expected_shortfall_ton', 'volume_p95_ton', 'capacity_p05_ton']
+
+def _simulate_chunk(args):
+    """Simulasi satu blok kecamatan (dipanggil langsung atau di proses lain)."""
+    Y, day_index, armada_total, p_available, truck_capacity, seed = args
+    rng = np.random.default_rng(seed)
+
+    volume = Y[:, day_index].T                                          # (skenario x kecamatan)
+    trucks = rng.binomial(armada_total, p_available, size=volume.shape)
+    capacity = trucks * truck_capacity
+    return np.vstack([
+        (volume > capacity).mean(axis=0),
+        (volume > CRITICAL_RATIO * capacity).mean(axis=0),
+        np.clip(volume - capacity, 0, None).mean(axis=0),
+        np.percentile(volume, 95, axis=0),
+        np.percentile(capacity, 5, axis=0),
+    ]).T
+
+def simulate_capacity_risk(Y, armada_total, armada_operasional, truck_capacity,
+                           n_scenarios=N_SCENARIOS, seed=SEED, workers=None):
+    """
+    Y = matriks volume harian historis (kecamatan x hari, ton; NaN = hari tanpa data),
+    parameter armada per kecamatan. Mengembalikan array (kecamatan x RISK_COLUMNS).
+    """
+    Y = np.asarray(Y, dtype=float)
+    # Hari tanpa data diisi rata-rata kecamatan tsb (bukan 0, yang akan meremehkan risiko)
+    Y = np.where(np.isnan(Y), np.nan_to_num(np.nanmean(Y, axis=1, keepdims=True)), Y)
+    armada_total = np.asarray(armada_total, dtype=np.int64)
+    with np.errstate(all="ignore"):
+        p_available = np.clip(np.nan_to_num(np.asarray(armada_operasional) / armada_total, nan=0.0), 0, 1)
+
+    day_seed, *chunk_seeds = np.random.SeedSequence(seed).spawn(1 + int(np.ceil(len(Y) / DISTRICTS_PER_CHUNK)))
+    day_index = np.random.default_rng(day_seed).integers(0, Y.shape[1], size=n_scenarios)
+
+    chunks = [
+        (Y[s], day_index, armada_total[s], p_available[s], np.asarray(truck_capacity, dtype=float)[s], chunk_seed)
+        for chunk_seed, s in zip(chunk_seeds, (slice(i, i + DISTRICTS_PER_CHUNK)
+                                               for i in range(0, len(Y), DISTRICTS_PER_CHUNK)))
+    ]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(chunks) <= 1:
+        return np.vstack([_simulate_chunk(c) for c in chunks])
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        return np.vstack(list(pool.map(_simulate_chunk, chunks)))
+
+def load_capacity_risk(city=DEFAULT_CITY, n_scenarios=N_SCENARIOS, history_days=HISTORY_DAYS, workers=None, seed=SEED):
+    """
+    Membangun ulang warehouse.capacity_risk satu kota dari HISTORY_DAYS hari terakhir
+    fact_waste dan versi dim_fleet yang berlaku. Dijalankan setelah load_fact_waste.
+    Mengembalikan jumlah kecamatan yang disimulasikan.
+    """
+    engine = get_engine()
+    with engine.connect() as conn:
+        city_id = get_city_id(conn, city)
+        df = fetch_frame(conn, Q_HISTORY, {"history_days": history_days, "city_id": city_id},
+                         dtypes={"location_id": "int", "date": "date", "volume": "float"})
+        df_fleet = fetch_frame(conn, Q_FLEET_CURRENT, {"open_to": OPEN_TO, "city_id": city_id}, dtypes={
+            "location_id": "int", "fleet_id": "int", "armada_total": "float", "armada_operasional": "float",
+            "ritase_harian": "float", "kapasitas_m3": "float",
+        })
+
+    if df.empty or df_fleet.empty:
+        return 0
+
+    dates = pd.date_range(df["date"].min(), df["date"].max(), freq="D")
+    matrix = df.pivot_table(index="location_id", columns="date", values="volume", aggfunc="sum").reindex(columns=dates)
+    # Hanya kecamatan yang punya riwayat volume dan armada
+    df_fleet = df_fleet.set_index("location_id").reindex(matrix.index).dropna(subset=["fleet_id"])
+    matrix = matrix.loc[df_fleet.index]
+    df_fleet = df_fleet.fillna(0)
+
+    risk = simulate_capacity_risk(
+        matrix.to_numpy(), df_fleet["armada_total"], df_fleet["armada_operasional"],
+        df_fleet["ritase_harian"] * df_fleet["kapasitas_m3"] * DENSITY,
+        n_scenarios=n_scenarios, seed=seed, workers=workers,
+    )
+
+    out = pd.DataFrame(risk, columns=RISK_COLUMNS)
+    out[RISK_COLUMNS[2:]] = out[RISK_COLUMNS[2:]].round(2)
+    out.insert(0, "location_id", df_fleet.index.to_numpy())
+    out.insert(1, "fleet_id", df_fleet["fleet_id"].astype(int).to_numpy())
+    out.insert(2, "n_scenarios", n_scenarios)
+    out.insert(3, "history_days", len(dates))
+
+    with engine.begin() as conn:
+        conn.execute(text("""
+        DELETE FROM warehouse.capacity_risk
+        WHERE location_id IN (SELECT id FROM warehouse.dim_location WHERE city_id = :city_id);
+        """), {"city_id": city_id})
+        out.to_sql("capacity_risk", conn, schema="warehouse", if_exists="append", index=False, method="multi")
+    return len(out)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulasi Monte Carlo risiko overload armada per kecamatan")
+    parser.add_argument("--city", default=DEFAULT_CITY)
+    parser.add_argument("--scenarios", type=int, default=N_SCENARIOS)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    t = time.perf_counter()
+    n_districts = load_capacity_risk(args.city, n_scenarios=args.scenarios, workers=args.workers)
+    print(f"🎲 Risiko kapasitas {args.city}: {n_districts} kecamatan x {args.scenarios} skenario "
+          f"({time.perf_counter() - t:.2f} s)")
@@ -0,0 +1,206 @@
+# warehouse/city.py
+"""
+Daftar kota (kabupaten/kota) yang dilayani warehouse.
+
+Konfigurasi dibaca dari data/cities.json; jika file tidak ada, hanya DEFAULT_CITY (Jakarta,
+data langsung di folder data/) yang dipakai. Tiap kota punya folder data sendiri
+(waste.csv, sipsn.csv, kecamatan.geojson) dan partisi fact_waste sendiri
+(warehouse.fact_waste_<code>, LIST partition berdasarkan city_id), sehingga pipeline
+antar kota bisa berjalan paralel tanpa saling mengunci. Partisi kota dipecah lagi per bulan
+(warehouse.fact_waste_<code>_<yyyymm>, RANGE time_id) agar retensi bisa melepas detail lama
+per bulan (warehouse/retention.py).
+
+Contoh data/cities.json:
+    [{"code": "jakarta", "name": "DKI Jakarta", "data_dir": ".",
+      "center_lat": -6.22, "center_lon": 106.83, "zoom": 9.8},
+     {"code": "bandung", "name": "Kota Bandung", "data_dir": "bandung",
+      "center_lat": -6.91, "center_lon": 107.61, "zoom": 11,
+      "retention_days": 730, "rollup_grain": "week"}]        # opsional, warehouse/retention.py
+"""
+import json
+import os
+import re
+from datetime import timedelta
+
+from sqlalchemy import text
+
+CONFIG_NAME = "cities.json"
+DEFAULT_CITY = "jakarta"
+DEFAULT_CITIES = [{
+    "code": DEFAULT_CITY, "name": "DKI Jakarta", "data_dir": ".",
+    "center_lat": -6.22, "center_lon": 106.83, "zoom": 9.8,
+}]
+CODE_PATTERN = re.compile(r"^[a-z][a-z0-9_]{0,31}$")  # dipakai sebagai nama partisi
+# Kunci advisory partisi fakta per kota: pg_advisory_xact_lock(PARTITION_LOCK, city_id)
+PARTITION_LOCK = 7301
+# Kunci advisory global untuk DDL pohon partisi fakta (publish, retensi, partisi bulan baru)
+FACT_DDL_LOCK = 7304
+
+def _data_root(data_root=None):
+    from warehouse.geo import find_data_dir
+    return data_root or find_data_dir()
+
+def load_city_config(data_root=None):
+    """Daftar kota dari data/cities.json (atau DEFAULT_CITIES). Melempar ValueError untuk kode tidak valid."""
+    path = os.path.join(_data_root(data_root), CONFIG_NAME)
+    cities = DEFAULT_CITIES
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            cities = json.load(f)
+    for city in cities:
+        if not CODE_PATTERN.match(city["code"]):
+            raise ValueError(f"Kode kota tidak valid: {city['code']!r} (huruf kecil, angka, _)")
+    return cities
+
+def get_city(code, data_root=None):
+    for city in load_city_config(data_root):
+        if city["code"] == code:
+            return city
+    raise KeyError(f"Kota {code!r} tidak ada di {CONFIG_NAME}")
+
+def city_data_dir(code, data_root=None):
+    """Folder data kota (waste.csv, sipsn.csv, kecamatan.geojson)."""
+    return os.path.normpath(os.path.join(_data_root(data_root), get_city(code, data_root).get("data_dir", code)))
+
+def partition_name(code):
+    return f"fact_waste_{code}"
+
+def month_partition_name(code, month):
+    return f"fact_waste_{code}_{month:%Y%m}"
+
+def next_month(month):
+    """Tanggal 1 bulan berikutnya (month = tanggal 1 suatu bulan)."""
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _month_time_id(month):
+    """Batas RANGE sub-partisi: smart key dim_time (yyyymmdd) tanggal 1 bulan tsb."""
+    return month.year * 10000 + month.month * 100 + 1
+
+# Bulan di dim_time yang belum punya sub-partisi untuk kota tsb (di skema :schema). Bulan sebelum
+# batas retensi (fact_retention.detail_from) dilewati: datanya sudah ada di tier rollup.
+Q_MISSING_MONTHS = """
+SELECT ci.code, m.month
+FROM warehouse.dim_city ci
+CROSS JOIN (SELECT DISTINCT CAST(date_trunc('month', date) AS DATE) AS month FROM warehouse.dim_time) m
+LEFT JOIN warehouse.fact_retention r ON r.city_id = ci.id
+WHERE (CAST(:code AS TEXT) IS NULL OR ci.code = :code)
+  AND m.month >= COALESCE(r.detail_from, DATE '-infinity')
+  AND to_regclass(format('%s.fact_waste_%s_%s', :schema, ci.code, to_char(m.month, 'YYYYMM'))) IS NULL
+ORDER BY ci.code, m.month;
+"""
+
+# Sama, tetapi hanya untuk pasangan (kota, tanggal) satu batch stream (kota belum terdaftar dilewati)
+Q_MISSING_BATCH_MONTHS = """
+SELECT ci.code, m.month
+FROM (
+    SELECT DISTINCT b.code, CAST(date_trunc('month', b.date) AS DATE) AS month
+    FROM unnest(CAST(:codes AS TEXT[]), CAST(:dates AS DATE[])) AS b(code, date)
+) m
+JOIN warehouse.dim_city ci ON ci.code = m.code
+LEFT JOIN warehouse.fact_retention r ON r.city_id = ci.id
+WHERE m.month >= COALESCE(r.detail_from, DATE '-infinity')
+  AND to_regclass(format('warehouse.fact_waste_%s_%s', ci.code, to_char(m.month, 'YYYYMM'))) IS NULL
+ORDER BY ci.code, m.month;
+"""
+
+def ensure_month_partitions(conn, code=None, schema="warehouse"):
+    """
+    Membuat sub-partisi bulan fact_waste untuk semua bulan di dim_time (satu kota, atau semua
+    kota jika code None). Dipanggil setelah dim_time terisi dan sebelum insert fakta.
+    schema: skema partisi kota (warehouse, atau skema shadow saat publish, warehouse/publish.py).
+    Mengembalikan jumlah partisi baru.
+    """
+    missing = conn.execute(text(Q_MISSING_MONTHS), {"code": code, "schema": schema}).all()
+    _create_month_partitions(conn, missing, schema)
+    return len(missing)
+
+def _create_month_partitions(conn, missing, schema="warehouse"):
+    for city_code, month in missing:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {schema}.{month_partition_name(city_code, month)} "
+            f"PARTITION OF {schema}.{partition_name(city_code)} "
+            f"FOR VALUES FROM ({_month_time_id(month)}) TO ({_month_time_id(next_month(month))});"
+        ))
+
+def missing_batch_months(conn, codes, dates):
+    """Pasangan (kota, bulan) dari list kota & tanggal (sejajar) yang sub-partisinya belum ada."""
+    return conn.execute(text(Q_MISSING_BATCH_MONTHS), {"codes": list(codes), "dates": list(dates)}).all()
+
+def ensure_batch_month_partitions(engine, codes, dates):
+    """
+    Membuat sub-partisi bulan yang dibutuhkan satu batch stream, sebelum transaksi batch.
+    Dicek dulu tanpa kunci (biasanya semua sudah ada, tanpa DDL); jika ada yang kurang, dibuat
+    di transaksi pendek sendiri dengan lock_fact_ddl sebagai statement pertama, hanya untuk
+    kota & bulan batch tsb. Mengembalikan jumlah partisi baru.
+    """
+    codes, dates = list(codes), list(dates)
+    with engine.connect() as conn:
+        if not missing_batch_months(conn, codes, dates):
+            return 0
+    with engine.begin() as conn:
+        lock_fact_ddl(conn)
+        missing = missing_batch_months(conn, codes, dates)
+        _create_month_partitions(conn, missing)
+        return len(missing)
+
+def register_cities(conn, cities=None):
+    """
+    Upsert dim_city dan buat partisi fact_waste (beserta sub-partisi bulan yang sudah ada di
+    dim_time) untuk tiap kota (idempoten).
+    Dijalankan sekali setelah setup_elt_database, sebelum pipeline per kota.
+    Mengembalikan {code: city_id}.
+    """
+    cities = cities or load_city_config()
+    ids = {}
+    for city in cities:
+        params = {
+            "code": city["code"], "name": city.get("name", city["code"]),
+            "center_lat": city.get("center_lat"), "center_lon": city.get("center_lon"), "zoom": city.get("zoom"),
+        }
+        # NOT EXISTS dulu (bukan hanya ON CONFLICT) agar sequence SMALLINT tidak terbuang tiap setup
+        conn.execute(text("""
+        INSERT INTO warehouse.dim_city (code)
+        SELECT :code WHERE NOT EXISTS (SELECT 1 FROM warehouse.dim_city WHERE code = :code)
+        ON CONFLICT (code) DO NOTHING;
+        """), params)
+        city_id = conn.execute(text("""
+        UPDATE warehouse.dim_city
+        SET name = :name, center_lat = :center_lat, center_lon = :center_lon, zoom = :zoom
+        WHERE code = :code
+        RETURNING id;
+        """), params).scalar()
+        # Kode sudah divalidasi CODE_PATTERN, id dari database: aman sebagai identifier/literal
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS warehouse.{partition_name(city['code'])} "
+            f"PARTITION OF warehouse.fact_waste FOR VALUES IN ({int(city_id)}) PARTITION BY RANGE (time_id);"
+        ))
+        ids[city["code"]] = city_id
+    ensure_month_partitions(conn)
+    return ids
+
+def lock_city_partition(conn, city_id, exclusive=False):
+    """
+    Kunci advisory (sampai transaksi selesai) untuk partisi fakta satu kota. Penulis baris fakta
+    (batch stream, chunk backfill, retensi) memegang versi shared; publish partisi baru
+    (warehouse/publish.py) memegang versi eksklusif selama membangun & menukar partisi, sehingga
+    tidak ada baris yang masuk ke partisi lama setelah staging dibaca. Pembaca tidak memakainya.
+    """
+    fn = "pg_advisory_xact_lock" if exclusive else "pg_advisory_xact_lock_shared"
+    conn.execute(text(f"SELECT {fn}(:key, :city_id);"), {"key": PARTITION_LOCK, "city_id": int(city_id)})
+
+def lock_fact_ddl(conn):
+    """
+    Kunci advisory global (sampai transaksi selesai) untuk DDL pohon partisi fact_waste yang
+    berjalan di rantai per kota: publish / rollback partisi (warehouse/publish.py), retensi, dan
+    pembuatan partisi bulan sebelum load. DDL tsb mengunci fact_waste & dimensi yang dirujuk
+    foreign key (SHARE ROW EXCLUSIVE s/d ACCESS EXCLUSIVE), sehingga dua kota yang menjalankannya
+    bersamaan saling menunggu atau deadlock. Harus statement pertama transaksi: menunggu kunci
+    ini sambil memegang lock tabel bisa deadlock dengan pemegangnya.
+    """
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key);"), {"key": FACT_DDL_LOCK})
+
+def get_city_id(conn, code):
+    city_id = conn.execute(text("SELECT id FROM warehouse.dim_city WHERE code = :code;"), {"code": code}).scalar()
+    if city_id is None:
+        raise KeyError(f"Kota {code!r} belum terdaftar (jalankan register_cities)")
+    return city_id
@@ -0,0 +1,136 @@
+from sqlalchemy import text
+from utils import get_engine
+from warehouse.city import DEFAULT_CITY, get_city_id
+
+# Kubus agregat fact_waste (warehouse.cube_waste) pada grain harian & bulanan.
+# gset = GROUPING(location_id, category_id, source_id): bit 1 berarti kolom tsb diagregasi
+# (4 = semua kecamatan, 2 = semua jenis, 1 = semua sumber), sehingga NULL "total"
+# dibedakan dari NULL "kategori tidak diketahui".
+GSET_TOTAL = 7
+GSET_LOCATION = 3
+GSET_CATEGORY = 5
+GSET_SOURCE = 6
+GSET_LOCATION_CATEGORY = 1
+GSET_LOCATION_SOURCE = 2
+GSET_CATEGORY_SOURCE = 4
+
+PERIOD = {
+    "day": "t.date",
+    "month": "CAST(date_trunc('month', t.date) AS DATE)",
+}
+
+# {source} harus punya kolom time_id, location_id, city_id, category_id, source_id, volume_kg
+# (fact_waste sendiri, atau baris fakta satu batch stream sebelum/bersamaan di-insert).
+# Upsert bersifat aditif sehingga batch stream cukup menambahkan delta-nya.
+# Kota selalu menjadi bagian grup (tidak ada total lintas kota).
+Q_CUBE = """
+INSERT INTO warehouse.cube_waste AS cw
+    (grain, period_start, city_id, gset, location_id, category_id, source_id, volume_kg, n_rows, checksum)
+SELECT
+    '{grain}', {period}, f.city_id, GROUPING(f.location_id, f.category_id, f.source_id),
+    f.location_id, f.category_id, f.source_id,
+    SUM(f.volume_kg), COUNT(*),
+    SUM(hashtext(concat_ws('|', f.location_id, f.category_id, f.source_id, f.volume_kg)))
+FROM {source} f
+JOIN warehouse.dim_time t ON f.time_id = t.id
+WHERE TRUE {where}
+GROUP BY {period}, f.city_id, GROUPING SETS (
+    (),
+    (f.location_id), (f.category_id), (f.source_id),
+    (f.location_id, f.category_id), (f.location_id, f.source_id), (f.category_id, f.source_id)
+)
+ON CONFLICT ON CONSTRAINT cube_waste_key DO UPDATE
+SET volume_kg = cw.volume_kg + EXCLUDED.volume_kg,
+    n_rows = cw.n_rows + EXCLUDED.n_rows,
+    checksum = cw.checksum + EXCLUDED.checksum;
+"""
+
+# Hari yang isinya di fact_waste berbeda dari baris total harian di kubus
+# (jumlah baris, volume, atau checksum isi baris), termasuk hari yang hilang di salah satu sisi.
+# Hari sebelum batas retensi (detail sudah dipadatkan ke rollup) tidak dibandingkan: baris
+# kubusnya dipertahankan apa adanya.
+Q_DIRTY_DAYS = """
+WITH fact_day AS (
+    SELECT t.date, COUNT(*) AS n_rows, SUM(f.volume_kg) AS volume_kg,
+           SUM(hashtext(concat_ws('|', f.location_id, f.category_id, f.source_id, f.volume_kg))) AS checksum
+    FROM warehouse.fact_waste f
+    JOIN warehouse.dim_time t ON f.time_id = t.id
+    WHERE f.city_id = :city_id
+    GROUP BY t.date
+),
+cube_day AS (
+    SELECT period_start AS date, n_rows, volume_kg, checksum
+    FROM warehouse.cube_waste
+    WHERE grain = 'day' AND gset = :gset_total AND city_id = :city_id
+      AND period_start >= COALESCE(
+          (SELECT r.detail_from FROM warehouse.fact_retention r WHERE r.city_id = :city_id), DATE '-infinity')
+)
+SELECT COALESCE(fd.date, cd.date) AS date
+FROM fact_day fd
+FULL JOIN cube_day cd ON cd.date = fd.date
+WHERE (fd.n_rows, fd.volume_kg, fd.checksum) IS DISTINCT FROM (cd.n_rows, cd.volume_kg, cd.checksum)
+ORDER BY 1;
+"""
+
+# Baris bulanan dari baris harian kubus (jumlah, n_rows & checksum bersifat aditif),
+# dipakai backfill per rentang hari tanpa scan ulang fact_waste
+Q_MONTH_FROM_DAYS = """
+INSERT INTO warehouse.cube_waste
+    (grain, period_start, city_id, gset, location_id, category_id, source_id, volume_kg, n_rows, checksum)
+SELECT
+    'month', CAST(date_trunc('month', period_start) AS DATE), city_id, gset,
+    location_id, category_id, source_id, SUM(volume_kg), SUM(n_rows), SUM(checksum)
+FROM warehouse.cube_waste
+WHERE grain = 'day' AND city_id = :city_id
+  AND period_start >= :first AND CAST(date_trunc('month', period_start) AS DATE) = ANY(:months)
+GROUP BY 2, city_id, gset, location_id, category_id, source_id;
+"""
+
+def add_to_cube(conn, source, where="", params=None):
+    """Menambahkan agregat baris `source` ke kubus (kedua grain)."""
+    for grain, period in PERIOD.items():
+        conn.execute(text(Q_CUBE.format(grain=grain, period=period, source=source, where=where)), params or {})
+
+def refresh_cube_waste(city=DEFAULT_CITY):
+    """
+    Refresh inkremental setelah load_fact_waste(city): hanya hari yang berubah (dan bulan yang
+    memuat hari tsb) di kota itu dihapus lalu dihitung ulang dari partisi fact_waste-nya.
+    Mengembalikan jumlah hari.
+    """
+    engine = get_engine()
+    with engine.begin() as conn:
+        city_id = get_city_id(conn, city)
+        days = [r.date for r in conn.execute(text(Q_DIRTY_DAYS), {"gset_total": GSET_TOTAL, "city_id": city_id})]
+        if not days:
+            return 0
+        months = sorted({d.replace(day=1) for d in days})
+
+        conn.execute(text("""
+        DELETE FROM warehouse.cube_waste
+        WHERE city_id = :city_id AND grain = 'day' AND period_start = ANY(:days);
+        """), {"city_id": city_id, "days": days})
+        conn.execute(text("""
+        DELETE FROM warehouse.cube_waste
+        WHERE city_id = :city_id AND grain = 'month' AND period_start = ANY(:months);
+        """), {"city_id": city_id, "months": months})
+
+        conn.execute(text(Q_CUBE.format(
+            grain="day", period=PERIOD["day"], source="warehouse.fact_waste",
+            where="AND f.city_id = :city_id AND t.date = ANY(:days)",
+        )), {"city_id": city_id, "days": days})
+        conn.execute(text(Q_CUBE.format(
+            grain="month", period=PERIOD["month"], source="warehouse.fact_waste",
+            where=f"AND f.city_id = :city_id AND t.date >= :first AND {PERIOD['month']} = ANY(:months)",
+        )), {"city_id": city_id, "first": months[0], "months": months})
+    return len(days)
+
+def rollup_cube_months(conn, city_id, months):
+    """Menghitung ulang baris bulanan `months` (tanggal awal bulan) satu kota dari baris hariannya."""
+    months = sorted(months)
+    if not months:
+        return
+    conn.execute(text("""
+    DELETE FROM warehouse.cube_waste
+    WHERE city_id = :city_id AND grain = 'month' AND period_start = ANY(:months);
+    """), {"city_id": city_id, "months": months})
+    conn.execute(text(Q_MONTH_FROM_DAYS), {"city_id": city_id, "first": months[0], "months": months})
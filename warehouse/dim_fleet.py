@@ -1,18 +1,75 @@
+from datetime import date
 from sqlalchemy import text
 from utils import get_engine
+from warehouse.city import DEFAULT_CITY
 
-def load_dim_fleet():
+# Batas tanggal untuk versi armada (SCD Type 2).
+# Versi pertama berlaku sejak OPEN_FROM agar data sampah historis tetap punya armada,
+# versi yang sedang berlaku ditandai dengan valid_to = OPEN_TO.
+OPEN_FROM = date(1900, 1, 1)
+OPEN_TO = date(9999, 12, 31)
+
+def load_dim_fleet(effective_date=None, city=DEFAULT_CITY):
+    """
+    Memuat dim_fleet sebagai SCD Type 2 (riwayat armada per kecamatan) untuk satu kota.
+    Versi lama ditutup (valid_to = effective_date) jika angka armada berubah,
+    lalu versi baru disisipkan mulai effective_date. Default: hari ini.
+    """
     engine = get_engine()
-    q = """
-    INSERT INTO warehouse.dim_fleet (kecamatan, armada_total, armada_operasional, ritase_harian, kapasitas_m3)
-    SELECT kecamatan, armada_total, armada_operasional, ritase_harian, kapasitas_m3
-    FROM staging.view_sipsn_clean
-    WHERE kecamatan IS NOT NULL
-    ON CONFLICT (kecamatan) DO UPDATE
-    SET armada_total = EXCLUDED.armada_total,
-        armada_operasional = EXCLUDED.armada_operasional,
-        ritase_harian = EXCLUDED.ritase_harian,
-        kapasitas_m3 = EXCLUDED.kapasitas_m3;
+    params = {
+        "effective_date": effective_date or date.today(),
+        "open_from": OPEN_FROM,
+        "open_to": OPEN_TO,
+        "city": city,
+    }
+
+    # 1. Perubahan di hari yang sama dengan awal versi -> timpa saja versinya
+    q_same_day = """
+    UPDATE warehouse.dim_fleet d
+    SET armada_total = s.armada_total,
+        armada_operasional = s.armada_operasional,
+        ritase_harian = s.ritase_harian,
+        kapasitas_m3 = s.kapasitas_m3
+    FROM staging.view_sipsn_clean s
+    JOIN warehouse.dim_city ci ON ci.code = s.city
+    WHERE s.city = :city AND d.city_id = ci.id AND d.kecamatan = s.kecamatan
+      AND d.valid_to = :open_to
+      AND d.valid_from = :effective_date
+      AND (d.armada_total, d.armada_operasional, d.ritase_harian, d.kapasitas_m3)
+          IS DISTINCT FROM (s.armada_total, s.armada_operasional, s.ritase_harian, s.kapasitas_m3);
+    """
+    # 2. Tutup versi yang berlaku jika datanya berubah
+    q_close = """
+    UPDATE warehouse.dim_fleet d
+    SET valid_to = :effective_date
+    FROM staging.view_sipsn_clean s
+    JOIN warehouse.dim_city ci ON ci.code = s.city
+    WHERE s.city = :city AND d.city_id = ci.id AND d.kecamatan = s.kecamatan
+      AND d.valid_to = :open_to
+      AND d.valid_from < :effective_date
+      AND (d.armada_total, d.armada_operasional, d.ritase_harian, d.kapasitas_m3)
+          IS DISTINCT FROM (s.armada_total, s.armada_operasional, s.ritase_harian, s.kapasitas_m3);
+    """
+    # 3. Sisipkan versi baru untuk kecamatan yang tidak punya versi berlaku
+    q_insert = """
+    INSERT INTO warehouse.dim_fleet
+        (city_id, kecamatan, armada_total, armada_operasional, ritase_harian, kapasitas_m3, valid_from, valid_to)
+    SELECT
+        ci.id, s.kecamatan, s.armada_total, s.armada_operasional, s.ritase_harian, s.kapasitas_m3,
+        CASE WHEN EXISTS (SELECT 1 FROM warehouse.dim_fleet d WHERE d.city_id = ci.id AND d.kecamatan = s.kecamatan)
+             THEN CAST(:effective_date AS DATE)
+             ELSE CAST(:open_from AS DATE)
+        END,
+        :open_to
+    FROM staging.view_sipsn_clean s
+    JOIN warehouse.dim_city ci ON ci.code = s.city
+    WHERE s.city = :city AND s.kecamatan IS NOT NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM warehouse.dim_fleet d
+          WHERE d.city_id = ci.id AND d.kecamatan = s.kecamatan AND d.valid_to = :open_to
+      );
     """
     with engine.begin() as conn:
-        conn.execute(text(q))
\ No newline at end of file
+        conn.execute(text(q_same_day), params)
+        conn.execute(text(q_close), params)
+        conn.execute(text(q_insert), params)
@@ -1,23 +1,26 @@
 from sqlalchemy import text
 from utils import get_engine
+from warehouse.city import DEFAULT_CITY
 
-def load_dim_location():
+def load_dim_location(city=DEFAULT_CITY):
     engine = get_engine()
-    # 1. Insert Kunci Kecamatan dari Waste Data
+    # 1. Insert Kunci Kecamatan dari Waste Data (kecamatan unik per kota)
     q_insert = """
-    INSERT INTO warehouse.dim_location (kecamatan)
-    SELECT DISTINCT kecamatan 
-    FROM staging.view_waste_clean
-    WHERE kecamatan IS NOT NULL
-    ON CONFLICT (kecamatan) DO NOTHING;
+    INSERT INTO warehouse.dim_location (city_id, kecamatan)
+    SELECT DISTINCT ci.id, s.kecamatan
+    FROM staging.view_waste_clean s
+    JOIN warehouse.dim_city ci ON ci.code = s.city
+    WHERE s.kecamatan IS NOT NULL AND s.city = :city
+    ON CONFLICT (city_id, kecamatan) DO NOTHING;
     """
     # 2. Update Data Profil dari SIPSN
     q_update = """
     UPDATE warehouse.dim_location dl
     SET penduduk = s.penduduk, luas_km2 = s.luas_km2
     FROM staging.view_sipsn_clean s
-    WHERE dl.kecamatan = s.kecamatan;
+    JOIN warehouse.dim_city ci ON ci.code = s.city
+    WHERE s.city = :city AND dl.city_id = ci.id AND dl.kecamatan = s.kecamatan;
     """
     with engine.begin() as conn:
-        conn.execute(text(q_insert))
-        conn.execute(text(q_update))
\ No newline at end of file
+        conn.execute(text(q_insert), {"city": city})
+        conn.execute(text(q_update), {"city": city})
\ No newline at end of file
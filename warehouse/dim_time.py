@@ -1,17 +1,24 @@
 from sqlalchemy import text
 from utils import get_engine
+from warehouse.city import DEFAULT_CITY
 
-def load_dim_time():
+# Smart key yyyymmdd (mis. 20240215): urut sesuai tanggal, menjadi batas RANGE sub-partisi
+# bulan fact_waste (warehouse/city.py)
+TIME_ID_SQL = "CAST(to_char({col}, 'YYYYMMDD') AS INTEGER)"
+
+def load_dim_time(city=DEFAULT_CITY):
     engine = get_engine()
-    q = """
-    INSERT INTO warehouse.dim_time (date, year, month, day)
+    q = f"""
+    INSERT INTO warehouse.dim_time (id, date, year, month, day)
     SELECT DISTINCT 
+        {TIME_ID_SQL.format(col='tanggal')},
         tanggal,
         EXTRACT(YEAR FROM tanggal),
         EXTRACT(MONTH FROM tanggal),
         EXTRACT(DAY FROM tanggal)
     FROM staging.view_waste_clean
+    WHERE city = :city
     ON CONFLICT (date) DO NOTHING;
     """
     with engine.begin() as conn:
-        conn.execute(text(q))
\ No newline at end of file
+        conn.execute(text(q), {"city": city})
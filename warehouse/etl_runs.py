@@ -0,0 +1,41 @@
+from sqlalchemy import text
+from utils import get_engine
+
+# Versi data satu kota: run kota tsb atau run tanpa kota (NULL = semua kota, run lama)
+Q_CITY_VERSION = """
+SELECT GREATEST(
+    (SELECT MAX(id) FROM warehouse.etl_runs WHERE city = :city),
+    (SELECT MAX(id) FROM warehouse.etl_runs WHERE city IS NULL),
+    0
+);
+"""
+
+def record_etl_run(conn=None, city=None):
+    """
+    Mencatat run ELT yang selesai ke warehouse.etl_runs. Dipanggil paling akhir
+    setelah semua tabel warehouse terisi (atau di transaksi batch stream lewat conn).
+    city = kota yang di-load (pipeline per kota): hanya versi data kota tsb yang naik, sehingga
+    cache dashboard & ETag read API kota lain tetap berlaku. city=None menaikkan versi semua kota.
+    Mengembalikan versi data yang baru.
+    """
+    q = """
+    INSERT INTO warehouse.etl_runs (fact_rows, city)
+    SELECT COUNT(*), :city FROM warehouse.fact_waste f
+    WHERE CAST(:city AS VARCHAR) IS NULL OR f.city_id = (SELECT id FROM warehouse.dim_city WHERE code = :city)
+    RETURNING id;
+    """
+    if conn is not None:
+        return conn.execute(text(q), {"city": city}).scalar()
+
+    engine = get_engine()
+    with engine.begin() as conn:
+        return conn.execute(text(q), {"city": city}).scalar()
+
+def get_data_version(conn, city=None):
+    """
+    Versi data saat ini (id run ELT terakhir, 0 jika belum pernah ada run). Dengan city: versi
+    data kota tsb (run terakhir kota itu atau run semua kota); tanpa city: versi global.
+    """
+    if city is None:
+        return conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM warehouse.etl_runs;")).scalar()
+    return conn.execute(text(Q_CITY_VERSION), {"city": city}).scalar()
@@ -1,20 +1,136 @@
 from sqlalchemy import text
 from utils import get_engine
+from warehouse.city import DEFAULT_CITY, ensure_month_partitions, lock_city_partition, lock_fact_ddl, missing_batch_months
+from warehouse.cube import add_to_cube
+from warehouse.dim_time import TIME_ID_SQL
+from warehouse.retention import COMPACTED_FILTER, DETAIL_FILTER, add_late_rows
+
+# {source} = view staging yang dibaca, {where} = filter opsional (mis. satu batch stream)
+Q_DIM_CATEGORY = """
+INSERT INTO warehouse.dim_category (name)
+SELECT DISTINCT s.jenis_sampah
+FROM {source} s
+WHERE s.jenis_sampah IS NOT NULL {where}
+  AND NOT EXISTS (SELECT 1 FROM warehouse.dim_category c WHERE c.name = s.jenis_sampah)
+ON CONFLICT (name) DO NOTHING;
+"""
+
+Q_DIM_SOURCE = """
+INSERT INTO warehouse.dim_source (name)
+SELECT DISTINCT s.sumber_sampah
+FROM {source} s
+WHERE s.sumber_sampah IS NOT NULL {where}
+  AND NOT EXISTS (SELECT 1 FROM warehouse.dim_source c WHERE c.name = s.sumber_sampah)
+ON CONFLICT (name) DO NOTHING;
+"""
+
+# - fleet_id diisi sekali di sini dengan versi armada yang berlaku pada tanggal tsb (as-of join),
+#   sehingga query historis cukup join fleet_id = dim_fleet.id
+# - volume disimpan sebagai integer kg, kategori & sumber sebagai key SMALLINT
+# - city_id menentukan partisi fact_waste; kecamatan & armada dicocokkan di dalam kota yang sama
+Q_FACT_SELECT = """
+SELECT
+    t.id AS time_id, l.id AS location_id, fl.id AS fleet_id,
+    ROUND(s.volume_ton * 1000)::INTEGER AS volume_kg, ci.id AS city_id,
+    c.id AS category_id, src.id AS source_id
+FROM {source} s
+JOIN warehouse.dim_city ci ON ci.code = s.city
+JOIN warehouse.dim_time t ON t.date = s.tanggal
+JOIN warehouse.dim_location l ON l.city_id = ci.id AND l.kecamatan = s.kecamatan
+LEFT JOIN warehouse.dim_fleet fl
+    ON fl.city_id = ci.id AND fl.kecamatan = s.kecamatan
+    AND s.tanggal >= fl.valid_from AND s.tanggal < fl.valid_to
+LEFT JOIN warehouse.dim_category c ON c.name = s.jenis_sampah
+LEFT JOIN warehouse.dim_source src ON src.name = s.sumber_sampah
+WHERE TRUE {where}
+"""
+
+Q_FACT_INTO = """
+INSERT INTO {target} (time_id, location_id, fleet_id, volume_kg, city_id, category_id, source_id)
+""" + Q_FACT_SELECT
+
+Q_FACT = Q_FACT_INTO.replace("{target}", "warehouse.fact_waste")
+
+def load_dim_category_source(conn, source="staging.view_waste_clean", where="", params=None):
+    """
+    Mendaftarkan nilai jenis_sampah / sumber_sampah baru ke kamus dim_category & dim_source.
+    NOT EXISTS dipakai (bukan hanya ON CONFLICT) agar sequence SMALLINT tidak terbuang tiap run.
+    """
+    conn.execute(text(Q_DIM_CATEGORY.format(source=source, where=where)), params or {})
+    conn.execute(text(Q_DIM_SOURCE.format(source=source, where=where)), params or {})
+
+def load_fact_waste(city=DEFAULT_CITY):
+    """
+    Membangun ulang partisi fact_waste satu kota dari staging. Partisi kota lain tidak
+    disentuh, sehingga pipeline antar kota bisa berjalan paralel. Tanggal yang sudah
+    dipadatkan retensi (warehouse/retention.py) tidak di-load ulang.
+    Partisi baru dibangun di skema shadow lalu ditukar atomik dengan partisi live
+    (warehouse/publish.py): dashboard tidak pernah melihat partisi kosong / setengah terisi.
+    Mengembalikan jumlah baris fakta kota tsb.
+    """
+    from warehouse.publish import publish_fact_waste
 
-def load_fact_waste():
     engine = get_engine()
-    
-    # Hapus data lama agar tidak duplikat
+    where = "AND s.city = :city"
+    params = {"city": city}
+
     with engine.begin() as conn:
-        conn.execute(text("TRUNCATE TABLE warehouse.fact_waste RESTART IDENTITY;"))
-
-    q = """
-    INSERT INTO warehouse.fact_waste (time_id, location_id, volume, category, source)
-    SELECT 
-        t.id, l.id, s.volume_ton, s.jenis_sampah, s.sumber_sampah
-    FROM staging.view_waste_clean s
-    JOIN warehouse.dim_time t ON t.date = s.tanggal
-    JOIN warehouse.dim_location l ON l.kecamatan = s.kecamatan;
+        # Partisi bulan baru = DDL pada pohon fact_waste: diserialkan dengan publish kota lain
+        lock_fact_ddl(conn)
+        load_dim_category_source(conn, where=where, params=params)
+        ensure_month_partitions(conn, city)
+
+    return publish_fact_waste(city, engine)
+
+def load_fact_waste_batch(conn, batch_id):
     """
-    with engine.begin() as conn:
-        conn.execute(text(q))
\ No newline at end of file
+    Update inkremental untuk satu batch event stream (staging.raw_waste_events):
+    tanggal baru ke dim_time, kategori/sumber baru ke kamus, baris fakta batch tsb,
+    lalu agregatnya ditambahkan ke kubus cube_waste. Event untuk tanggal yang sudah dipadatkan
+    retensi langsung ditambahkan ke tier rollup.
+    Dijalankan di transaksi yang sama dengan COPY batch oleh elt/ingest_stream.py, tanpa DDL:
+    sub-partisi bulan batch dibuat sebelumnya oleh ensure_batch_month_partitions (transaksi
+    pendek dengan lock_fact_ddl). Jika sub-partisi itu hilang lagi (partisi kota baru saja
+    di-publish), RuntimeError dilempar dan batch dicoba ulang oleh ingestor.
+    Mengembalikan jumlah baris fakta yang ditambahkan (detail + rollup).
+    """
+    source = "staging.view_waste_events_clean"
+    where = "AND s.batch_id = :batch_id"
+    params = {"batch_id": batch_id}
+
+    # Menunggu publish partisi kota yang sedang berjalan agar baris batch masuk ke partisi baru
+    for city_id in conn.execute(text("""
+    SELECT ci.id FROM warehouse.dim_city ci
+    WHERE ci.code IN (SELECT DISTINCT city FROM staging.raw_waste_events WHERE batch_id = :batch_id)
+    ORDER BY ci.id;
+    """), params).scalars():
+        lock_city_partition(conn, city_id)
+    pairs = conn.execute(text("""
+    SELECT DISTINCT city, tanggal FROM staging.view_waste_events_clean WHERE batch_id = :batch_id;
+    """), params).all()
+    missing = missing_batch_months(conn, [p.city for p in pairs], [p.tanggal for p in pairs])
+    if missing:
+        raise RuntimeError("Sub-partisi bulan belum ada: " + ", ".join(f"{c} {m:%Y-%m}" for c, m in missing))
+
+    conn.execute(text(f"""
+    INSERT INTO warehouse.dim_time (id, date, year, month, day)
+    SELECT DISTINCT
+        {TIME_ID_SQL.format(col='s.tanggal')},
+        s.tanggal,
+        EXTRACT(YEAR FROM s.tanggal),
+        EXTRACT(MONTH FROM s.tanggal),
+        EXTRACT(DAY FROM s.tanggal)
+    FROM staging.view_waste_events_clean s
+    WHERE s.batch_id = :batch_id
+    ON CONFLICT (date) DO NOTHING;
+    """), params)
+    load_dim_category_source(conn, source, where, params)
+    n_rows = conn.execute(text(Q_FACT.format(source=source, where=where + DETAIL_FILTER)), params).rowcount
+    late = f"({Q_FACT_SELECT.format(source=source, where=where + COMPACTED_FILTER)})"
+    n_late = conn.execute(text(f"SELECT COUNT(*) FROM {late} late;"), params).scalar()
+    if n_late:
+        add_late_rows(conn, late, params)
+
+    # Delta kubus dari baris batch yang sama (upsert aditif, tanpa scan fact_waste)
+    add_to_cube(conn, f"({Q_FACT_SELECT.format(source=source, where=where)})", params=params)
+    return n_rows + n_late
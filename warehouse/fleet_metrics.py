@@ -0,0 +1,23 @@
+import numpy as np
+
+# Massa jenis rata-rata sampah di truk (ton/m3)
+DENSITY = 0.33
+
+def per_truck_capacity(df_fleet):
+    """Kapasitas angkut harian satu truk operasional (ton/hari) = ritase x m3 x densitas."""
+    return df_fleet['ritase_harian'] * df_fleet['kapasitas_m3'] * DENSITY
+
+def compute_fleet_status(df_fleet, load_col='avg_daily_waste_ton'):
+    """
+    Menambahkan kolom capacity_ton, load_ratio (%) dan status (SAFE/WARNING/CRITICAL)
+    berdasarkan beban load_col. Dipakai dashboard dan modul analisis armada lain.
+    """
+    df = df_fleet.copy()
+
+    # HITUNG KAPASITAS
+    df['capacity_ton'] = df['armada_operasional'] * per_truck_capacity(df)
+    df['capacity_ton'] = df['capacity_ton'].replace(0, 0.1)
+
+    df['load_ratio'] = (df[load_col] / df['capacity_ton']) * 100
+    df['status'] = np.select([df['load_ratio'] > 110, df['load_ratio'] > 90], ["CRITICAL", "WARNING"], default="SAFE")
+    return df
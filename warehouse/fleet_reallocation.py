@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+
+from warehouse.fleet_metrics import compute_fleet_status, per_truck_capacity
+
+# Donor hanya melepas truk selama beban rasionya tetap <= TARGET_RATIO (tidak jadi WARNING)
+TARGET_RATIO = 0.9
+MIN_KEEP = 1          # setiap kecamatan menyisakan minimal 1 truk operasional
+
+def _supply_demand(df, load_col, target_ratio, min_keep):
+    """
+    Kebutuhan & kelebihan truk per kecamatan (vektor).
+    Truk yang dipindah diasumsikan mengikuti ritase & bak (m3/truk) kecamatan tujuan.
+    """
+    c = per_truck_capacity(df).to_numpy(dtype=float)
+    ops = df['armada_operasional'].to_numpy(dtype=float)
+    cap = ops * c
+    load = df[load_col].to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spare = np.floor((target_ratio * cap - load) / c)
+        need = np.ceil((load - cap) / c)
+    spare = np.clip(np.nan_to_num(np.minimum(spare, ops - min_keep)), 0, None).astype(int)
+    need = np.where(c > 0, np.clip(np.nan_to_num(need), 0, None), 0).astype(int)
+    return c, spare, need
+
+def _greedy_pool(c, spare, need):
+    """
+    Tanpa batasan wilayah: semua truk lebih dianggap satu kolam. Penerima dengan kapasitas
+    per-truk terbesar didahulukan (tiap truk mengurangi overload paling banyak), lalu
+    donor dipasangkan ke penerima lewat perpotongan interval kumulatif. Semua operasi vektor.
+    """
+    receivers = np.flatnonzero(need > 0)
+    receivers = receivers[np.argsort(-c[receivers], kind='stable')]
+    donors = np.flatnonzero(spare > 0)
+    donors = donors[np.argsort(-spare[donors], kind='stable')]
+    if len(receivers) == 0 or len(donors) == 0:
+        return np.empty(0, int), np.empty(0, int), np.empty(0, int)
+
+    pool = spare[donors].sum()
+    need_cum = np.cumsum(need[receivers])
+    alloc = np.clip(pool - (need_cum - need[receivers]), 0, need[receivers])
+
+    give_cum = np.cumsum(spare[donors])
+    take_cum = np.cumsum(alloc)
+    total = take_cum[-1]
+    if total == 0:
+        return np.empty(0, int), np.empty(0, int), np.empty(0, int)
+
+    # Titik potong gabungan kedua interval -> segmen [a, b) milik tepat satu donor & satu penerima
+    cuts = np.unique(np.concatenate([[0], give_cum[give_cum < total], take_cum]))
+    starts, ends = cuts[:-1], cuts[1:]
+    d = np.searchsorted(give_cum, starts, side='right')
+    r = np.searchsorted(take_cum, starts, side='right')
+    return donors[d], receivers[r], (ends - starts).astype(int)
+
+def _lp_neighbours(c, spare, need, edges):
+    """
+    Dengan batasan tetangga: masalah transportasi sebagai LP (HiGHS).
+      min  sum_j c_j * u_j + eps * sum_e x_e
+      s.t. sum_{e keluar i} x_e <= spare_i
+           sum_{e masuk j} x_e + u_j >= need_j
+    Matriks kendala bersifat totally unimodular sehingga solusi simpleks sudah bulat.
+    """
+    from scipy.optimize import linprog
+    from scipy.sparse import coo_matrix, vstack
+
+    src, dst = edges
+    keep = (spare[src] > 0) & (need[dst] > 0)
+    src, dst = src[keep], dst[keep]
+    if len(src) == 0:
+        return np.empty(0, int), np.empty(0, int), np.empty(0, int)
+
+    receivers = np.unique(dst)
+    r_pos = np.searchsorted(receivers, dst)
+    n_e, n_r = len(src), len(receivers)
+    donors = np.unique(src)
+    d_pos = np.searchsorted(donors, src)
+
+    # Variabel: [x_e (n_e), u_j (n_r)]
+    cost = np.concatenate([np.full(n_e, 1e-6), c[receivers]])
+    a_supply = coo_matrix((np.ones(n_e), (d_pos, np.arange(n_e))), shape=(len(donors), n_e + n_r))
+    a_demand = coo_matrix(
+        (np.concatenate([-np.ones(n_e), -np.ones(n_r)]),
+         (np.concatenate([r_pos, np.arange(n_r)]), np.concatenate([np.arange(n_e), n_e + np.arange(n_r)]))),
+        shape=(n_r, n_e + n_r),
+    )
+    a_ub = vstack([a_supply, a_demand]).tocsr()
+    b_ub = np.concatenate([spare[donors], -need[receivers]])
+    bounds = np.column_stack([np.zeros(n_e + n_r), np.concatenate([np.full(n_e, np.inf), need[receivers]])])
+
+    res = linprog(cost, A_ub=a_ub, b_ub=b_ub, bounds=bounds, method='highs')
+    if res.status != 0:
+        raise RuntimeError(f"Solver realokasi gagal: {res.message}")
+
+    x = np.floor(res.x[:n_e] + 1e-6).astype(int)
+    moved = x > 0
+    return src[moved], dst[moved], x[moved]
+
+def propose_reallocation(df_fleet, load_col='avg_daily_waste_ton', neighbours=None,
+                         target_ratio=TARGET_RATIO, min_keep=MIN_KEEP):
+    """
+    Mengusulkan pemindahan truk operasional dari kecamatan longgar ke kecamatan overload
+    untuk meminimalkan total overload (ton/hari di atas kapasitas).
+
+    df_fleet   : kolom kecamatan, armada_operasional, ritase_harian, kapasitas_m3, load_col
+                 (rata-rata historis atau prakiraan).
+    neighbours : None untuk bebas lintas wilayah, atau daftar pasangan (kecamatan_a, kecamatan_b)
+                 yang bertetangga (dua arah) - lihat neighbour_pairs().
+
+    Mengembalikan (moves, after): moves = dari, ke, truk, tambahan_kapasitas_ton;
+    after = df_fleet dengan armada_operasional/capacity_ton/load_ratio/status setelah realokasi.
+    """
+    df = df_fleet.reset_index(drop=True)
+    c, spare, need = _supply_demand(df, load_col, target_ratio, min_keep)
+
+    if neighbours is None:
+        src, dst, trucks = _greedy_pool(c, spare, need)
+    else:
+        pos = pd.Series(np.arange(len(df)), index=df['kecamatan'])
+        pairs = pd.DataFrame(list(neighbours), columns=['a', 'b'])
+        pairs = pairs[pairs['a'].isin(pos.index) & pairs['b'].isin(pos.index)]
+        a, b = pos[pairs['a']].to_numpy(), pos[pairs['b']].to_numpy()
+        edges = (np.concatenate([a, b]), np.concatenate([b, a]))
+        src, dst, trucks = _lp_neighbours(c, spare, need, edges)
+
+    moves = pd.DataFrame({
+        'dari': df['kecamatan'].to_numpy()[src],
+        'ke': df['kecamatan'].to_numpy()[dst],
+        'truk': trucks,
+        'tambahan_kapasitas_ton': (trucks * c[dst]).round(1),
+    }).sort_values(['ke', 'truk'], ascending=[True, False], ignore_index=True)
+
+    delta = np.zeros(len(df), dtype=int)
+    np.add.at(delta, dst, trucks)
+    np.subtract.at(delta, src, trucks)
+    after = df.copy()
+    after['armada_operasional'] = after['armada_operasional'] + delta
+    after = compute_fleet_status(after, load_col=load_col)
+    return moves, after
+
+def total_overload(df_fleet, load_col='avg_daily_waste_ton'):
+    """Total beban di atas kapasitas (ton/hari) untuk df hasil compute_fleet_status."""
+    return float(np.clip(df_fleet[load_col] - df_fleet['capacity_ton'], 0, None).sum())
+
+def neighbour_pairs(gdf, name_col='kecamatan'):
+    """Pasangan kecamatan yang batas wilayahnya bersinggungan (dari GeoDataFrame)."""
+    gdf = gdf.reset_index(drop=True)
+    left, right = gdf.sindex.query(gdf.geometry, predicate='intersects')
+    keep = left < right
+    names = gdf[name_col].to_numpy()
+    return list(zip(names[left[keep]], names[right[keep]]))
@@ -0,0 +1,131 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from utils import get_engine
+from warehouse.city import DEFAULT_CITY, get_city_id
+
+# --- KONFIGURASI MODEL ---
+HISTORY_DAYS = 84          # 12 minggu terakhir sebagai data latih
+DEFAULT_HORIZON = 30       # prakiraan 30 hari ke depan (dashboard memakai 7-30)
+SERIES_PER_WORKER = 2000   # di atas ini, matriks dipecah ke beberapa proses
+Z_95 = 1.96                # lebar interval prakiraan (95%)
+
+def design_matrix(day_index, n_history):
+    """
+    Matriks desain bersama untuk semua kecamatan: 7 dummy hari (Senin..Minggu)
+    ditambah satu kolom tren linear. Baris = hari, kolom = parameter.
+    """
+    day_index = np.asarray(day_index)
+    weekdays = day_index % 7
+    X = np.zeros((len(day_index), 8))
+    X[np.arange(len(day_index)), weekdays] = 1.0
+    X[:, 7] = day_index / max(n_history, 1)
+    return X
+
+def _fill_missing(Y, weekdays):
+    """Isi hari kosong (NaN) dengan rata-rata hari yang sama pada seri tersebut."""
+    Y = Y.copy()
+    for w in range(7):
+        cols = weekdays == w
+        if not cols.any():
+            continue
+        block = Y[:, cols]
+        with np.errstate(all="ignore"):
+            means = np.nanmean(block, axis=1)
+        means = np.where(np.isnan(means), np.nanmean(Y, axis=1), means)
+        Y[:, cols] = np.where(np.isnan(block), means[:, None], block)
+    return np.nan_to_num(Y)
+
+def _fit_chunk(args):
+    """Fit & prakiraan untuk satu blok seri (dipanggil langsung atau di proses lain)."""
+    Y, first_weekday, horizon = args
+    n_series, n_days = Y.shape
+    day_index = np.arange(n_days) + first_weekday
+    X = design_matrix(day_index, n_days)
+    Y = _fill_missing(Y, day_index % 7)
+
+    # Least squares untuk semua seri sekaligus: B = pinv(X) @ Y^T  -> (parameter x seri)
+    B = np.linalg.pinv(X) @ Y.T
+    residuals = Y - (X @ B).T
+    dof = max(n_days - X.shape[1], 1)
+    sigma = np.sqrt((residuals ** 2).sum(axis=1) / dof)
+
+    X_future = design_matrix(np.arange(n_days, n_days + horizon) + first_weekday, n_days)
+    yhat = np.clip((X_future @ B).T, 0, None)
+    lower = np.clip(yhat - Z_95 * sigma[:, None], 0, None)
+    upper = yhat + Z_95 * sigma[:, None]
+    return yhat, lower, upper
+
+def forecast_matrix(Y, first_date, horizon=DEFAULT_HORIZON, workers=None):
+    """
+    Prakiraan musiman-mingguan untuk matriks Y (seri x hari) yang hari pertamanya first_date.
+    Mengembalikan (yhat, lower, upper), masing-masing berukuran (seri x horizon).
+    """
+    Y = np.asarray(Y, dtype=float)
+    # Geser indeks hari agar (indeks % 7) == weekday (Senin = 0)
+    first_weekday = pd.Timestamp(first_date).dayofweek
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(Y) <= SERIES_PER_WORKER:
+        return _fit_chunk((Y, first_weekday, horizon))
+
+    n_chunks = min(workers, int(np.ceil(len(Y) / SERIES_PER_WORKER)))
+    chunks = [(c, first_weekday, horizon) for c in np.array_split(Y, n_chunks)]
+    with ProcessPoolExecutor(max_workers=n_chunks) as pool:
+        results = list(pool.map(_fit_chunk, chunks))
+    return tuple(np.vstack(parts) for parts in zip(*results))
+
+def load_forecast_daily(horizon=DEFAULT_HORIZON, history_days=HISTORY_DAYS, workers=None, city=DEFAULT_CITY):
+    """
+    Membangun ulang prakiraan satu kota di warehouse.forecast_daily dari HISTORY_DAYS hari
+    terakhir fact_waste kota tsb. Dijalankan setelah load_fact_waste. Mengembalikan jumlah
+    kecamatan yang diprakirakan.
+    """
+    engine = get_engine()
+
+    q_history = """
+    SELECT f.location_id, t.date, SUM(f.volume_kg) / 1000.0 AS volume
+    FROM warehouse.fact_waste f
+    JOIN warehouse.dim_time t ON f.time_id = t.id
+    WHERE f.city_id = :city_id AND t.date > (
+        SELECT MAX(t2.date) FROM warehouse.fact_waste f2 JOIN warehouse.dim_time t2 ON f2.time_id = t2.id
+        WHERE f2.city_id = :city_id
+    ) - :history_days
+    GROUP BY f.location_id, t.date;
+    """
+    with engine.connect() as conn:
+        city_id = get_city_id(conn, city)
+        res = conn.execute(text(q_history), {"history_days": history_days, "city_id": city_id})
+        df = pd.DataFrame(res.fetchall(), columns=res.keys())
+
+    if df.empty:
+        return 0
+
+    df["volume"] = pd.to_numeric(df["volume"], errors="coerce")
+    df["date"] = pd.to_datetime(df["date"])
+    dates = pd.date_range(df["date"].min(), df["date"].max(), freq="D")
+    matrix = df.pivot_table(index="location_id", columns="date", values="volume", aggfunc="sum").reindex(columns=dates)
+
+    yhat, lower, upper = forecast_matrix(matrix.to_numpy(), dates[0], horizon=horizon, workers=workers)
+
+    target_dates = pd.date_range(dates[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")
+    out = pd.DataFrame({
+        "location_id": np.repeat(matrix.index.to_numpy(), horizon),
+        "target_date": np.tile(target_dates.date, len(matrix)),
+        "volume_ton": yhat.ravel().round(2),
+        "lower_ton": lower.ravel().round(2),
+        "upper_ton": upper.ravel().round(2),
+        # upper tidak di-clip: sigma seri bisa dipulihkan persis untuk interval gabungan antar kecamatan
+        "sigma_ton": ((upper - yhat) / Z_95).ravel().round(4),
+    })
+
+    with engine.begin() as conn:
+        conn.execute(text("""
+        DELETE FROM warehouse.forecast_daily
+        WHERE location_id IN (SELECT id FROM warehouse.dim_location WHERE city_id = :city_id);
+        """), {"city_id": city_id})
+        out.to_sql("forecast_daily", conn, schema="warehouse", if_exists="append", index=False, method="multi")
+    return len(matrix)
@@ -0,0 +1,64 @@
+# warehouse/frames.py
+"""
+Jalur baca kolumnar untuk query yang hasilnya dijadikan DataFrame.
+
+pd.DataFrame(result.fetchall()) membuat satu tuple Python per baris berisi objek Decimal,
+date dan str, lalu pd.to_numeric / pd.to_datetime menyalinnya lagi menjadi kolom object.
+fetch_frame() mengalirkan hasil query lewat COPY (...) TO STDOUT (CSV) langsung ke pembaca
+CSV pyarrow (multi-thread, di luar GIL) dengan tipe kolom yang sudah ditentukan, sehingga
+tidak ada objek Python per baris:
+
+  "float"     float64 (volume, rata-rata; NUMERIC dibaca sebagai teks lalu di-parse)
+  "int"       int64 (float64 jika ada NULL)
+  "date"      datetime64[ns]
+  "category"  pandas Categorical (nama kecamatan, jenis, sumber)
+
+Kolom tanpa tipe dibiarkan ditebak pyarrow. Parameter query di-inline oleh psycopg2
+(cursor.mogrify, escaping yang sama dengan eksekusi biasa) karena COPY tidak menerima
+parameter. COPY dijalankan di cursor mentah, jadi tidak lewat event SQLAlchemy (profil SQL
+elt/query_profile.py tidak mencatatnya).
+
+Perbandingan waktu & memori dengan jalur lama: benchmarks/bench_fetch_frame.py
+"""
+import io
+
+from sqlalchemy import text
+
+def _arrow_types():
+    import pyarrow as pa
+    return {
+        "float": pa.float64(),
+        "int": pa.int64(),
+        "date": pa.timestamp("ns"),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+    }
+
+def inline_statement(conn, sql, params=None):
+    """SQL dengan parameter :nama sudah di-inline sebagai literal (via psycopg2.mogrify)."""
+    compiled = text(sql).compile(dialect=conn.dialect)
+    dbapi_conn = conn.connection.dbapi_connection
+    with dbapi_conn.cursor() as cur:
+        statement = cur.mogrify(str(compiled), compiled.construct_params(params or {}))
+    return statement.decode("utf-8").strip().rstrip(";")
+
+def fetch_frame(conn, sql, params=None, dtypes=None):
+    """
+    Menjalankan query SELECT dan mengembalikan DataFrame bertipe.
+    dtypes = {kolom: "float" | "int" | "date" | "category"}.
+    """
+    import pyarrow.csv as pacsv
+
+    statement = inline_statement(conn, sql, params)
+    buf = io.BytesIO()
+    with conn.connection.dbapi_connection.cursor() as cur:
+        cur.copy_expert(f"COPY ({statement}) TO STDOUT WITH (FORMAT csv, HEADER)", buf)
+    buf.seek(0)
+
+    arrow_types = _arrow_types()
+    table = pacsv.read_csv(buf, convert_options=pacsv.ConvertOptions(
+        column_types={col: arrow_types[kind] for col, kind in (dtypes or {}).items()},
+        # Postgres CSV: NULL = kosong tanpa kutip, string kosong = ""
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=False,
+    ))
+    return table.to_pandas()
@@ -0,0 +1,113 @@
+# warehouse/geo.py
+"""
+Artefak peta siap pakai untuk dashboard.
+
+GeoJSON mentah (data/kecamatan.geojson, ~4 MB) perlu geopandas + reproyeksi + pembersihan nama
+setiap kali dibaca. Di sini hasilnya dihitung sekali dan disimpan sebagai GeoJSON ringkas
+(data/kecamatan.app.geojson): EPSG:4326, nama kecamatan sudah dibersihkan, geometri
+disederhanakan, dan daftar tetangga per kecamatan (untuk realokasi armada) di properties.
+Dashboard cukup json.load() tanpa geopandas. Artefak dibangun ulang otomatis jika
+hash file sumber berubah.
+
+Cara pakai (prebuild, mis. saat build image):
+    python warehouse/geo.py
+"""
+import hashlib
+import json
+import os
+import re
+
+SOURCE_NAME = "kecamatan.geojson"
+ARTIFACT_NAME = "kecamatan.app.geojson"
+SIMPLIFY_TOLERANCE = 0.0002   # derajat (~20 m), tidak terlihat pada zoom dashboard
+COORD_PRECISION = 1e-5        # ~1 m
+
+def aggressive_clean_py(text):
+    if not isinstance(text, str): return None
+    text = text.strip().upper()
+    text = text.replace('\xa0', ' ')
+    text = re.sub(r'[^\w\s]', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+def find_data_dir():
+    path = os.environ.get("WASTE_DATA_DIR", "./data")
+    if not os.path.exists(path):
+        path = os.path.join(os.path.dirname(__file__), "..", "data")
+    return path
+
+def _sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def build_geo_artifact(data_dir=None):
+    """Membangun artefak dari GeoJSON sumber (butuh geopandas). Mengembalikan dict GeoJSON."""
+    import geopandas as gpd
+    import shapely
+
+    from warehouse.fleet_reallocation import neighbour_pairs
+
+    data_dir = data_dir or find_data_dir()
+    source = os.path.join(data_dir, SOURCE_NAME)
+
+    gdf = gpd.read_file(source).to_crs(4326)
+    if "district" in gdf.columns:
+        gdf = gdf.rename(columns={"district": "kecamatan"})
+    gdf["kecamatan"] = gdf["kecamatan"].apply(aggressive_clean_py)
+    gdf = gdf[gdf["kecamatan"].notna()].reset_index(drop=True)
+
+    # Tetangga dihitung dari geometri asli (sebelum disederhanakan)
+    neighbours = {}
+    for a, b in neighbour_pairs(gdf):
+        neighbours.setdefault(a, set()).add(b)
+        neighbours.setdefault(b, set()).add(a)
+
+    geometry = shapely.set_precision(gdf.geometry.simplify(SIMPLIFY_TOLERANCE, preserve_topology=True).values,
+                                     COORD_PRECISION)
+    features = [{
+        "type": "Feature",
+        "properties": {"kecamatan": name, "neighbours": sorted(neighbours.get(name, ()))},
+        "geometry": shapely.geometry.mapping(geom),
+    } for name, geom in zip(gdf["kecamatan"], geometry)]
+
+    artifact = {"type": "FeatureCollection", "source_sha1": _sha1(source), "features": features}
+    try:
+        with open(os.path.join(data_dir, ARTIFACT_NAME), "w", encoding="utf-8") as f:
+            json.dump(artifact, f, separators=(",", ":"))
+    except OSError:
+        pass  # direktori data read-only: artefak tetap dipakai dari memori
+    return artifact
+
+def load_geo_artifact(data_dir=None):
+    """GeoJSON ringkas untuk peta. None jika GeoJSON sumber tidak ditemukan."""
+    data_dir = data_dir or find_data_dir()
+    source = os.path.join(data_dir, SOURCE_NAME)
+    artifact_path = os.path.join(data_dir, ARTIFACT_NAME)
+    if not os.path.exists(source):
+        return None
+
+    if os.path.exists(artifact_path):
+        with open(artifact_path, encoding="utf-8") as f:
+            artifact = json.load(f)
+        if artifact.get("source_sha1") == _sha1(source):
+            return artifact
+    return build_geo_artifact(data_dir)
+
+def geo_neighbour_pairs(artifact):
+    """Pasangan tetangga (a, b) dari artefak, format sama dengan fleet_reallocation.neighbour_pairs."""
+    return [(f["properties"]["kecamatan"], n)
+            for f in artifact["features"] for n in f["properties"]["neighbours"]
+            if f["properties"]["kecamatan"] < n]
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from warehouse.city import city_data_dir, load_city_config
+
+    for city in load_city_config():
+        data_dir = city_data_dir(city["code"])
+        if not os.path.exists(os.path.join(data_dir, SOURCE_NAME)):
+            print(f"⚠️ {city['code']}: {SOURCE_NAME} tidak ditemukan di {data_dir}")
+            continue
+        artifact = build_geo_artifact(data_dir)
+        print(f"✅ Artefak peta {city['code']} dibuat: {len(artifact['features'])} kecamatan -> {ARTIFACT_NAME}")
@@ -0,0 +1,260 @@
+# warehouse/publish.py
+"""
+Publish blue/green partisi fakta satu kota.
+
+TRUNCATE lalu INSERT di transaksi terpisah membuat dashboard yang membaca di antaranya melihat
+partisi kosong / setengah terisi, dan menunggu lock TRUNCATE. Karena itu partisi baru dibangun
+utuh di skema shadow, lalu ditukar dalam satu transaksi:
+
+  1. warehouse_shadow.fact_waste_<kota> (+ sub-partisi bulan) dibuat dengan kolom & index yang
+     sama, lalu diisi dari staging; partisi live tidak disentuh
+  2. foreign key ditambahkan setelah insert (satu validasi per constraint, bukan per baris),
+     di bawah SHARE ROW EXCLUSIVE pada semua dimensi sekaligus: pembaca tidak terblokir,
+     penulis dimensi menunggu sampai commit
+  3. LOCK warehouse.fact_waste + dimensi (ACCESS EXCLUSIVE, dibutuhkan DETACH/ATTACH/DROP
+     partisi ber-FK), DETACH partisi live -> skema warehouse_prev, partisi shadow -> skema
+     warehouse, ATTACH (tanpa scan: CHECK city_id, index & FK sudah cocok)
+  4. commit: pembaca melihat versi lama atau versi baru utuh, tidak pernah di antaranya
+
+Lock di langkah 2 & 3 diambil dalam satu statement LOCK TABLE (urutan tetap) dengan
+lock_timeout pendek; jika ada query panjang atau deadlock, hanya langkah tsb yang dibatalkan
+lalu diulang, sehingga pembaca tidak mengantre lama di belakang publish. Lock eksklusif hanya
+dipegang beberapa milidetik di langkah 3. Versi sebelumnya tetap ada di warehouse_prev sampai
+publish berikutnya (rollback instan):
+    python warehouse/publish.py rollback --city jakarta
+    python warehouse/publish.py status
+
+Selama membangun, publish memegang kunci partisi kota tsb (lock_city_partition, warehouse/city.py)
+secara eksklusif: batch stream & chunk backfill kota tsb menunggu, lalu menulis ke partisi baru.
+Publish antar kota diserialkan dengan kunci global lock_fact_ddl (diambil sebelum menyentuh
+tabel apa pun): rantai per kota yang paralel di DAG / runner tidak saling deadlock di lock
+fact_waste & dimensi; tahap lain rantai kota tetap paralel.
+Tabel turunan (kubus, prakiraan, anomali) masing-masing diganti dalam satu transaksi oleh
+langkah pipeline berikutnya.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils import get_engine
+from warehouse.city import (DEFAULT_CITY, ensure_month_partitions, get_city_id, lock_city_partition, lock_fact_ddl,
+                            partition_name)
+from warehouse.retention import DETAIL_FILTER, Q_MONTH_PARTITIONS, get_detail_from
+
+logger = logging.getLogger("waste_tracker")
+
+LIVE_SCHEMA = "warehouse"
+SHADOW_SCHEMA = "warehouse_shadow"
+PREVIOUS_SCHEMA = "warehouse_prev"
+LOCK_TIMEOUT_MS = 500
+LOCK_ATTEMPTS = 20
+
+LOCK_NOT_AVAILABLE = "55P03"
+DEADLOCK_DETECTED = "40P01"
+
+Q_FOREIGN_KEYS = """
+SELECT conname, pg_get_constraintdef(oid) AS definition
+FROM pg_constraint
+WHERE conrelid = 'warehouse.fact_waste'::regclass AND contype = 'f'
+ORDER BY conname;
+"""
+
+# Dimensi yang dirujuk foreign key fact_waste, urut nama (urutan lock yang tetap)
+Q_FK_TABLES = """
+SELECT DISTINCT CAST(CAST(confrelid AS regclass) AS TEXT) AS name
+FROM pg_constraint
+WHERE conrelid = 'warehouse.fact_waste'::regclass AND contype = 'f'
+ORDER BY name;
+"""
+
+def _exists(conn, schema, city):
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL;"),
+                        {"name": f"{schema}.{partition_name(city)}"}).scalar()
+
+def _month_partitions(conn, schema, city):
+    return conn.execute(text(Q_MONTH_PARTITIONS), {"parent": f"{schema}.{partition_name(city)}"}).all()
+
+def _move(conn, city, from_schema, to_schema):
+    """Memindahkan partisi kota beserta sub-partisi bulannya ke skema lain (hanya katalog)."""
+    months = _month_partitions(conn, from_schema, city)
+    conn.execute(text(f"ALTER TABLE {from_schema}.{partition_name(city)} SET SCHEMA {to_schema};"))
+    for r in months:
+        conn.execute(text(f"ALTER TABLE {from_schema}.{r.relname} SET SCHEMA {to_schema};"))
+
+def _with_lock_retry(conn, what, fn):
+    """
+    Menjalankan fn(conn) di savepoint dengan lock_timeout pendek. Jika lock tidak didapat atau
+    terjadi deadlock, savepoint di-rollback (lock yang didapat di dalamnya ikut dilepas, query
+    lain tidak mengantre di belakang publish) lalu diulang dengan jeda yang makin panjang.
+    """
+    for attempt in range(1, LOCK_ATTEMPTS + 1):
+        savepoint = conn.begin_nested()
+        try:
+            conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT_MS}ms';"))
+            fn(conn)
+            conn.execute(text("SET LOCAL lock_timeout = DEFAULT;"))
+            savepoint.commit()
+            return attempt
+        except OperationalError as e:
+            savepoint.rollback()
+            if getattr(e.orig, "pgcode", None) not in (LOCK_NOT_AVAILABLE, DEADLOCK_DETECTED):
+                raise
+            logger.info("Publish menunggu lock %s (percobaan %d)", what, attempt)
+            time.sleep(min(0.1 * attempt, 2.0))
+    raise RuntimeError(f"Tidak mendapat lock {what} setelah {LOCK_ATTEMPTS} percobaan")
+
+def _lock_tables(conn, mode, fact_waste=False):
+    """Semua dimensi yang dirujuk FK (dan warehouse.fact_waste) dalam satu LOCK TABLE, urutan tetap."""
+    tables = conn.execute(text(Q_FK_TABLES)).scalars().all()
+    if fact_waste:
+        tables = ["warehouse.fact_waste", *tables]
+    conn.execute(text(f"LOCK TABLE {', '.join(tables)} IN {mode} MODE;"))
+
+def _swap(conn, city, city_id, incoming, outgoing):
+    """
+    Partisi live kota -> skema `outgoing`, partisi di skema `incoming` -> live. Dipanggil di dalam
+    _with_lock_retry setelah _lock_tables(ACCESS EXCLUSIVE, fact_waste=True).
+    """
+    parent = partition_name(city)
+    conn.execute(text(f"DROP TABLE IF EXISTS {outgoing}.{parent};"))
+    conn.execute(text(f"ALTER TABLE warehouse.fact_waste DETACH PARTITION {LIVE_SCHEMA}.{parent};"))
+    _move(conn, city, LIVE_SCHEMA, outgoing)
+    _move(conn, city, incoming, LIVE_SCHEMA)
+    conn.execute(text(
+        f"ALTER TABLE warehouse.fact_waste ATTACH PARTITION {LIVE_SCHEMA}.{parent} FOR VALUES IN ({int(city_id)});"
+    ))
+
+def _drop_shadow(engine, city):
+    """
+    Menghapus partisi shadow sisa rollback (versi yang digantikan, lengkap dengan FK) di transaksi
+    pendek sendiri: DROP tabel ber-FK memegang ACCESS EXCLUSIVE pada dimensi sampai commit.
+    """
+    with engine.begin() as conn:
+        lock_fact_ddl(conn)
+        if _exists(conn, SHADOW_SCHEMA, city):
+            _with_lock_retry(conn, "dimensi", lambda c: c.execute(
+                text(f"DROP TABLE {SHADOW_SCHEMA}.{partition_name(city)};")
+            ))
+
+def _build_shadow(conn, city, city_id):
+    """Membangun partisi kota baru di skema shadow dari staging. Mengembalikan jumlah baris."""
+    from warehouse.fact_waste import Q_FACT_INTO
+
+    parent = f"{SHADOW_SCHEMA}.{partition_name(city)}"
+    conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SHADOW_SCHEMA};"))
+    conn.execute(text(
+        f"CREATE TABLE {parent} (LIKE warehouse.fact_waste INCLUDING DEFAULTS INCLUDING INDEXES) "
+        f"PARTITION BY RANGE (time_id);"
+    ))
+    # CHECK ini membuat ATTACH PARTITION tidak perlu men-scan partisi untuk validasi
+    conn.execute(text(
+        f"ALTER TABLE {parent} ADD CONSTRAINT {partition_name(city)}_city_check CHECK (city_id = {int(city_id)});"
+    ))
+    ensure_month_partitions(conn, city, schema=SHADOW_SCHEMA)
+    n_rows = conn.execute(text(Q_FACT_INTO.format(
+        target=parent, source="staging.view_waste_clean", where="AND s.city = :city" + DETAIL_FILTER,
+    )), {"city": city}).rowcount
+
+    # Foreign key ditambahkan setelah insert (satu validasi per constraint, bukan per baris);
+    # saat ATTACH, constraint yang sama dengan milik parent dipakai ulang
+    foreign_keys = conn.execute(text(Q_FOREIGN_KEYS)).all()
+    def add_foreign_keys(conn):
+        _lock_tables(conn, "SHARE ROW EXCLUSIVE")
+        for fk in foreign_keys:
+            conn.execute(text(f"ALTER TABLE {parent} ADD CONSTRAINT {fk.conname} {fk.definition};"))
+    _with_lock_retry(conn, "dimensi", add_foreign_keys)
+    conn.execute(text(f"ANALYZE {parent};"))
+    return n_rows
+
+def publish_fact_waste(city=DEFAULT_CITY, engine=None):
+    """
+    Membangun ulang partisi fakta satu kota di skema shadow lalu menukarnya dengan partisi live
+    (versi lama disimpan di warehouse_prev). Mengembalikan jumlah baris fakta versi baru.
+    """
+    engine = engine or get_engine()
+    _drop_shadow(engine, city)
+    with engine.begin() as conn:
+        lock_fact_ddl(conn)
+        city_id = get_city_id(conn, city)
+        lock_city_partition(conn, city_id, exclusive=True)
+        t = time.perf_counter()
+        n_rows = _build_shadow(conn, city, city_id)
+        t_swap = time.perf_counter()
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {PREVIOUS_SCHEMA};"))
+        def swap(conn):
+            _lock_tables(conn, "ACCESS EXCLUSIVE", fact_waste=True)
+            _swap(conn, city, city_id, incoming=SHADOW_SCHEMA, outgoing=PREVIOUS_SCHEMA)
+        _with_lock_retry(conn, "fact_waste & dimensi", swap)
+    logger.info("Publish %s: %d baris (build %.2f s, swap %.1f ms)",
+                city, n_rows, t_swap - t, (time.perf_counter() - t_swap) * 1000)
+    return n_rows
+
+def rollback_fact_waste(city=DEFAULT_CITY, engine=None):
+    """
+    Mengembalikan partisi fakta kota ke versi sebelum publish terakhir (warehouse_prev).
+    Versi yang sedang live dipindah ke skema shadow. Bulan yang sementara itu sudah dipadatkan
+    retensi dibuang dari versi lama (datanya sudah ada di tier rollup).
+    Mengembalikan jumlah baris fakta yang live setelah rollback.
+    """
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        lock_fact_ddl(conn)
+        city_id = get_city_id(conn, city)
+        lock_city_partition(conn, city_id, exclusive=True)
+        if not _exists(conn, PREVIOUS_SCHEMA, city):
+            raise ValueError(f"Tidak ada versi sebelumnya untuk {city} di skema {PREVIOUS_SCHEMA}")
+        detail_from = get_detail_from(conn, city_id)
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SHADOW_SCHEMA};"))
+        def swap(conn):
+            _lock_tables(conn, "ACCESS EXCLUSIVE", fact_waste=True)
+            for r in _month_partitions(conn, PREVIOUS_SCHEMA, city):
+                if detail_from is not None and r.month < detail_from:
+                    conn.execute(text(f"DROP TABLE {PREVIOUS_SCHEMA}.{r.relname};"))
+            ensure_month_partitions(conn, city, schema=PREVIOUS_SCHEMA)
+            _swap(conn, city, city_id, incoming=PREVIOUS_SCHEMA, outgoing=SHADOW_SCHEMA)
+        _with_lock_retry(conn, "fact_waste & dimensi", swap)
+        return conn.execute(text(f"SELECT COUNT(*) FROM warehouse.{partition_name(city)};")).scalar()
+
+def publish_status(conn, city):
+    """{skema: jumlah baris atau None} untuk versi live, sebelumnya, dan shadow satu kota."""
+    status = {}
+    for schema in (LIVE_SCHEMA, PREVIOUS_SCHEMA, SHADOW_SCHEMA):
+        status[schema] = None
+        if _exists(conn, schema, city):
+            status[schema] = conn.execute(text(f"SELECT COUNT(*) FROM {schema}.{partition_name(city)};")).scalar()
+    return status
+
+if __name__ == "__main__":
+    from warehouse.cube import refresh_cube_waste
+    from warehouse.etl_runs import record_etl_run
+    from warehouse.result_cache import prewarm_result_cache
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Publish blue/green partisi fact_waste")
+    parser.add_argument("command", choices=["status", "rollback"])
+    parser.add_argument("--city", default=DEFAULT_CITY)
+    args = parser.parse_args()
+
+    if args.command == "status":
+        with get_engine().connect() as conn:
+            for schema, n_rows in publish_status(conn, args.city).items():
+                print(f"{schema:<18} {'-' if n_rows is None else f'{n_rows} baris'}")
+        sys.exit(0)
+
+    try:
+        n_rows = rollback_fact_waste(args.city)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"⏪ Fakta {args.city} dikembalikan ke versi sebelumnya ({n_rows} baris).")
+    n_days = refresh_cube_waste(args.city)
+    version = record_etl_run(city=args.city)
+    _, n_queries = prewarm_result_cache(city=args.city)
+    print(f"✅ Kubus diperbarui ({n_days} hari), versi data {version}"
+          + (f", cache dashboard diisi ulang ({n_queries} query)." if n_queries else "."))
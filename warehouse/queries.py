@@ -0,0 +1,252 @@
+from sqlalchemy import text
+
+from warehouse.frames import fetch_frame
+
+# Query baca bersama untuk dashboard (streamlit/app.py) dan read API (api/server.py).
+# Filter bersifat opsional: parameter NULL berarti tanpa batas.
+# city_id selalu diisi oleh dashboard & API: nilainya dikirim sebagai literal (psycopg2),
+# sehingga planner memangkas fact_waste ke satu partisi kota saat planning.
+# Hasil tabel dibaca lewat fetch_frame (COPY -> pyarrow, kolom bertipe); pyarrow & pandas diimpor
+# di dalamnya, sehingga ringkasan untuk header dashboard tidak membutuhkannya.
+
+# Fakta dibaca dari dua tier (warehouse/retention.py): detail harian warehouse.fact_waste dan
+# warehouse.fact_waste_rollup untuk tanggal yang sudah dipadatkan (per minggu/bulan). Kedua tier
+# tidak pernah tumpang tindih. Baris rollup ikut dihitung utuh jika periodenya beririsan
+# dengan rentang tanggal, dan n_rows-nya = jumlah baris detail yang diwakilinya.
+
+# Ringkasan kecil untuk render pertama dashboard (rentang tanggal & daftar kecamatan)
+Q_SUMMARY = """
+SELECT
+    LEAST(
+        (SELECT MIN(t.date) FROM warehouse.dim_time t
+         WHERE EXISTS (SELECT 1 FROM warehouse.fact_waste f
+                       WHERE f.time_id = t.id AND (CAST(:city_id AS SMALLINT) IS NULL OR f.city_id = :city_id))),
+        (SELECT MIN(r.period_start) FROM warehouse.fact_waste_rollup r
+         WHERE CAST(:city_id AS SMALLINT) IS NULL OR r.city_id = :city_id)) AS min_date,
+    GREATEST(
+        (SELECT MAX(t.date) FROM warehouse.dim_time t
+         WHERE EXISTS (SELECT 1 FROM warehouse.fact_waste f
+                       WHERE f.time_id = t.id AND (CAST(:city_id AS SMALLINT) IS NULL OR f.city_id = :city_id))),
+        (SELECT MAX(r.period_end) FROM warehouse.fact_waste_rollup r
+         WHERE CAST(:city_id AS SMALLINT) IS NULL OR r.city_id = :city_id)) AS max_date,
+    ARRAY(SELECT l.kecamatan FROM warehouse.dim_location l
+          WHERE EXISTS (SELECT 1 FROM warehouse.fact_waste f
+                        WHERE f.location_id = l.id AND (CAST(:city_id AS SMALLINT) IS NULL OR f.city_id = :city_id))
+             OR EXISTS (SELECT 1 FROM warehouse.fact_waste_rollup r
+                        WHERE r.location_id = l.id AND (CAST(:city_id AS SMALLINT) IS NULL OR r.city_id = :city_id))
+          ORDER BY l.kecamatan) AS kecamatan;
+"""
+
+# Baris kedua tier dalam rentang tanggal: (period_start, days, location_id, fleet_id, volume_kg, n_rows).
+# Detail sudah dijumlahkan per (tanggal, kecamatan, armada) agar bentuknya sama dengan rollup.
+# Filter time_id (smart key yyyymmdd) memangkas sub-partisi bulan di luar rentang.
+Q_TIERS = """
+SELECT t.date AS period_start, 1 AS days, f.location_id, f.fleet_id,
+       SUM(f.volume_kg) AS volume_kg, COUNT(*) AS n_rows
+FROM warehouse.fact_waste f
+JOIN warehouse.dim_time t ON f.time_id = t.id
+WHERE (CAST(:start_date AS DATE) IS NULL OR t.date >= :start_date)
+  AND (CAST(:end_date AS DATE) IS NULL OR t.date <= :end_date)
+  AND (CAST(:start_date AS DATE) IS NULL OR f.time_id >= CAST(to_char(CAST(:start_date AS DATE), 'YYYYMMDD') AS INTEGER))
+  AND (CAST(:end_date AS DATE) IS NULL OR f.time_id <= CAST(to_char(CAST(:end_date AS DATE), 'YYYYMMDD') AS INTEGER))
+  AND (CAST(:city_id AS SMALLINT) IS NULL OR f.city_id = :city_id)
+GROUP BY t.date, f.location_id, f.fleet_id
+UNION ALL
+SELECT r.period_start, r.period_end - r.period_start + 1, r.location_id, r.fleet_id,
+       SUM(r.volume_kg), SUM(r.n_rows)
+FROM warehouse.fact_waste_rollup r
+WHERE (CAST(:start_date AS DATE) IS NULL OR r.period_end >= :start_date)
+  AND (CAST(:end_date AS DATE) IS NULL OR r.period_start <= :end_date)
+  AND (CAST(:city_id AS SMALLINT) IS NULL OR r.city_id = :city_id)
+GROUP BY r.period_start, r.period_end, r.location_id, r.fleet_id
+"""
+
+Q_TOTAL = f"""
+SELECT COALESCE(SUM(x.volume_kg), 0) / 1000.0 AS total_ton, COALESCE(SUM(x.n_rows), 0) AS n_rows
+FROM ({Q_TIERS}) x
+JOIN warehouse.dim_location l ON x.location_id = l.id
+WHERE CAST(:kecamatan AS TEXT[]) IS NULL OR l.kecamatan = ANY(:kecamatan);
+"""
+
+# days = jumlah hari yang diwakili baris (1 untuk detail, panjang periode untuk rollup)
+Q_DAILY = f"""
+SELECT x.period_start::date as date, l.kecamatan, SUM(x.volume_kg) / 1000.0 as volume, MAX(x.days) AS days
+FROM ({Q_TIERS}) x
+JOIN warehouse.dim_location l ON x.location_id = l.id
+WHERE CAST(:kecamatan AS TEXT[]) IS NULL OR l.kecamatan = ANY(:kecamatan)
+GROUP BY x.period_start, l.kecamatan
+ORDER BY x.period_start, l.kecamatan;
+"""
+
+# Tren total harian (semua kecamatan terpilih) yang sudah di-downsample di database: tanggal
+# dikelompokkan ke bucket :bucket_days hari sejak :start_date (lihat trend_bucket_days), per
+# bucket dikirim rata-rata, minimum & maksimum total harian. Garis rata-rata + pita min/max
+# tetap menampilkan lonjakan satu hari, dan jumlah titik tetap <= TREND_POINTS berapa pun
+# panjang rentangnya. Baris rollup retensi dihitung sebagai rata-rata hariannya (volume / days)
+# pada tanggal awal periode, sama seperti grafik harian sebelumnya.
+Q_TREND = f"""
+WITH daily AS (
+    SELECT GREATEST(x.period_start::date, CAST(:start_date AS DATE)) AS date,
+           SUM(x.volume_kg / x.days) / 1000.0 AS volume
+    FROM ({Q_TIERS}) x
+    JOIN warehouse.dim_location l ON x.location_id = l.id
+    WHERE CAST(:kecamatan AS TEXT[]) IS NULL OR l.kecamatan = ANY(:kecamatan)
+    GROUP BY 1
+)
+SELECT CAST(:start_date AS DATE) + (d.date - CAST(:start_date AS DATE)) / :bucket_days * :bucket_days AS date,
+       AVG(d.volume) AS volume, MIN(d.volume) AS volume_min, MAX(d.volume) AS volume_max, COUNT(*) AS n_points
+FROM daily d
+GROUP BY 1
+ORDER BY 1;
+"""
+
+# Lebar plot tren di layout wide ~ 1000-1300 px: 400 titik sudah lebih rapat dari yang bisa
+# dibedakan mata, tanpa membebani browser
+TREND_POINTS = 400
+
+# fact_waste.fleet_id sudah menunjuk ke versi armada yang berlaku pada tanggal baris tsb
+# (di-resolve saat load_fact_waste), sehingga periode historis dibandingkan dengan
+# kapasitas armada saat itu, bukan armada hari ini, cukup dengan equi-join biasa.
+# Rata-rata per baris detail dihitung sebagai rata-rata berbobot n_rows (sama persis untuk
+# tier detail maupun rollup).
+Q_FLEET = f"""
+SELECT
+    l.kecamatan,
+    SUM(fl.armada_total * x.n_rows) / SUM(x.n_rows)::NUMERIC AS armada_total,
+    SUM(fl.armada_operasional * x.n_rows) / SUM(x.n_rows)::NUMERIC AS armada_operasional,
+    SUM(fl.ritase_harian * x.n_rows) / SUM(x.n_rows) AS ritase_harian,
+    SUM(fl.kapasitas_m3 * x.n_rows) / SUM(x.n_rows) AS kapasitas_m3,
+    SUM(x.volume_kg) / SUM(x.n_rows) / 1000.0 AS avg_daily_waste_ton
+FROM ({Q_TIERS}) x
+JOIN warehouse.dim_location l ON x.location_id = l.id
+JOIN warehouse.dim_fleet fl ON fl.id = x.fleet_id
+WHERE CAST(:kecamatan AS TEXT[]) IS NULL OR l.kecamatan = ANY(:kecamatan)
+GROUP BY l.kecamatan
+ORDER BY l.kecamatan;
+"""
+
+# Komposisi volume per jenis/sumber, dibaca hanya dari kubus warehouse.cube_waste:
+# bulan yang seluruhnya berada di dalam rentang diambil dari baris grain 'month',
+# sisa hari di tepi rentang dari baris grain 'day'.
+Q_CUBE_BREAKDOWN = """
+WITH rng AS (
+    SELECT CAST(date_trunc('month', CAST(:start_date AS DATE) - 1) + INTERVAL '1 month' AS DATE) AS m_from,
+           CAST(date_trunc('month', CAST(:end_date AS DATE) + 1) AS DATE) AS m_to
+)
+SELECT COALESCE(d.name, 'Tidak diketahui') AS name, SUM(cw.volume_kg) / 1000.0 AS volume
+FROM warehouse.cube_waste cw
+CROSS JOIN rng
+LEFT JOIN warehouse.{dim_table} d ON d.id = cw.{key_col}
+LEFT JOIN warehouse.dim_location l ON l.id = cw.location_id
+WHERE cw.gset = :gset
+  AND (CAST(:city_id AS SMALLINT) IS NULL OR cw.city_id = :city_id)
+  AND (
+      (cw.grain = 'month' AND cw.period_start >= rng.m_from AND cw.period_start < rng.m_to)
+      OR (cw.grain = 'day' AND cw.period_start >= :start_date AND cw.period_start <= :end_date
+          AND NOT (cw.period_start >= rng.m_from AND cw.period_start < rng.m_to))
+  )
+  AND (CAST(:kecamatan AS TEXT[]) IS NULL OR l.kecamatan = ANY(:kecamatan))
+GROUP BY 1
+ORDER BY 2 DESC;
+"""
+
+# Peluang overload per kecamatan dari simulasi Monte Carlo terakhir (warehouse/capacity_risk.py)
+Q_CAPACITY_RISK = """
+SELECT l.kecamatan, r.p_overload, r.p_critical, r.expected_shortfall_ton
+FROM warehouse.capacity_risk r
+JOIN warehouse.dim_location l ON r.location_id = l.id
+WHERE l.city_id = :city_id;
+"""
+
+# dimensi -> (tabel kamus, kolom key, gset tanpa filter kecamatan, gset per kecamatan);
+# nilai gset = GSET_CATEGORY/GSET_SOURCE & GSET_LOCATION_* di warehouse/cube.py
+CUBE_BREAKDOWN_DIMS = {
+    "category": ("dim_category", "category_id", 5, 1),
+    "source": ("dim_source", "source_id", 6, 2),
+}
+
+FLEET_NUMERIC = ['armada_total', 'armada_operasional', 'ritase_harian', 'kapasitas_m3', 'avg_daily_waste_ton']
+
+# Tipe kolom hasil (warehouse/frames.py)
+DAILY_DTYPES = {"date": "date", "kecamatan": "category", "volume": "float", "days": "int"}
+TREND_DTYPES = {"date": "date", "volume": "float", "volume_min": "float", "volume_max": "float", "n_points": "int"}
+FLEET_DTYPES = {"kecamatan": "category", **{col: "float" for col in FLEET_NUMERIC}}
+CAPACITY_RISK_DTYPES = {"kecamatan": "category", "p_overload": "float", "p_critical": "float",
+                        "expected_shortfall_ton": "float"}
+
+def _kecamatan_param(kecamatan):
+    return list(kecamatan) if kecamatan else None
+
+def fetch_cities(conn):
+    """Kota terdaftar: [{id, code, name, center_lat, center_lon, zoom}], urut nama."""
+    return [dict(r) for r in conn.execute(text("""
+    SELECT id, code, name, center_lat, center_lon, zoom FROM warehouse.dim_city ORDER BY name, code;
+    """)).mappings()]
+
+def fetch_summary(conn, city_id=None):
+    """(min_date, max_date, [kecamatan]) untuk data yang ada di fact_waste (kedua tier)."""
+    row = conn.execute(text(Q_SUMMARY), {"city_id": city_id}).one()
+    return row.min_date, row.max_date, list(row.kecamatan)
+
+def fetch_total_volume(conn, start_date, end_date, kecamatan=None, city_id=None):
+    """(total ton, jumlah baris fakta) pada rentang tanggal & kecamatan terpilih."""
+    row = conn.execute(text(Q_TOTAL), {
+        "start_date": start_date, "end_date": end_date, "kecamatan": _kecamatan_param(kecamatan),
+        "city_id": city_id,
+    }).one()
+    return float(row.total_ton), int(row.n_rows)
+
+def fetch_daily(conn, start_date=None, end_date=None, kecamatan=None, city_id=None):
+    """
+    Volume harian (ton) per kecamatan. Kolom: date (datetime64), kecamatan (category),
+    volume (float64), days.
+    Untuk tanggal yang sudah dipadatkan retensi, satu baris = total satu periode rollup
+    (date = awal periode, days = panjang periode); volume / days = rata-rata harian.
+    """
+    df = fetch_frame(conn, Q_DAILY, {
+        "start_date": start_date, "end_date": end_date, "kecamatan": _kecamatan_param(kecamatan),
+        "city_id": city_id,
+    }, dtypes=DAILY_DTYPES)
+    df['volume'] = df['volume'].fillna(0)
+    return df
+
+def trend_bucket_days(start_date, end_date, max_points=TREND_POINTS):
+    """Panjang bucket (hari) agar rentang start_date..end_date menjadi paling banyak max_points titik."""
+    n_days = (end_date - start_date).days + 1
+    return max(1, -(-n_days // max_points))
+
+def fetch_trend(conn, start_date, end_date, kecamatan=None, city_id=None, max_points=TREND_POINTS):
+    """
+    Tren total harian (ton) yang sudah di-downsample (Q_TREND). Kolom: date (awal bucket),
+    volume (rata-rata harian), volume_min, volume_max, n_points. Panjang bucket:
+    trend_bucket_days(start_date, end_date, max_points); 1 = tanpa downsampling.
+    """
+    df = fetch_frame(conn, Q_TREND, {
+        "start_date": start_date, "end_date": end_date, "kecamatan": _kecamatan_param(kecamatan),
+        "city_id": city_id, "bucket_days": trend_bucket_days(start_date, end_date, max_points),
+    }, dtypes=TREND_DTYPES)
+    df[['volume', 'volume_min', 'volume_max']] = df[['volume', 'volume_min', 'volume_max']].fillna(0)
+    return df
+
+def fetch_fleet_analysis(conn, start_date, end_date, kecamatan=None, city_id=None):
+    """Rata-rata armada (versi yang berlaku) dan beban harian per kecamatan pada rentang tanggal."""
+    df_fleet = fetch_frame(conn, Q_FLEET, {
+        "start_date": start_date, "end_date": end_date, "kecamatan": _kecamatan_param(kecamatan),
+        "city_id": city_id,
+    }, dtypes=FLEET_DTYPES)
+    df_fleet[FLEET_NUMERIC] = df_fleet[FLEET_NUMERIC].fillna(0)
+    return df_fleet
+
+def fetch_capacity_risk(conn, city_id):
+    """Risiko overload per kecamatan satu kota. Kolom: kecamatan, p_overload, p_critical, expected_shortfall_ton."""
+    return fetch_frame(conn, Q_CAPACITY_RISK, {"city_id": city_id}, dtypes=CAPACITY_RISK_DTYPES)
+
+def fetch_cube_breakdown(conn, dim, start_date, end_date, kecamatan=None, city_id=None):
+    """Total volume (ton) per jenis ('category') atau sumber ('source') dari kubus. Kolom: name, volume."""
+    dim_table, key_col, gset_all, gset_location = CUBE_BREAKDOWN_DIMS[dim]
+    df = fetch_frame(conn, Q_CUBE_BREAKDOWN.format(dim_table=dim_table, key_col=key_col), {
+        "start_date": start_date, "end_date": end_date, "kecamatan": _kecamatan_param(kecamatan),
+        "gset": gset_location if kecamatan else gset_all, "city_id": city_id,
+    }, dtypes={"name": "category", "volume": "float"})
+    df['volume'] = df['volume'].fillna(0)
+    return df
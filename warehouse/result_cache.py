@@ -0,0 +1,315 @@
+# warehouse/result_cache.py
+"""
+Cache hasil query bersama (berbasis file SQLite) untuk semua proses dashboard di satu host.
+
+@st.cache_data hanya hidup di memori satu proses: tiap replika menghitung ulang query yang
+sama dan tetap menyajikan data lama setelah load malam sampai di-restart. Di sini hasil
+query disimpan di disk dengan kunci (nama query, parameter) dan dicatat bersama kota dan versi
+data kota tsb (id run ELT terakhir kota itu di warehouse.etl_runs). Entri dengan versi lain
+dianggap basi dan tidak pernah dikembalikan; load satu kota tidak membuat cache kota lain basi.
+Setelah pipeline menaikkan versi, prewarm_result_cache(city=...) mengisi ulang query yang paling
+sering dibuka (tampilan default dashboard) untuk kota yang baru di-load.
+
+Ukuran file dibatasi (WASTE_CACHE_MAX_MB, default 256): entri yang paling lama tidak
+diakses dibuang lebih dulu (LRU). Kegagalan cache (file terkunci, disk penuh, dst.) tidak
+menggagalkan query; hasil tetap dihitung langsung dari database.
+
+Nilai disimpan tanpa pickle: DataFrame sebagai Arrow IPC, nilai kecil (ringkasan, total) sebagai
+JSON, sehingga isi file cache tidak bisa menjalankan kode. Direktori default bersifat privat per
+user (mode 0700), dan file / direktori cache yang bukan milik user proses ini ditolak (cache
+dinonaktifkan): proses dashboard & pipeline yang berbagi cache harus berjalan sebagai user yang sama.
+
+Konfigurasi:
+    WASTE_CACHE_PATH    lokasi file (default: $XDG_CACHE_HOME atau ~/.cache, subdirektori
+                        waste_tracker/results.sqlite)
+    WASTE_CACHE_MAX_MB  batas ukuran total nilai ter-cache
+
+Prewarm dari pipeline (DAG Airflow, elt/runner.py, CLI backfill/retensi/publish) hanya berguna
+jika file yang ditulisnya adalah file yang dibaca dashboard: set WASTE_CACHE_PATH di kedua sisi
+ke lokasi bersama (host yang sama atau volume bersama). Tanpa WASTE_CACHE_PATH, default per user di
+worker pipeline hampir pasti bukan file dashboard, sehingga prewarm dilewati dengan peringatan
+di log; dashboard tetap mengisi cache sendiri saat query pertama.
+Prewarm manual di host dashboard:
+    python warehouse/result_cache.py
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+logger = logging.getLogger("waste_tracker")
+
+DEFAULT_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                           "waste_tracker")
+DEFAULT_PATH = os.path.join(DEFAULT_DIR, "results.sqlite")
+DEFAULT_MAX_MB = 256
+# Dinaikkan setiap kali bentuk/tipe DataFrame hasil query berubah (kolom baru, dtype), agar entri
+# lama dengan versi data yang sama tidak dikembalikan. 2: kolom days (retensi), 3: dtype Arrow
+# (warehouse/frames.py), 4: Arrow IPC / JSON menggantikan pickle
+RESULT_FORMAT = 4
+# Versi skema file cache (PRAGMA user_version); file dengan skema lama dibuang saat dibuka.
+# 2: kolom city_id (versi data per kota), 3: nilai Arrow IPC / JSON (entri pickle dibuang)
+CACHE_SCHEMA = 3
+
+# Penanda jenis blob nilai
+ARROW_TAG = b"A"
+JSON_TAG = b"J"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    city_id INTEGER,
+    version INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    value BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed_idx ON results (accessed);
+"""
+
+# Buang entri tertua (berdasarkan waktu akses) sampai total ukuran <= batas
+Q_EVICT = """
+DELETE FROM results WHERE key IN (
+    SELECT key FROM (
+        SELECT key, SUM(size) OVER (ORDER BY accessed DESC, key) AS running FROM results
+    ) WHERE running > ?
+);
+"""
+
+
+def _to_json(value):
+    """Tuple & tanggal ditandai agar kembali ke tipe aslinya saat dibaca (JSON hanya punya list & string)."""
+    if isinstance(value, tuple):
+        return {"__tuple__": [_to_json(v) for v in value]}
+    if isinstance(value, list):
+        return [_to_json(v) for v in value]
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError(f"Tipe {type(value).__name__} tidak bisa disimpan di cache hasil")
+
+def _from_json(obj):
+    if "__tuple__" in obj:
+        return tuple(obj["__tuple__"])
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return date.fromisoformat(obj["__date__"])
+    return obj
+
+def encode_value(value):
+    """Nilai hasil query -> blob: DataFrame sebagai Arrow IPC, selain itu JSON."""
+    import pandas as pd
+
+    if isinstance(value, pd.DataFrame):
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(value, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return ARROW_TAG + sink.getvalue()
+    return JSON_TAG + json.dumps(_to_json(value)).encode("utf-8")
+
+def decode_value(blob):
+    """Kebalikan encode_value. ValueError untuk blob yang tidak dikenal."""
+    tag, body = bytes(blob[:1]), bytes(blob[1:])
+    if tag == ARROW_TAG:
+        import pyarrow as pa
+        return pa.ipc.open_stream(body).read_all().to_pandas()
+    if tag == JSON_TAG:
+        return json.loads(body, object_hook=_from_json)
+    raise ValueError(f"Format nilai cache tidak dikenal: {tag!r}")
+
+def _check_owner(path):
+    """Menolak file / direktori milik user lain (bisa disiapkan lebih dulu oleh user lokal lain)."""
+    if hasattr(os, "getuid") and os.path.exists(path) and os.stat(path).st_uid != os.getuid():
+        raise PermissionError(f"{path} bukan milik user proses ini")
+
+
+class ResultCache:
+    """Cache (nama query, parameter) -> hasil, per versi data, di file SQLite bersama."""
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or os.environ.get("WASTE_CACHE_PATH", DEFAULT_PATH)
+        self.max_bytes = max_bytes or int(os.environ.get("WASTE_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024
+        self.enabled = True
+        try:
+            if self.path == DEFAULT_PATH:
+                os.makedirs(DEFAULT_DIR, mode=0o700, exist_ok=True)
+                _check_owner(DEFAULT_DIR)
+                os.chmod(DEFAULT_DIR, 0o700)
+            _check_owner(self.path)
+            with self._connect() as db:
+                db.execute("PRAGMA journal_mode=WAL;")
+                if db.execute("PRAGMA user_version;").fetchone()[0] != CACHE_SCHEMA:
+                    db.execute("DROP TABLE IF EXISTS results;")
+                db.executescript(SCHEMA)
+                db.execute(f"PRAGMA user_version = {CACHE_SCHEMA};")
+            os.chmod(self.path, 0o600)
+        except (sqlite3.Error, OSError) as e:
+            # Mis. direktori read-only / milik user lain: query tetap jalan, hanya tanpa cache
+            logger.warning("Cache hasil dinonaktifkan (%s): %s", self.path, e)
+            self.enabled = False
+
+    @contextmanager
+    def _connect(self):
+        # Koneksi baru per operasi (commit lalu ditutup): aman dari banyak thread Streamlit & banyak proses
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def make_key(name, params):
+        return hashlib.sha1(repr((RESULT_FORMAT, name, params)).encode()).hexdigest()
+
+    def get(self, name, version, params):
+        """Hasil ter-cache untuk versi data ini, atau None."""
+        key = self.make_key(name, params)
+        with self._connect() as db:
+            row = db.execute("SELECT value FROM results WHERE key = ? AND version = ?;", (key, version)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE results SET accessed = ? WHERE key = ?;", (time.time(), key))
+        return decode_value(row[0])
+
+    def put(self, name, version, params, value, city_id=None):
+        blob = encode_value(value)
+        if len(blob) > self.max_bytes:
+            return
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO results (key, name, city_id, version, size, accessed, value) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?);",
+                (self.make_key(name, params), name, city_id, version, len(blob), time.time(), blob),
+            )
+            # Versi lama kota ini tidak akan dibaca lagi: langsung dibuang agar tidak memakan kuota LRU
+            db.execute("DELETE FROM results WHERE city_id IS ? AND version < ?;", (city_id, version))
+            db.execute(Q_EVICT, (self.max_bytes,))
+
+    def get_or_compute(self, name, version, params, compute, city_id=None):
+        """
+        Ambil dari cache, atau jalankan compute() lalu simpan hasilnya. version = versi data
+        kota city_id (get_data_version(conn, kode kota)).
+        """
+        if not self.enabled:
+            return compute()
+        try:
+            value = self.get(name, version, params)
+            if value is not None:
+                return value
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning("Cache hasil tidak bisa dibaca (%s): %s", name, e)
+
+        value = compute()
+        try:
+            self.put(name, version, params, value, city_id)
+        except (sqlite3.Error, ValueError, TypeError) as e:
+            logger.warning("Cache hasil tidak bisa ditulis (%s): %s", name, e)
+        return value
+
+    def stats(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0), MAX(version) FROM results;").fetchone()
+
+
+# --- QUERY DASHBOARD YANG DI-CACHE ---
+# Nama & parameter di sini dipakai bersama oleh streamlit/app.py dan prewarm_result_cache(),
+# sehingga kunci hasil prewarm sama persis dengan kunci yang dicari dashboard. `version` adalah
+# versi data kota city_id.
+
+def cached_summary(cache, conn, version, city_id=None):
+    from warehouse.queries import fetch_summary
+    return cache.get_or_compute("summary", version, (city_id,), lambda: fetch_summary(conn, city_id), city_id)
+
+def cached_total_volume(cache, conn, version, start_date, end_date, kecamatan=(), city_id=None):
+    from warehouse.queries import fetch_total_volume
+    return cache.get_or_compute("total_volume", version, (city_id, start_date, end_date, tuple(kecamatan)),
+                                lambda: fetch_total_volume(conn, start_date, end_date, kecamatan, city_id), city_id)
+
+def cached_daily(cache, conn, version, start_date, end_date, kecamatan=(), city_id=None):
+    from warehouse.queries import fetch_daily
+    return cache.get_or_compute("daily", version, (city_id, start_date, end_date, tuple(kecamatan)),
+                                lambda: fetch_daily(conn, start_date, end_date, kecamatan, city_id), city_id)
+
+def cached_trend(cache, conn, version, start_date, end_date, kecamatan=(), city_id=None, max_points=None):
+    from warehouse.queries import TREND_POINTS, fetch_trend
+    max_points = max_points or TREND_POINTS
+    return cache.get_or_compute("trend", version, (city_id, start_date, end_date, tuple(kecamatan), max_points),
+                                lambda: fetch_trend(conn, start_date, end_date, kecamatan, city_id, max_points),
+                                city_id)
+
+def cached_breakdown(cache, conn, version, dim, start_date, end_date, kecamatan=(), city_id=None):
+    from warehouse.queries import fetch_cube_breakdown
+    return cache.get_or_compute(f"breakdown_{dim}", version, (city_id, start_date, end_date, tuple(kecamatan)),
+                                lambda: fetch_cube_breakdown(conn, dim, start_date, end_date, kecamatan, city_id),
+                                city_id)
+
+def cached_fleet_analysis(cache, conn, version, start_date, end_date, city_id=None):
+    from warehouse.queries import fetch_fleet_analysis
+    return cache.get_or_compute("fleet_analysis", version, (city_id, start_date, end_date),
+                                lambda: fetch_fleet_analysis(conn, start_date, end_date, city_id=city_id), city_id)
+
+def prewarm_result_cache(cache=None, engine=None, city=None):
+    """
+    Mengisi cache untuk tampilan default dashboard (seluruh rentang tanggal, semua kecamatan)
+    pada versi data terbaru kota `city`, atau semua kota jika None. Dipanggil pipeline tepat
+    setelah record_etl_run(city=...) untuk kota yang baru di-load.
+    Tanpa `cache` dan tanpa WASTE_CACHE_PATH, prewarm dilewati (lihat docstring modul).
+    Mengembalikan (versi terbesar, jumlah query).
+    """
+    from warehouse.etl_runs import get_data_version
+    from warehouse.queries import fetch_cities
+
+    if cache is None and not os.environ.get("WASTE_CACHE_PATH"):
+        logger.warning("Prewarm cache hasil dilewati: WASTE_CACHE_PATH belum di-set ke lokasi yang "
+                       "dibaca dashboard (default %s hanya lokal untuk proses ini)", DEFAULT_PATH)
+        return 0, 0
+    if engine is None:
+        from utils import get_engine
+        engine = get_engine()
+    cache = cache or ResultCache()
+
+    n_queries, versions = 0, [0]
+    with engine.connect() as conn:
+        for row in fetch_cities(conn):
+            if city is not None and row["code"] != city:
+                continue
+            city_id = row["id"]
+            version = get_data_version(conn, row["code"])
+            versions.append(version)
+            min_date, max_date, _ = cached_summary(cache, conn, version, city_id)
+            n_queries += 1
+            if min_date is None:
+                continue
+
+            cached_total_volume(cache, conn, version, min_date, max_date, city_id=city_id)
+            cached_daily(cache, conn, version, min_date, max_date, city_id=city_id)
+            cached_trend(cache, conn, version, min_date, max_date, city_id=city_id)
+            for dim in ("category", "source"):
+                cached_breakdown(cache, conn, version, dim, min_date, max_date, city_id=city_id)
+            cached_fleet_analysis(cache, conn, version, min_date, max_date, city_id=city_id)
+            n_queries += 7
+    return max(versions), n_queries
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    # Dijalankan di host dashboard: path default pun adalah file yang dibaca dashboard
+    cache = ResultCache()
+    version, n_queries = prewarm_result_cache(cache)
+    n_entries, size, _ = cache.stats()
+    print(f"🔥 Cache hasil diisi untuk versi data {version}: {n_queries} query "
+          f"({n_entries} entri, {size / 1024:.0f} KB)")
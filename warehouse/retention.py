@@ -0,0 +1,207 @@
+# warehouse/retention.py
+"""
+Retensi fact_waste: detail harian lama dipadatkan menjadi rollup mingguan/bulanan.
+
+fact_waste tumbuh tanpa batas, padahal dashboard jarang butuh detail per baris yang lebih
+tua dari setahun. Detail disimpan per bulan (sub-partisi warehouse.fact_waste_<kota>_<yyyymm>,
+lihat warehouse/city.py), sehingga tiap bulan yang seluruh harinya lebih tua dari masa
+retensi dipadatkan dalam SATU transaksi:
+
+  1. jumlahkan isi partisi bulan tsb ke warehouse.fact_waste_rollup per (periode, kecamatan,
+     versi armada, jenis, sumber); total volume & jumlah baris tetap sama
+  2. DETACH partisi bulan tsb, lalu DROP (atau pindahkan ke skema archive)
+  3. majukan batas tier kota tsb (warehouse.fact_retention.detail_from)
+
+Sejak itu tanggal < detail_from hanya ada di tier rollup: load_fact_waste tidak me-load ulang
+tanggal tsb dari staging, refresh kubus tidak menyentuh harinya (baris kubus lama tetap
+dipakai), backfill menolak rentang tsb, dan event stream yang terlambat ditambahkan langsung
+ke rollup. Query dashboard (warehouse/queries.py) menggabungkan kedua tier.
+
+Umur dihitung dari tanggal data terbaru kota tsb (bukan tanggal hari ini), agar data historis
+yang baru di-load tidak langsung habis dipadatkan. Kebijakan per kota di data/cities.json:
+    "retention_days": 365 (default; null = tanpa retensi), "rollup_grain": "month" / "week"
+
+Cara pakai:
+    python warehouse/retention.py --city jakarta
+    python warehouse/retention.py --city jakarta --keep-days 400 --grain week --archive
+    python warehouse/retention.py --status
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import timedelta
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils import get_engine
+from warehouse.city import (DEFAULT_CITY, get_city, get_city_id, lock_city_partition, lock_fact_ddl, month_partition_name,
+                            next_month, partition_name)
+
+logger = logging.getLogger("waste_tracker")
+
+DEFAULT_KEEP_DAYS = 365
+DEFAULT_GRAIN = "month"
+ARCHIVE_SCHEMA = "archive"
+
+# grain -> (awal periode, akhir periode inklusif) dari t.date; minggu dipotong di batas bulan
+MONTH_START = "CAST(date_trunc('month', t.date) AS DATE)"
+MONTH_END = "CAST(date_trunc('month', t.date) + INTERVAL '1 month' - INTERVAL '1 day' AS DATE)"
+WEEK_START = "CAST(date_trunc('week', t.date) AS DATE)"
+GRAIN_PERIOD = {
+    "week": (f"GREATEST({WEEK_START}, {MONTH_START})", f"LEAST({WEEK_START} + 6, {MONTH_END})"),
+    "month": (MONTH_START, MONTH_END),
+}
+
+# Filter untuk Q_FACT_SELECT (warehouse/fact_waste.py, alias s = staging, ci = dim_city):
+# hanya tanggal yang masih berada di tier detail kota tsb, atau sebaliknya
+DETAIL_FILTER = """
+  AND s.tanggal >= COALESCE((SELECT r.detail_from FROM warehouse.fact_retention r WHERE r.city_id = ci.id),
+                            DATE '-infinity')"""
+COMPACTED_FILTER = """
+  AND s.tanggal < (SELECT r.detail_from FROM warehouse.fact_retention r WHERE r.city_id = ci.id)"""
+
+# {source} harus punya kolom time_id, city_id, location_id, fleet_id, category_id, source_id, volume_kg.
+# Upsert aditif: dipakai untuk memadatkan satu partisi bulan maupun menambahkan event terlambat.
+Q_ROLLUP = """
+INSERT INTO warehouse.fact_waste_rollup AS r
+    (city_id, grain, period_start, period_end, location_id, fleet_id, category_id, source_id, volume_kg, n_rows)
+SELECT
+    f.city_id, '{grain}', {start}, {end}, f.location_id, f.fleet_id, f.category_id, f.source_id,
+    SUM(f.volume_kg), COUNT(*)
+FROM {source} f
+JOIN warehouse.dim_time t ON f.time_id = t.id
+WHERE TRUE {where}
+GROUP BY f.city_id, {start}, {end}, f.location_id, f.fleet_id, f.category_id, f.source_id
+ON CONFLICT ON CONSTRAINT fact_waste_rollup_key DO UPDATE
+SET volume_kg = r.volume_kg + EXCLUDED.volume_kg,
+    n_rows = r.n_rows + EXCLUDED.n_rows;
+"""
+
+# Sub-partisi bulan milik satu kota (nama fact_waste_<kota>_<yyyymm>, lihat warehouse/city.py)
+Q_MONTH_PARTITIONS = """
+SELECT c.relname, to_date(right(c.relname, 6), 'YYYYMM') AS month
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = to_regclass(:parent) AND c.relname ~ '_[0-9]{6}$'
+ORDER BY month;
+"""
+
+def add_to_rollup(conn, source, grain, where="", params=None):
+    """Menambahkan baris fakta `source` ke tier rollup dengan grain `grain`."""
+    start, end = GRAIN_PERIOD[grain]
+    conn.execute(text(Q_ROLLUP.format(grain=grain, start=start, end=end, source=source, where=where)), params or {})
+
+def add_late_rows(conn, source, params=None):
+    """
+    Baris fakta terlambat (subquery `source`, mis. satu batch stream) yang tanggalnya sudah
+    dipadatkan: ditambahkan ke rollup kota masing-masing dengan grain kota tsb.
+    """
+    for r in conn.execute(text("SELECT city_id, grain, detail_from FROM warehouse.fact_retention;")).all():
+        add_to_rollup(conn, source, r.grain, where="AND f.city_id = :late_city_id AND t.date < :late_before",
+                      params={**(params or {}), "late_city_id": r.city_id, "late_before": r.detail_from})
+
+def get_detail_from(conn, city_id):
+    """Tanggal pertama tier detail kota tsb (None = belum pernah dipadatkan)."""
+    return conn.execute(text("SELECT detail_from FROM warehouse.fact_retention WHERE city_id = :city_id;"),
+                        {"city_id": city_id}).scalar()
+
+def retention_policy(city):
+    """(keep_days atau None, grain) dari data/cities.json."""
+    config = get_city(city)
+    keep_days = config.get("retention_days", DEFAULT_KEEP_DAYS)
+    grain = config.get("rollup_grain", DEFAULT_GRAIN)
+    if grain not in GRAIN_PERIOD:
+        raise ValueError(f"rollup_grain tidak dikenal untuk {city}: {grain!r} (week/month)")
+    return keep_days, grain
+
+def compact_fact_waste(city=DEFAULT_CITY, keep_days=None, grain=None, archive=False, engine=None):
+    """
+    Memadatkan sub-partisi bulan satu kota yang seluruh harinya lebih tua dari keep_days
+    (dihitung dari tanggal fakta terbaru kota tsb). Satu transaksi per bulan, dari bulan tertua.
+    archive=True: partisi dipindah ke skema archive, bukan di-drop.
+    Mengembalikan daftar bulan (tanggal 1) yang dipadatkan.
+    """
+    policy_days, policy_grain = retention_policy(city)
+    keep_days = policy_days if keep_days is None else keep_days
+    grain = grain or policy_grain
+    if keep_days is None:
+        return []
+
+    engine = engine or get_engine()
+    parent = f"warehouse.{partition_name(city)}"
+    with engine.connect() as conn:
+        city_id = get_city_id(conn, city)
+        # Smart key yyyymmdd: MAX(time_id) = tanggal terbaru tanpa join ke dim_time
+        newest = conn.execute(text(f"""
+        SELECT to_date(CAST(MAX(time_id) AS TEXT), 'YYYYMMDD') FROM {parent};
+        """)).scalar()
+        if newest is None:
+            return []
+        cutoff = newest - timedelta(days=keep_days)
+        months = [r.month for r in conn.execute(text(Q_MONTH_PARTITIONS), {"parent": parent})
+                  if next_month(r.month) <= cutoff]
+
+    for month in months:
+        name = month_partition_name(city, month)
+        with engine.begin() as conn:
+            lock_fact_ddl(conn)
+            lock_city_partition(conn, city_id)
+            add_to_rollup(conn, f"warehouse.{name}", grain)
+            conn.execute(text(f"ALTER TABLE {parent} DETACH PARTITION warehouse.{name};"))
+            if archive:
+                conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA};"))
+                conn.execute(text(f"ALTER TABLE warehouse.{name} SET SCHEMA {ARCHIVE_SCHEMA};"))
+            else:
+                conn.execute(text(f"DROP TABLE warehouse.{name};"))
+            conn.execute(text("""
+            INSERT INTO warehouse.fact_retention (city_id, detail_from, grain)
+            VALUES (:city_id, :detail_from, :grain)
+            ON CONFLICT (city_id) DO UPDATE
+            SET detail_from = GREATEST(warehouse.fact_retention.detail_from, EXCLUDED.detail_from),
+                grain = EXCLUDED.grain, updated_at = now();
+            """), {"city_id": city_id, "detail_from": next_month(month), "grain": grain})
+        logger.info("Retensi %s: detail %s dipadatkan ke rollup '%s'%s",
+                    city, f"{month:%Y-%m}", grain, f" (arsip {ARCHIVE_SCHEMA}.{name})" if archive else "")
+    return months
+
+def retention_status(conn):
+    """[(kota, detail_from, grain, baris rollup, baris detail)] untuk semua kota."""
+    return conn.execute(text("""
+    SELECT ci.code, r.detail_from, r.grain,
+           (SELECT COUNT(*) FROM warehouse.fact_waste_rollup ru WHERE ru.city_id = ci.id) AS rollup_rows,
+           (SELECT COUNT(*) FROM warehouse.fact_waste f WHERE f.city_id = ci.id) AS detail_rows
+    FROM warehouse.dim_city ci
+    LEFT JOIN warehouse.fact_retention r ON r.city_id = ci.id
+    ORDER BY ci.code;
+    """)).all()
+
+if __name__ == "__main__":
+    from warehouse.etl_runs import record_etl_run
+    from warehouse.result_cache import prewarm_result_cache
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Retensi & rollup fact_waste")
+    parser.add_argument("--city", default=DEFAULT_CITY)
+    parser.add_argument("--keep-days", type=int, default=None, help="Default: retention_days di cities.json")
+    parser.add_argument("--grain", choices=sorted(GRAIN_PERIOD), default=None, help="Default: rollup_grain di cities.json")
+    parser.add_argument("--archive", action="store_true", help=f"Pindahkan partisi lama ke skema {ARCHIVE_SCHEMA}, bukan DROP")
+    parser.add_argument("--status", action="store_true", help="Hanya tampilkan batas tier per kota")
+    args = parser.parse_args()
+
+    if args.status:
+        with get_engine().connect() as conn:
+            for r in retention_status(conn):
+                print(f"{r.code:<16} detail sejak {r.detail_from or '-'}  rollup={r.grain or '-'} "
+                      f"({r.rollup_rows} baris)  detail={r.detail_rows} baris")
+        sys.exit(0)
+
+    months = compact_fact_waste(args.city, args.keep_days, args.grain, args.archive)
+    if not months:
+        print(f"✅ Tidak ada detail {args.city} yang melewati masa retensi.")
+        sys.exit(0)
+    print(f"🗜️  {len(months)} bulan detail {args.city} dipadatkan: {', '.join(f'{m:%Y-%m}' for m in months)}")
+    version = record_etl_run(city=args.city)
+    _, n_queries = prewarm_result_cache(city=args.city)
+    print(f"✅ Versi data {version}" + (f", cache dashboard diisi ulang ({n_queries} query)." if n_queries else "."))